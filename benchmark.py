@@ -0,0 +1,297 @@
+"""
+Benchmarks for the simulation hot paths, with regression tracking.
+
+    python benchmark.py                     # run all, write benchmark_results.json, compare to baseline
+    python benchmark.py --save-baseline     # run all and store the result as the new baseline
+    python benchmark.py -k run_coupled      # only cases whose name contains the filter
+    python benchmark.py --threshold 0.3     # fail when a case is >30% slower than the baseline
+
+Each case is timed `--repeat` times and the minimum wall time is compared. The exit
+status is 1 when any case regresses beyond the threshold, or exceeds its limit in
+TIME_LIMITS (e.g. the import time of the compute path) or RELATIVE_LIMITS (e.g. a
+compiled kernel vs the hand-written engine); limits need no baseline. Baselines are
+machine specific: regenerate with --save-baseline after changing hardware.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent
+
+from simulation import run_coupled_neumann, step_neumann_batch
+from finding_steady_states import fast_stable_steady_state
+from simulation_2d import step_2d
+from simulation_graph import hex_lattice, step_graph
+from parameters import params
+from rd_batch.grid import make_param_grid
+from pattern_analysis import extract_features, classify_patterns
+from model_params import step_constants
+from reaction_network import activator_inhibitor
+
+BASELINE_FILE = ROOT / "benchmark_baseline.json"
+RESULTS_FILE = ROOT / "benchmark_results.json"
+# The compute path: what a sweep worker imports, on top of NumPy itself
+IMPORT_CORE = ("simulation", "finding_steady_states", "rd_batch.grid")
+
+
+# ---------- Cases ----------
+def _bench_run_coupled(N, steps, activator_type):
+    def run():
+        # min_steps = steps so every case runs the full step count
+        with contextlib.redirect_stdout(io.StringIO()):
+            run_coupled_neumann(N, steps, 0.01, 1.0, params, 0.0, steps,
+                                init_mode="random_tight", activator_type=activator_type,
+                                spike_value=5.0, save_every=200)
+    return run
+
+
+def _bench_steady_states():
+    grid = [(a, i, n) for a in np.linspace(1, 10, 10)
+            for i in np.linspace(1, 10, 10) for n in (1, 3, 6)]
+
+    def run():
+        for a, i, n in grid:
+            p = dict(params, act_prod_rate=a, inh_prod_rate=i, act_hill_coeff=n, inh_hill_coeff=n)
+            fast_stable_steady_state(p, "juxtacrine", tol=5e-4, max_newton=12)
+    return run
+
+
+def _bench_param_grid():
+    import yaml
+
+    cfg_path = ROOT / "exp-007-allsweep-juxtacrine-average-randomtight" / "config_exp007.yaml"
+    with open(cfg_path) as f:
+        cfg = yaml.safe_load(f)
+
+    def run():
+        make_param_grid(cfg["base"], sweeps=cfg["sweeps"], mode=cfg.get("mode", "grid"))
+    return run
+
+
+def _bench_analyze_patterns(B=50_000, N=100):
+    rng = np.random.default_rng(0)
+    x = np.arange(N)
+    wavelengths = rng.uniform(5, 50, size=(B, 1))
+    profiles = 1.0 + np.cos(2 * np.pi * x / wavelengths) + 0.01 * rng.standard_normal((B, N))
+
+    def run():
+        feats = extract_features(profiles)
+        classify_patterns(feats, converged=np.ones(B, dtype=bool))
+    return run
+
+
+def _bench_step_2d(activator_type, size=200, steps=100):
+    rng = np.random.default_rng(0)
+    A0 = rng.uniform(0, 2, (size, size))
+    I0 = rng.uniform(0, 2, (size, size))
+
+    def run():
+        A, I = A0, I0
+        for _ in range(steps):
+            A, I = step_2d(A, I, 0.01, 1.5, params, activator_type)
+    return run
+
+
+def _bench_step_graph(activator_type, nx=316, ny=316, steps=20):
+    graph = hex_lattice(nx, ny)
+    rng = np.random.default_rng(0)
+    A0 = rng.uniform(0, 2, graph.n)
+    I0 = rng.uniform(0, 2, graph.n)
+
+    def run():
+        A, I = A0, I0
+        for _ in range(steps):
+            A, I = step_graph(A, I, 0.01, 1.0, params, graph, activator_type)
+    return run
+
+
+def _bench_step_batch(activator_type, compiled, K=8, N=1000, steps=2000):
+    """Batched 1D stepping, hand-written (step_neumann_batch) or a compiled reaction_network kernel."""
+    p = dict(params, act_diffusion=0.3)
+    if compiled:
+        step = activator_inhibitor(activator_type).compile(p, 0.01, 1.0)
+    else:
+        c = step_constants(p, 0.01, 1.0)
+        step = lambda A, I: step_neumann_batch(A, I, 0.01, 1.0, c, activator_type)
+    A0, I0 = np.random.default_rng(0).uniform(0, 3, (2, K, N))
+
+    def run():
+        A, I = A0, I0
+        for _ in range(steps):
+            A, I = step(A, I)
+    return run
+
+
+def import_profile(modules=IMPORT_CORE):
+    """
+    python -X importtime of `modules` in a fresh interpreter that imports NumPy first.
+    Returns [(top level?, module, cumulative us)] in import order.
+    """
+    code = "import numpy; " + "; ".join(f"import {m}" for m in modules)
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                          capture_output=True, text=True, check=True, cwd=ROOT)
+    entries = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        entries.append((not name[1:].startswith(" "), name.strip(), int(cumulative)))
+    return entries
+
+
+def _bench_import(modules=IMPORT_CORE):
+    """Import time of `modules` after NumPy, as measured by the interpreter (not process start-up)."""
+    def run():
+        top = [(m, us) for is_top, m, us in import_profile(modules) if is_top]
+        after_numpy = top[[m for m, _ in top].index("numpy") + 1:]
+        return sum(us for _, us in after_numpy) / 1e6
+    return run
+
+
+def benchmark_cases():
+    cases = {}
+    for activator_type in ("paracrine", "juxtacrine"):
+        for N in (50, 100, 200):
+            for steps in (500, 2000):
+                cases[f"run_coupled_neumann[{activator_type}-N{N}-steps{steps}]"] = \
+                    _bench_run_coupled(N, steps, activator_type)
+    cases["import[compute-path]"] = _bench_import()
+    cases["fast_stable_steady_state[grid300]"] = _bench_steady_states()
+    cases["make_param_grid[exp-007]"] = _bench_param_grid()
+    cases["analyze_patterns[50000x100]"] = _bench_analyze_patterns()
+    for activator_type in ("paracrine", "juxtacrine"):
+        cases[f"step_2d[{activator_type}-200x200-100steps]"] = _bench_step_2d(activator_type)
+        cases[f"step_graph[{activator_type}-hex316x316-20steps]"] = _bench_step_graph(activator_type)
+    for activator_type in ("paracrine", "juxtacrine"):
+        cases[f"step_neumann_batch[{activator_type}-8x1000-2000steps]"] = _bench_step_batch(activator_type, False)
+        cases[f"reaction_network[{activator_type}-8x1000-2000steps]"] = _bench_step_batch(activator_type, True)
+    return cases
+
+
+# Cases checked on every run, baseline or not: name -> seconds
+TIME_LIMITS = {"import[compute-path]": 0.150}
+# ... and name -> (reference case, allowed time ratio)
+RELATIVE_LIMITS = {
+    f"reaction_network[{t}-8x1000-2000steps]": (f"step_neumann_batch[{t}-8x1000-2000steps]", 1.2)
+    for t in ("paracrine", "juxtacrine")
+}
+
+
+# ---------- Harness ----------
+def time_case(fn, repeat):
+    """Time fn `repeat` times; a case may return the seconds to record instead of its wall time."""
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        measured = fn()
+        times.append(time.perf_counter() - t0 if measured is None else measured)
+    return {"min": min(times), "median": statistics.median(times), "repeat": repeat}
+
+
+def machine_info():
+    return {
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def compare(results, baseline, threshold):
+    """Return the list of (name, baseline_s, current_s, ratio) cases slower than allowed."""
+    regressions = []
+    for name, res in results.items():
+        base = baseline.get("results", {}).get(name)
+        if base is None:
+            print(f"  {name:<55} {res['min']:9.4f}s  (no baseline)")
+            continue
+        ratio = res["min"] / base["min"]
+        flag = "REGRESSION" if ratio > 1.0 + threshold else ""
+        print(f"  {name:<55} {res['min']:9.4f}s  baseline {base['min']:9.4f}s  x{ratio:5.2f} {flag}")
+        if flag:
+            regressions.append((name, base["min"], res["min"], ratio))
+    return regressions
+
+
+def check_limits(results):
+    """Return the list of (name, reference or None, time or ratio, limit) cases over TIME_LIMITS/RELATIVE_LIMITS."""
+    failures = []
+    timed = [name for name in TIME_LIMITS if name in results]
+    pairs = [(name, ref, limit) for name, (ref, limit) in RELATIVE_LIMITS.items() if name in results and ref in results]
+    if timed or pairs:
+        print("Limits:")
+    for name in timed:
+        t, limit = results[name]["min"], TIME_LIMITS[name]
+        print(f"  {name:<55} {t:9.4f}s (limit {limit:.4f}s)")
+        if t > limit:
+            failures.append((name, None, t, limit))
+    for name, ref, limit in pairs:
+        ratio = results[name]["min"] / results[ref]["min"]
+        print(f"  {name:<55} x{ratio:5.2f} of {ref} (limit x{limit:.2f})")
+        if ratio > limit:
+            failures.append((name, ref, ratio, limit))
+    return failures
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark the simulation hot paths.")
+    ap.add_argument("-k", "--filter", default="", help="Only run cases whose name contains this string")
+    ap.add_argument("--repeat", type=int, default=3, help="Timings per case (minimum is compared)")
+    ap.add_argument("--threshold", type=float, default=0.25,
+                    help="Allowed slowdown vs baseline before failing (0.25 = 25%%)")
+    ap.add_argument("--baseline", default=str(BASELINE_FILE), help="Baseline JSON to compare against")
+    ap.add_argument("--output", default=str(RESULTS_FILE), help="Where to write this run's JSON")
+    ap.add_argument("--save-baseline", action="store_true", help="Store this run as the baseline")
+    args = ap.parse_args()
+
+    all_cases = benchmark_cases()
+    selected = {k for k in all_cases if args.filter in k}
+    selected |= {RELATIVE_LIMITS[k][0] for k in selected if k in RELATIVE_LIMITS}  # and their references
+    cases = {k: v for k, v in all_cases.items() if k in selected}
+    results = {}
+    for name, fn in cases.items():
+        results[name] = time_case(fn, args.repeat)
+        print(f"{name:<57} {results[name]['min']:9.4f}s")
+
+    payload = {"machine": machine_info(), "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+               "results": results}
+    out = args.baseline if args.save_baseline else args.output
+    with open(out, "w") as f:
+        json.dump(payload, f, indent=2)
+    print(f"Wrote {len(results)} results to {out}")
+    failures = check_limits(results)
+    if failures:
+        print(f"{len(failures)} case(s) over their limit.")
+        sys.exit(1)
+    if args.save_baseline:
+        return
+
+    if not os.path.exists(args.baseline):
+        print("No baseline found; run with --save-baseline to create one.")
+        return
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline.get("machine", {}).get("platform") != payload["machine"]["platform"]:
+        print("Note: baseline was recorded on a different machine; timings may not be comparable.")
+
+    print(f"Comparison against {args.baseline} (threshold +{args.threshold:.0%}):")
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        print(f"{len(regressions)} case(s) regressed beyond the threshold.")
+        sys.exit(1)
+    print("No regressions.")
+
+
+if __name__ == "__main__":
+    main()
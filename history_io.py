@@ -0,0 +1,97 @@
+import json
+import os
+import numpy as np
+
+
+def _sidecar_path(path):
+    root, _ = os.path.splitext(str(path))
+    return root + ".json"
+
+
+class HistoryWriter:
+    """
+    Append-only space-time history backed by a preallocated memory-mapped .npy file.
+
+    The array has shape (max_frames, 2, *frame_shape): index 1 selects activator (0)
+    or inhibitor (1). Frames are written in place as they arrive, so a run never holds
+    more than the current frame in memory. close() writes a JSON sidecar next to the
+    file with the metadata and the number of frames actually written; readers use it
+    to ignore the unwritten tail of the preallocation.
+    """
+
+    def __init__(self, path, frame_shape, max_frames, meta=None, dtype=np.float64):
+        if isinstance(frame_shape, int):
+            frame_shape = (frame_shape,)
+        self.path = str(path)
+        self.meta = dict(meta or {})
+        self.n_frames = 0
+        self._data = np.lib.format.open_memmap(
+            self.path, mode="w+", dtype=dtype, shape=(int(max_frames), 2) + tuple(frame_shape)
+        )
+
+    def append(self, activator, inhibitor):
+        if self.n_frames >= self._data.shape[0]:
+            raise IndexError(f"History {self.path} is full ({self._data.shape[0]} frames)")
+        self._data[self.n_frames, 0] = activator
+        self._data[self.n_frames, 1] = inhibitor
+        self.n_frames += 1
+
+    def close(self, stop_step=None):
+        self._data.flush()
+        meta = dict(self.meta)
+        meta.update({
+            "n_frames": self.n_frames,
+            "stop_step": stop_step,
+            "frame_shape": list(self._data.shape[2:]),
+            "dtype": str(self._data.dtype),
+        })
+        with open(_sidecar_path(self.path), "w") as f:
+            json.dump(meta, f, indent=2, default=_json_default)
+        del self._data
+
+
+def _json_default(x):
+    if isinstance(x, np.generic):
+        return x.item()
+    if isinstance(x, np.ndarray):
+        return x.tolist()
+    return str(x)
+
+
+def open_history(path):
+    """
+    Open a history lazily. Returns (frames, meta) where frames is a read-only
+    memory-mapped array of shape (n_frames, 2, ...) trimmed to the frames actually
+    written; slicing it only reads the requested window from disk. Plain .npy files
+    without a sidecar are accepted as-is with empty metadata.
+    """
+    frames = np.load(path, mmap_mode="r")
+    sidecar = _sidecar_path(path)
+    meta = {}
+    if os.path.exists(sidecar):
+        with open(sidecar) as f:
+            meta = json.load(f)
+        frames = frames[:meta.get("n_frames", frames.shape[0])]
+    return frames, meta
+
+
+def frame_steps(frame_idx, save_every):
+    """
+    Simulation step of each history frame. Frame 0 is the initial state, labelled -1
+    (before step 0); frame k >= 1 was saved after step (k - 1) * save_every, counted
+    like the stop_step of the sidecar.
+    """
+    frame_idx = np.asarray(frame_idx)
+    return np.where(frame_idx == 0, -1, (frame_idx - 1) * save_every)
+
+
+def read_window(path, species=0, t=slice(None), x=slice(None)):
+    """
+    Load one species over a time/space window, e.g. read_window(p, 0, slice(100, 500, 5)).
+    Returns (array, steps) where steps are the simulation steps of the selected frames
+    (frame_steps).
+    """
+    frames, meta = open_history(path)
+    window = np.asarray(frames[t, species][..., x])
+    frame_idx = np.arange(frames.shape[0])[t]
+    return window, frame_steps(frame_idx, meta.get("save_every", 1))
@@ -1,8 +1,9 @@
 import argparse
+import logging
 import os
 from parameters import params, N, steps, dt, dx, save_every, spike_value, stopping_threshold, min_steps, init_mode, activator_type
 from simulation import run_coupled_neumann
-from visualize import animate_histories, plot_one_frame
+from visualize import animate_histories, plot_one_frame, render_frames, plot_kymograph
 from writing_simulation_results import str2bool, write_simulation_results
 
 
@@ -15,12 +16,23 @@ def main():
                         help="Whether to show visualization (True/False). Default = True, unless --output is activated.")
     parser.add_argument("--movie", action="store_true",
                         help="If set, also save an MP4 movie using the same basename as --output.")
+    parser.add_argument("--history", action="store_true",
+                        help="If set, stream the full history to simulation_results/NAME_history.npy "
+                             "(memory-mapped) and save a kymograph NAME_kymograph.png. Requires --output.")
     args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
 
     # If movie is requested and user did not explicitly set --vis, turn off visualization
     if args.movie and args.vis is True and "--vis" not in " ".join(os.sys.argv):
         args.vis = False
 
+    history_path = None
+    if args.history:
+        if not args.output:
+            raise ValueError("--history requires --output to be specified.")
+        os.makedirs("simulation_results", exist_ok=True)
+        history_path = os.path.join("simulation_results", args.output + "_history.npy")
+
     # Run baseline simulation (two activator spikes, Neumann BC)
     A_hist, R_hist, final_step, a_ss, i_ss = run_coupled_neumann(
         N, steps, dt, dx, params, stopping_threshold, min_steps,
@@ -28,8 +40,14 @@ def main():
         activator_type=activator_type,
         spike_value=spike_value,
         save_every=save_every,
+        history_path=history_path,
     )
 
+    if history_path:
+        kymo_png = os.path.join("simulation_results", args.output + "_kymograph.png")
+        plot_kymograph(history_path, kymo_png)
+        print(f"History saved to {history_path}, kymograph to {kymo_png}")
+
     # If --output is provided, save results to file + static plot
     if args.output:
         outfile_txt, outfile_png = write_simulation_results(
@@ -47,21 +65,23 @@ def main():
             print(f"Initial state plot saved to {outfile_start}")
 
     # Visualization and/or movie saving
-    if args.vis or args.movie:
+    if args.movie:
         outdir = "simulation_results"
-        movie_path = None
 
         # If movie flag is set, require --output
-        if args.movie:
-            if not args.output:
-                raise ValueError("--movie requires --output to be specified.")
-            os.makedirs(outdir, exist_ok=True)
-            movie_path = os.path.join(outdir, args.output + ".mp4")
+        if not args.output:
+            raise ValueError("--movie requires --output to be specified.")
+        os.makedirs(outdir, exist_ok=True)
+        movie_path = os.path.join(outdir, args.output + ".mp4")
 
+        # headless renderer: blits frames straight into ffmpeg (streams from disk with --history)
+        frames = history_path if history_path else list(zip(A_hist, R_hist))
+        render_frames(frames, outfile=movie_path, save_every=save_every,
+                      title="Baseline Simulation (Neumann)")
+    elif args.vis:
         animate_histories(A_hist, R_hist, save_every,
                           title="Baseline Simulation (Neumann)",
-                          loop=False,
-                          savefile=movie_path)
+                          loop=False)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,162 @@
+import difflib
+from dataclasses import dataclass, fields
+
+import numpy as np
+
+# Keys of a run parameter dict that are not model parameters (run settings, sweep extras)
+RUN_KEYS = frozenset({
+    "N", "steps", "dt", "dx", "stopping_threshold", "min_steps", "save_every",
+    "init_mode", "activator_type", "spike_value", "seed", "replicates",
+    "noise", "noise_a", "noise_i",
+})
+
+
+@dataclass(frozen=True, slots=True)
+class ModelParams:
+    """
+    Validated, immutable reaction parameters of the activator–inhibitor model.
+
+    Build with from_dict (parameters.params, a YAML base: block or a sweep point);
+    the class itself does no checking, so stack() can hold arrays. Instances are
+    hashable, pickle as a plain tuple of fields, and support p["key"], p.get(key) and dict(p),
+    so they drop into code written for parameter dicts.
+    """
+    act_half_sat: float
+    inh_half_sat: float
+    act_hill_coeff: float
+    inh_hill_coeff: float
+    basal_prod: float
+    act_prod_rate: float
+    act_decay_rate: float
+    inh_prod_rate: float
+    inh_decay_rate: float
+    inh_diffusion: float
+    act_diffusion: float = 0.0
+
+    @classmethod
+    def from_dict(cls, d, strict=True):
+        """
+        Validate and convert a parameter dict. Run settings (RUN_KEYS) are ignored;
+        with `strict`, any other unknown key is an error that names the closest
+        valid key. Integral Hill coefficients (3.0 from YAML) become ints.
+        """
+        names = [f.name for f in fields(cls)]
+        if strict:
+            check_keys(d)
+        missing = [k for k in names if k not in d and k != "act_diffusion"]
+        if missing:
+            raise ValueError(f"Missing model parameters: {', '.join(missing)}")
+
+        values = {}
+        for k in names:
+            if k not in d:
+                continue
+            v = d[k]
+            if isinstance(v, bool) or not isinstance(v, (int, float, np.number)):
+                raise ValueError(f"Parameter {k} must be a number, got {v!r}")
+            values[k] = float(v)
+        for k in ("act_hill_coeff", "inh_hill_coeff"):
+            if values[k] == int(values[k]):
+                values[k] = int(values[k])
+
+        for k in ("act_half_sat", "inh_half_sat", "act_hill_coeff", "inh_hill_coeff"):
+            if not values[k] > 0:
+                raise ValueError(f"Parameter {k} must be > 0, got {values[k]}")
+        for k, v in values.items():
+            if not (v >= 0 and np.isfinite(v)):
+                raise ValueError(f"Parameter {k} must be finite and >= 0, got {v}")
+        return cls(**values)
+
+    @classmethod
+    def from_yaml(cls, path):
+        """ModelParams from the base: block of a sweep config (PyYAML is imported on use)."""
+        import yaml
+        with open(path) as f:
+            return cls.from_dict(yaml.safe_load(f)["base"])
+
+    @classmethod
+    def stack(cls, items):
+        """
+        Struct-of-arrays view of many parameter sets: a ModelParams whose fields are
+        (B, 1) float arrays, which broadcast against (B, N) fields in the batched
+        engines. Not hashable.
+        """
+        items = [p if isinstance(p, cls) else cls.from_dict(p) for p in items]
+        cols = np.array([[getattr(p, f.name) for f in fields(cls)] for p in items], dtype=float)
+        return cls(*(cols[:, j:j + 1] for j in range(cols.shape[1])))
+
+    def to_dict(self):
+        return {f.name: getattr(self, f.name) for f in fields(self)}
+
+    def keys(self):
+        return [f.name for f in fields(self)]
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+    def step_constants(self, dt, dx):
+        """Step-invariant coefficients for an explicit Euler step of size dt on spacing dx."""
+        return StepConstants(
+            inv_act_half_sat=1.0 / self.act_half_sat,
+            inv_inh_half_sat=1.0 / self.inh_half_sat,
+            act_hill_coeff=self.act_hill_coeff,
+            inh_hill_coeff=self.inh_hill_coeff,
+            basal_prod=self.basal_prod,
+            act_prod_dt=self.act_prod_rate * dt,
+            act_decay_dt=self.act_decay_rate * dt,
+            inh_prod_dt=self.inh_prod_rate * dt,
+            inh_decay_dt=self.inh_decay_rate * dt,
+            act_diff_num=self.act_diffusion * dt / dx**2,
+            inh_diff_num=self.inh_diffusion * dt / dx**2,
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class StepConstants:
+    """Per-step coefficients derived once from ModelParams, dt and dx (see ModelParams.step_constants)."""
+    inv_act_half_sat: float
+    inv_inh_half_sat: float
+    act_hill_coeff: float
+    inh_hill_coeff: float
+    basal_prod: float
+    act_prod_dt: float
+    act_decay_dt: float
+    inh_prod_dt: float
+    inh_decay_dt: float
+    act_diff_num: float
+    inh_diff_num: float
+
+
+def check_keys(keys):
+    """Raise ValueError for keys that are neither model parameters nor RUN_KEYS, suggesting the closest valid key."""
+    valid = [f.name for f in fields(ModelParams)] + sorted(RUN_KEYS)
+    for k in keys:
+        if k not in valid:
+            close = difflib.get_close_matches(k, valid, n=1)
+            hint = f" (did you mean {close[0]!r}?)" if close else ""
+            raise ValueError(f"Unknown parameter {k!r}{hint}")
+
+
+def step_constants(p, dt, dx):
+    """StepConstants from a StepConstants (returned as is), a ModelParams or a parameter dict."""
+    if isinstance(p, StepConstants):
+        return p
+    if not isinstance(p, ModelParams):
+        p = ModelParams.from_dict(p, strict=False)
+    return p.step_constants(dt, dx)
+
+
+def ipow(x, n):
+    """x**n; for a small integer n on arrays, by repeated multiplication (much cheaper than pow)."""
+    if isinstance(n, (int, np.integer)) and 0 < n <= 8 and isinstance(x, np.ndarray):
+        out = x.copy()
+        for _ in range(n - 1):
+            out *= x
+        return out
+    return x ** n
@@ -0,0 +1,312 @@
+import warnings
+
+import numpy as np
+
+# Pattern classes returned by classify_patterns
+HOMOGENEOUS, PATTERN, OSCILLATING = 0, 1, 2
+PATTERN_CLASSES = ("homogeneous", "pattern", "oscillating")
+
+FEATURE_KEYS = (
+    "min_a", "max_a", "mean_a", "diff_a",
+    "peak_count", "peak_spacing_mean", "peak_spacing_var",
+    "dct_mode", "dct_wavelength", "spectral_entropy",
+    "dominant_freq", "dominant_wavelength",
+)
+
+
+# ---------- Spectral transforms ----------
+def dct2(x, axis=-1):
+    """
+    Unnormalized DCT-II along `axis` (FFT based, Makhoul's reordering).
+
+    The DCT-II basis cos(pi*k*(n+1/2)/N) satisfies the zero-flux (Neumann)
+    boundary conditions of run_coupled_neumann, so mode k has wavelength 2*N*dx/k.
+    """
+    x = np.moveaxis(np.asarray(x, dtype=float), axis, -1)
+    N = x.shape[-1]
+    v = np.concatenate([x[..., ::2], x[..., 1::2][..., ::-1]], axis=-1)
+    V = np.fft.fft(v, axis=-1)
+    k = np.arange(N)
+    y = 2.0 * np.real(V * np.exp(-1j * np.pi * k / (2 * N)))
+    return np.moveaxis(y, -1, axis)
+
+
+def fft_dominant(profiles, dx=1.0):
+    """Vectorized version of the FFT argmax used by analyze_pattern: (freq, wavelength) per row."""
+    X = np.atleast_2d(np.asarray(profiles, dtype=float))
+    N = X.shape[-1]
+    freqs = np.fft.fftfreq(N, d=dx)
+    pos_mask = freqs > 0
+    if not np.any(pos_mask):
+        nan = np.full(X.shape[0], np.nan)
+        return nan, nan.copy()
+    power = np.abs(np.fft.fft(X, axis=-1)[:, pos_mask]) ** 2
+    dominant_freq = freqs[pos_mask][np.argmax(power, axis=-1)]
+    return dominant_freq, 1.0 / dominant_freq
+
+
+def dct_spectrum(profiles, dx=1.0):
+    """
+    DCT power spectrum of each row without the k=0 (mean) mode.
+    Returns (wavelengths, power) with power of shape (B, N-1).
+    """
+    X = np.atleast_2d(np.asarray(profiles, dtype=float))
+    N = X.shape[-1]
+    power = dct2(X, axis=-1)[:, 1:] ** 2
+    k = np.arange(1, N)
+    return 2.0 * N * dx / k, power
+
+
+def spectral_entropy(power):
+    """Normalized Shannon entropy (0 = single mode, 1 = white) of each row of a power spectrum."""
+    power = np.atleast_2d(power)
+    total = power.sum(axis=-1, keepdims=True)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        prob = power / total
+        plogp = np.where(prob > 0, prob * np.log(prob), 0.0)
+    H = -plogp.sum(axis=-1) / np.log(power.shape[-1])
+    return np.where(total[:, 0] > 0, H, np.nan)
+
+
+# ---------- Peak detection ----------
+def count_peaks(profiles, rel_height=0.5, dx=1.0):
+    """
+    Vectorized peak detection on a (B, N) array.
+
+    A peak is a contiguous run of cells above min + rel_height*(max - min), so
+    narrow spikes and flat plateaus each count once regardless of ripples. With
+    zero-flux boundaries a run touching an edge is a mirrored peak centred on that
+    edge. Returns (count, spacing_mean, spacing_var), spacing in units of dx
+    (NaN when a row has fewer than two peaks).
+    """
+    X = np.atleast_2d(np.asarray(profiles, dtype=float))
+    B, N = X.shape
+    lo = X.min(axis=1, keepdims=True)
+    hi = X.max(axis=1, keepdims=True)
+    above = (X > lo + rel_height * (hi - lo)) & (hi > lo)
+
+    edge = np.zeros((B, 1), dtype=bool)
+    starts = above & ~np.concatenate([edge, above[:, :-1]], axis=1)
+    ends = above & ~np.concatenate([above[:, 1:], edge], axis=1)
+    count = starts.sum(axis=1)
+
+    # np.nonzero walks row-major, so the k-th start and k-th end belong to the same run
+    rows, s = np.nonzero(starts)
+    _, e = np.nonzero(ends)
+    centers = 0.5 * (s + e)
+    centers = np.where(s == 0, 0.0, centers)
+    centers = np.where(e == N - 1, N - 1.0, centers)
+
+    same_row = rows[1:] == rows[:-1]
+    gaps = (centers[1:] - centers[:-1])[same_row] * dx
+    gap_rows = rows[1:][same_row]
+    n_gaps = np.bincount(gap_rows, minlength=B)
+    s1 = np.bincount(gap_rows, weights=gaps, minlength=B)
+    s2 = np.bincount(gap_rows, weights=gaps * gaps, minlength=B)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.where(n_gaps > 0, s1 / n_gaps, np.nan)
+        var = np.where(n_gaps > 0, s2 / n_gaps - mean * mean, np.nan)
+    return count, mean, np.maximum(var, 0.0)
+
+
+# ---------- Batch feature extraction ----------
+def _features_chunk(X, dx, rel_height, homogeneous_tol):
+    lo = X.min(axis=1)
+    hi = X.max(axis=1)
+    mean = X.mean(axis=1)
+    flat = ~(np.std(X, axis=1) >= homogeneous_tol)   # also catches NaN rows
+
+    count, sp_mean, sp_var = count_peaks(X, rel_height=rel_height, dx=dx)
+    wavelengths, power = dct_spectrum(X, dx=dx)
+    mode = np.argmax(power, axis=1)
+    dom_freq, dom_lambda = fft_dominant(X, dx=dx)
+
+    feats = {
+        "min_a": lo,
+        "max_a": hi,
+        "mean_a": mean,
+        "diff_a": hi - lo,
+        "peak_count": np.where(flat, 0, count),
+        "peak_spacing_mean": np.where(flat, np.nan, sp_mean),
+        "peak_spacing_var": np.where(flat, np.nan, sp_var),
+        "dct_mode": np.where(flat, 0, mode + 1),
+        "dct_wavelength": np.where(flat, np.nan, wavelengths[mode]),
+        "spectral_entropy": np.where(flat, np.nan, spectral_entropy(power)),
+        "dominant_freq": np.where(flat, np.nan, dom_freq),
+        "dominant_wavelength": np.where(flat, np.nan, dom_lambda),
+    }
+    return feats
+
+
+def extract_features(profiles, dx=1.0, rel_height=0.5, homogeneous_tol=1e-6, chunk_size=16384):
+    """
+    Pattern descriptors for a batch of 1D profiles.
+
+    `profiles` is a (B, N) array or an iterable of (b, N) chunks (e.g. parsed from
+    successive CSV chunks). Work is done chunk by chunk on whole arrays; the result
+    is a dict of length-B arrays keyed by FEATURE_KEYS. Rows whose standard deviation
+    is below `homogeneous_tol` get NaN/0 spectral and peak descriptors.
+    """
+    if isinstance(profiles, np.ndarray):
+        X = np.atleast_2d(profiles)
+        chunks = (X[i:i + chunk_size] for i in range(0, X.shape[0], chunk_size))
+    else:
+        chunks = profiles
+
+    parts = {k: [] for k in FEATURE_KEYS}
+    for chunk in chunks:
+        chunk = np.atleast_2d(np.asarray(chunk, dtype=float))
+        if chunk.shape[0] == 0:
+            continue
+        feats = _features_chunk(chunk, dx, rel_height, homogeneous_tol)
+        for k in FEATURE_KEYS:
+            parts[k].append(feats[k])
+    return {k: (np.concatenate(v) if v else np.empty(0)) for k, v in parts.items()}
+
+
+def classify_patterns(features, converged=None, amp_rtol=1e-3, amp_atol=1e-6):
+    """
+    Label each run HOMOGENEOUS, PATTERN or OSCILLATING.
+
+    A run is homogeneous when its spatial range diff_a is below
+    amp_atol + amp_rtol*|mean_a|, or when extract_features already found it flat
+    (dct_mode 0). Runs that did not converge before the step limit
+    (`converged` False) and are not homogeneous are labelled oscillating, since a
+    single final frame cannot distinguish a slow transient from a limit cycle.
+    """
+    diff = np.asarray(features["diff_a"], dtype=float)
+    mean = np.asarray(features["mean_a"], dtype=float)
+    labels = np.full(diff.shape, PATTERN, dtype=np.int8)
+    homogeneous = ~(diff > amp_atol + amp_rtol * np.abs(mean))
+    if "dct_mode" in features:
+        homogeneous |= np.asarray(features["dct_mode"]) == 0
+    labels[homogeneous] = HOMOGENEOUS
+    if converged is not None:
+        converged = np.asarray(converged, dtype=bool)
+        labels[~converged & ~homogeneous] = OSCILLATING
+    return labels
+
+
+# ---------- 2D fields ----------
+def radial_power_spectrum(fields, dx=1.0, nbins=None):
+    """
+    Radially averaged power spectrum of (..., Ny, Nx) fields with periodic boundaries
+    (as in the 2D engine). The mean is removed first. Returns (k, power) where k holds
+    the bin-centre wavenumbers (cycles per unit length) and power has shape (..., nbins).
+    """
+    F = np.asarray(fields, dtype=float)
+    Ny, Nx = F.shape[-2:]
+    lead = F.shape[:-2]
+    F = F.reshape((-1, Ny, Nx))
+    F = F - F.mean(axis=(-2, -1), keepdims=True)
+    power = np.abs(np.fft.fft2(F)) ** 2
+
+    ky = np.fft.fftfreq(Ny, d=dx)
+    kx = np.fft.fftfreq(Nx, d=dx)
+    kr = np.hypot(ky[:, None], kx[None, :]).ravel()
+    if nbins is None:
+        nbins = min(Ny, Nx) // 2
+    k_max = 0.5 / dx
+    edges = np.linspace(0.0, k_max, nbins + 1)
+    idx = np.digitize(kr, edges) - 1
+    keep = (idx >= 0) & (idx < nbins) & (kr > 0)
+
+    # sort pixels by bin once, then reduce each bin with a single reduceat over the batch
+    order = np.argsort(idx[keep], kind="stable")
+    bins_sorted = idx[keep][order]
+    flat = power.reshape(power.shape[0], -1)[:, keep][:, order]
+    present, first = np.unique(bins_sorted, return_index=True)
+    counts = np.diff(np.append(first, bins_sorted.size))
+
+    radial = np.zeros((flat.shape[0], nbins))
+    radial[:, present] = np.add.reduceat(flat, first, axis=1) / counts
+    # report the mean |k| of the pixels in each bin (bin centre for empty bins)
+    k = 0.5 * (edges[:-1] + edges[1:])
+    k[present] = np.add.reduceat(kr[keep][order], first) / counts
+    return k, radial.reshape(lead + (nbins,))
+
+
+def extract_features_2d(fields, dx=1.0, homogeneous_tol=1e-6, chunk_size=256):
+    """
+    Pattern descriptors for a batch of 2D fields of shape (B, Ny, Nx): range, dominant
+    radial wavelength and spectral entropy of the radial spectrum.
+    """
+    F = np.asarray(fields, dtype=float)
+    if F.ndim == 2:
+        F = F[None]
+    out = {k: [] for k in ("min_a", "max_a", "mean_a", "diff_a",
+                           "dominant_wavelength", "spectral_entropy")}
+    for i in range(0, F.shape[0], chunk_size):
+        chunk = F[i:i + chunk_size]
+        flat = ~(chunk.std(axis=(-2, -1)) >= homogeneous_tol)
+        k, radial = radial_power_spectrum(chunk, dx=dx)
+        peak = np.argmax(radial, axis=-1)
+        lo = chunk.min(axis=(-2, -1))
+        hi = chunk.max(axis=(-2, -1))
+        out["min_a"].append(lo)
+        out["max_a"].append(hi)
+        out["mean_a"].append(chunk.mean(axis=(-2, -1)))
+        out["diff_a"].append(hi - lo)
+        out["dominant_wavelength"].append(np.where(flat, np.nan, 1.0 / k[peak]))
+        out["spectral_entropy"].append(np.where(flat, np.nan, spectral_entropy(radial)))
+    return {key: np.concatenate(v) for key, v in out.items()}
+
+
+# ---------- In-worker reducer ----------
+ENSEMBLE_METRICS = ("max_a", "mean_a", "diff_a", "peak_count", "peak_spacing_mean",
+                    "dct_wavelength", "spectral_entropy", "dominant_wavelength")
+
+
+def ensemble_reducer(result):
+    """
+    Reducer for an ensemble run (replicates > 1, (K, N) final profiles): fraction of
+    replicates per pattern class and converged, the majority pattern_class, and the
+    mean/variance over replicates of each metric (<metric>_mean, <metric>_var; NaNs
+    such as the wavelength of homogeneous replicates are ignored).
+    """
+    p = result["parameters"]
+    a = np.asarray(result["activator_final"], dtype=float)
+    converged = np.asarray(result["converged"], dtype=bool)
+    feats = extract_features(a, dx=p.get("dx", 1.0))
+    labels = classify_patterns(feats, converged=converged)
+    counts = np.bincount(labels, minlength=len(PATTERN_CLASSES))
+
+    out = {
+        "replicates": len(a),
+        "pattern_class": PATTERN_CLASSES[int(np.argmax(counts))],
+        "frac_patterned": float(counts[PATTERN] / len(a)),
+        "frac_oscillating": float(counts[OSCILLATING] / len(a)),
+        "frac_converged": float(converged.mean()),
+        "steps_used_mean": float(np.mean(result["steps_used"])),
+    }
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)  # all-NaN metrics give NaN
+        for k in ENSEMBLE_METRICS:
+            out[f"{k}_mean"] = float(np.nanmean(feats[k]))
+            out[f"{k}_var"] = float(np.nanvar(feats[k]))
+    return out
+
+
+def pattern_reducer(result):
+    """
+    Reducer for run_simulation: pattern metrics of one run's final activator profile
+    plus its convergence metadata, as a flat dict of scalars. Ensemble results
+    ((K, N) profiles) are summarised by ensemble_reducer instead.
+    """
+    if np.ndim(result["activator_final"]) == 2:
+        return ensemble_reducer(result)
+    p = result["parameters"]
+    a = np.asarray(result["activator_final"], dtype=float)
+    feats = extract_features(a[None, :], dx=p.get("dx", 1.0))
+    label = classify_patterns(feats, converged=[result.get("converged", True)])[0]
+
+    out = {k: feats[k][0].item() for k in ("max_a", "mean_a", "diff_a", "peak_count",
+                                           "peak_spacing_mean", "dct_wavelength",
+                                           "spectral_entropy", "dominant_wavelength")}
+    out.update({
+        "pattern_class": PATTERN_CLASSES[label],
+        "steps_used": result.get("steps_used"),
+        "converged": result.get("converged"),
+        "final_change": result.get("final_change"),
+    })
+    return out
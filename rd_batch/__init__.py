@@ -0,0 +1,6 @@
+"""
+Parameter sweeps over the reaction–diffusion model: grid/sampling (grid), the sweep
+runner (batch_runner), result cache, surrogate screening and pattern analysis.
+
+The modules also run as scripts from inside this directory (python batch_runner.py).
+"""
@@ -1,15 +1,13 @@
 import sys
 from pathlib import Path
 import numpy as np
-import pandas as pd
 import re
-import matplotlib.pyplot as plt
 
-# allow importing simulation.py from parent directory
-ROOT = Path(__file__).resolve().parent.parent
-sys.path.insert(0, str(ROOT))
+if not __package__:  # run as a script: allow importing pattern_analysis.py from the parent directory
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from pattern_analysis import extract_features, classify_patterns, PATTERN_CLASSES, FEATURE_KEYS
 
-from visualize import plot_one_frame
+CHUNK_ROWS = 20000
 
 def analyze_pattern(a, dx=1.0, plot=False):
     N = len(a)
@@ -24,6 +22,7 @@ def analyze_pattern(a, dx=1.0, plot=False):
     dominant_wavelength = 1 / dominant_freq if dominant_freq != 0 else np.inf
 
     if plot:
+        import matplotlib.pyplot as plt
         plt.figure(figsize=(6, 3))
         plt.plot(freqs[pos_mask], power[pos_mask])
         plt.xlabel("Spatial frequency (1/unit length)")
@@ -53,45 +52,68 @@ def parse_list_string(s):
         return None
 
 
-# === Load file ===
-if len(sys.argv) < 2:
-    print("Usage: python analyze_batch.py <path/to/batch_results.csv>")
-    sys.exit(1)
-
-input_file = sys.argv[1] + "/batch_results.csv"
-df = pd.read_csv(input_file)
-
-dominant_freqs = []
-dominant_wavelengths = []
-a_max = []
-a_diff = []
-
-for i, row in df.iterrows():
-    a = parse_list_string(row["activator_final"])
-    if a is None or len(a) < 3:
-        print(f"Skipping row {i}: could not parse activator_final")
-        dominant_freqs.append(np.nan)
-        dominant_wavelengths.append(np.nan)
-        a_diff.append(np.nan)
-        a_max.append(np.nan)
-        continue
-
-    amax_single = a.max()
-    a_max.append(amax_single)
-    a_diff.append(amax_single - a.min())
-
-    if np.std(a) < 1e-6 or np.isnan(a).any():
-        dominant_freqs.append(np.nan)
-        dominant_wavelengths.append(np.nan)
-        continue
-
-    dom_freq, dom_lambda = analyze_pattern(a, dx=1.0, plot=False)
-    dominant_freqs.append(dom_freq)
-    dominant_wavelengths.append(dom_lambda)
-
-df["dominant_freq"] = dominant_freqs
-df["dominant_wavelength"] = dominant_wavelengths
-df["max_a"] = a_max
-df["diff_a"] = a_diff
-
-df.to_csv(sys.argv[1] + "/patterning_summary.csv", index=False)
+def parse_profiles(column):
+    """
+    Parse a column of JSON list strings (as written by batch_runner) into a (B, N) array.
+
+    All rows are parsed with a single np.fromstring call when they share a length;
+    otherwise falls back to parse_list_string row by row. Unparseable or short rows
+    become NaN rows.
+    """
+    strings = [s if isinstance(s, str) else "" for s in column]
+    lengths = np.array([s.count(",") + 1 if s else 0 for s in strings])
+    N = int(lengths.max()) if len(lengths) else 0
+    if N >= 3 and np.all(lengths == N):
+        flat = np.fromstring(",".join(s.strip().strip("[]") for s in strings), sep=",")
+        if flat.size == len(strings) * N:
+            return flat.reshape(len(strings), N)
+
+    rows = [parse_list_string(s) for s in column]
+    N = max((len(r) for r in rows if r is not None), default=0)
+    out = np.full((len(rows), N), np.nan)
+    for i, r in enumerate(rows):
+        if r is None or len(r) < 3 or len(r) != N:
+            print(f"Skipping row {i}: could not parse activator_final")
+            continue
+        out[i] = r
+    return out
+
+
+def main():
+    import pandas as pd
+
+    # === Load file ===
+    if len(sys.argv) < 2:
+        print("Usage: python analyze_patterns.py <path/to/run_dir>")
+        sys.exit(1)
+
+    input_file = sys.argv[1] + "/batch_results.csv"
+    steps_total = None
+    constants_file = Path(sys.argv[1]) / "constants.txt"
+    if constants_file.exists():
+        for line in constants_file.read_text().splitlines():
+            k, _, v = line.partition("\t")
+            if k == "steps":
+                steps_total = int(float(v))
+
+    summaries = []
+    for df in pd.read_csv(input_file, chunksize=CHUNK_ROWS):
+        a = parse_profiles(df["activator_final"])
+        feats = extract_features(a, dx=1.0)
+
+        converged = None
+        if steps_total is not None and "steps_used" in df:
+            converged = df["steps_used"].to_numpy() < steps_total - 1
+        labels = classify_patterns(feats, converged=converged)
+
+        for k in FEATURE_KEYS:
+            df[k] = feats[k]
+        df["pattern_class"] = np.asarray(PATTERN_CLASSES)[labels]
+        summaries.append(df)
+
+    df = pd.concat(summaries, ignore_index=True)
+    df.to_csv(sys.argv[1] + "/patterning_summary.csv", index=False)
+    print(f"Saved {len(df)} rows to {sys.argv[1]}/patterning_summary.csv")
+
+if __name__ == "__main__":
+    main()
@@ -1,75 +1,692 @@
 from pathlib import Path
 import sys, os
 import argparse
-import pandas as pd
-from joblib import Parallel, delayed
-from tqdm import tqdm
-import yaml  # <— requires PyYAML: pip install pyyaml
+import hashlib
+import json
+import logging
+import time
+import numpy as np
+# pandas, joblib, tqdm and PyYAML are imported where they are used, so joblib workers
+# (which import this module to unpickle run_one) only load numpy and the simulation core
 
-# allow importing simulation.py from parent directory
-ROOT = Path(__file__).resolve().parent.parent
-sys.path.insert(0, str(ROOT))
-from simulation import run_simulation
-
-from grid import make_param_grid
-from io_utils import _to_json_list, write_constants_txt
+if __package__:
+    from .grid import make_param_grid, sweep_axes, params_at, adaptive_refine, fill_phase
+    from .io_utils import write_constants_txt, PROFILE_COLS
+    from .surrogate import load_training, KNNSurrogate
+    from .result_cache import from_config as cache_from_config
+    from .result_writer import ResultWriter, WRITER_DEFAULTS
+else:  # run as a script from inside rd_batch/: allow importing simulation.py from the parent directory
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+    from grid import make_param_grid, sweep_axes, params_at, adaptive_refine, fill_phase
+    from io_utils import write_constants_txt, PROFILE_COLS
+    from surrogate import load_training, KNNSurrogate
+    from result_cache import from_config as cache_from_config
+    from result_writer import ResultWriter, WRITER_DEFAULTS
+from simulation import run_simulation, canonical_params, is_stochastic, check_multilevel
+from model_params import ModelParams, check_keys
+from sensitivity import SENSITIVITY_PARAMS, METRICS
+from pattern_analysis import pattern_reducer
 
 OUTPUT_COLS = [
     "steps_used", "activator_steady-state", "inhibitor_steady-state",
     "activator_final", "inhibitor_final"
 ]
+FEATURE_COLS = [
+    "converged", "final_change", "pattern_class", "dominant_wavelength", "dct_wavelength",
+    "diff_a", "max_a", "mean_a", "peak_count", "peak_spacing_mean", "spectral_entropy",
+]
+
+# ensemble sweeps (replicates > 1) report these instead of FEATURE_COLS
+ENSEMBLE_COLS = [
+    "replicates", "pattern_class", "frac_patterned", "frac_oscillating", "frac_converged", "steps_used_mean",
+] + [f"{k}_{s}" for k in ("dct_wavelength", "dominant_wavelength", "peak_count", "peak_spacing_mean",
+                          "diff_a", "max_a", "mean_a", "spectral_entropy") for s in ("mean", "var")]
+
+# CSV dtypes of the integer and boolean output columns: fixed once for the whole store, so a
+# batch with a missing value (e.g. surrogate-predicted rows) does not write 3.0 for 3
+COLUMN_DTYPES = {
+    **dict.fromkeys(["steps_used", "peak_count", "seed", "replicates", "refine_round",
+                     "ml_coarse_steps", "ml_fine_steps", "ml_direct_steps"], "Int64"),
+    "converged": "boolean",
+}
+
+PERF_PHASES = ["t_steady_state", "t_init", "t_step", "t_convergence", "t_history"]
 
-def run_one(p, varied_keys):
-    r = run_simulation(p)
+logger = logging.getLogger("rd_batch")
+
+def setup_logging(level):
+    """Configure logging in this process (called in every worker, since joblib spawns fresh ones)."""
+    logging.basicConfig(format="%(asctime)s %(processName)s %(name)s %(levelname)s: %(message)s")
+    logging.getLogger().setLevel(level)
+
+def run_one(p, varied_keys, reducer=None, keep_profile=True, log_level="WARNING", profile_path=None,
+            cache=None, sensitivity=None, multilevel=None):
+    setup_logging(log_level)
+    r = run_simulation(p, reducer=reducer, profile_path=profile_path, cache=cache, sensitivity=sensitivity,
+                       multilevel=multilevel)
     row = {k: p[k] for k in varied_keys}
+    if "seed" in p:
+        row["seed"] = p["seed"]
+    ensemble = np.ndim(r["activator_final"]) == 2
+    # arrays stay arrays (compact to pickle); the result writer serializes them in bulk
     row.update({
-        "steps_used": r.get("steps_used"),
-        "activator_steady-state": _to_json_list(r.get("activator_steady-state")),
-        "inhibitor_steady-state": _to_json_list(r.get("inhibitor_steady-state")),
+        "steps_used": int(np.max(r["steps_used"])),
+        "activator_steady-state": _own(r.get("activator_steady-state")),
+        "inhibitor_steady-state": _own(r.get("inhibitor_steady-state")),
+    })
+    if keep_profile:  # ensembles store the first replicate's profiles
+        row.update({
+            "activator_final": _own(r["activator_final"][0] if ensemble else r["activator_final"]),
+            "inhibitor_final": _own(r["inhibitor_final"][0] if ensemble else r["inhibitor_final"])
+        })
+    if reducer is not None:
+        row.update({k: v for k, v in r["features"].items() if k != "steps_used"})
+    if sensitivity is not None:
+        s = r["sensitivity"]
+        if "stability" in s:
+            row["stability"] = s["stability"]
+        for m, grads in s["metrics"].items():
+            row.update({f"d_{m}_d_{k}": v for k, v in grads.items() if k != "value"})
+    if multilevel is not None:
+        row.update({f"ml_{k}": v for k, v in r["multilevel"].items() if f"ml_{k}" in MULTILEVEL_COLS + MULTILEVEL_COMPARE_COLS})
+    return row, r["perf"]
 
-        "activator_final": _to_json_list(r.get("activator_final")),
-        "inhibitor_final": _to_json_list(r.get("inhibitor_final"))
+def _own(x):
+    """A compact float copy of an array (final frames are views into the whole history); scalars pass through."""
+    return np.array(x, dtype=float) if np.ndim(x) > 0 else x
 
-    })
-    return row
+def with_run_seed(p, sweep_seed):
+    """
+    Give a stochastic run (random init or noise) its own reproducible seed, derived from the sweep seed and
+    the run's canonical parameters. Keying on content rather than run index means a
+    point gets the same initial state in any grid or sampling order, so dedup and the
+    result cache keep working. An explicit "seed" in the params is left alone.
+    """
+    if "seed" in p or not is_stochastic(p):
+        return p
+    digest = hashlib.sha256(repr(canonical_params(p)).encode()).digest()
+    state = np.random.SeedSequence([sweep_seed, int.from_bytes(digest[:8], "little")]).generate_state(1, np.uint64)
+    return {**p, "seed": int(state[0]) >> 1}  # 63 bits, fits an int64 CSV column
 
-def main():
-    ap = argparse.ArgumentParser()
-    ap.add_argument("--config", "-c", default="config.yaml", help="Path to YAML config")
-    args = ap.parse_args()
+def telemetry_plan(cfg, outdir):
+    """
+    Read the optional `telemetry:` block of the config:
+      log_level: WARNING  -> logging level in the workers (INFO shows per-run stop messages)
+      profile: false      -> run under cProfile and dump stats to OUTDIR/profiles/
+      profile_every: 100  -> with profile: true, profile every n-th run
+    Returns (log_level, profile_path(index) -> path or None).
+    """
+    tel = cfg.get("telemetry", {}) or {}
+    log_level = str(tel.get("log_level", "WARNING")).upper()
+    if not tel.get("profile", False):
+        return log_level, lambda i: None
+    every = max(1, int(tel.get("profile_every", 100)))
+    prof_dir = os.path.join(outdir, "profiles")
+    os.makedirs(prof_dir, exist_ok=True)
+    return log_level, lambda i: os.path.join(prof_dir, f"run_{i:06d}.prof") if i % every == 0 else None
+
+def perf_summary(perfs, wall_time, n_jobs):
+    """Aggregate per-run perf dicts into a per-sweep performance summary (None entries = deduplicated rows)."""
+    import pandas as pd
+
+    df = pd.DataFrame([p for p in perfs if p is not None])
+    if df.empty:  # a sweep with no runs (header-only store)
+        return {
+            "runs": 0, "sweep_wall_time": wall_time, "runs_per_sec": 0.0, "worker_busy_time": 0.0,
+            "parallel_efficiency": None, "phase_totals": {k: 0.0 for k in PERF_PHASES}, "phase_fractions": {},
+            "run_wall_time": {"p50": None, "p95": None, "max": None},
+            "steps_per_sec_mean": None, "cell_steps_per_sec_mean": None, "peak_rss_mb_max": None, "cache_hits": 0,
+        }
+    phase_totals = {k: float(df[k].sum()) for k in PERF_PHASES}
+    busy = float(df["wall_time"].sum())
+    summary = {
+        "runs": len(df),
+        "sweep_wall_time": wall_time,
+        "runs_per_sec": len(df) / wall_time if wall_time > 0 else None,
+        "worker_busy_time": busy,
+        "parallel_efficiency": busy / (wall_time * n_jobs) if wall_time > 0 else None,
+        "phase_totals": phase_totals,
+        "phase_fractions": {k: v / busy for k, v in phase_totals.items()} if busy > 0 else {},
+        "run_wall_time": {q: float(df["wall_time"].quantile(v))
+                          for q, v in (("p50", 0.5), ("p95", 0.95), ("max", 1.0))},
+        "steps_per_sec_mean": float(df["steps_per_sec"].mean()),
+        "cell_steps_per_sec_mean": float(df["cell_steps_per_sec"].mean()),
+        "peak_rss_mb_max": float(df["peak_rss_mb"].max()) if df["peak_rss_mb"].notna().any() else None,
+        "cache_hits": int(df["cache_hit"].sum()),
+    }
+    return summary
+
+def output_plan(cfg):
+    """
+    Read the optional `output:` block of the config:
+      features: true       -> compute pattern metrics inside each worker (pattern_reducer)
+      profiles: all        -> all | none | sample (store full final profiles)
+      sample_every: 100    -> with profiles: sample, keep profiles of every n-th run
+    Returns (reducer, keep_profile(index) -> bool, output columns).
+    """
+    out = cfg.get("output", {}) or {}
+    # adaptive sweeps, surrogate screening and ensembles classify outcomes from the in-worker features
+    ensemble = int(cfg.get("replicates", 1)) > 1
+    features = (bool(out.get("features", False)) or cfg.get("mode") == "adaptive"
+                or bool(cfg.get("surrogate")) or ensemble)
+    profiles = out.get("profiles", "all")
+    if profiles not in ("all", "none", "sample"):
+        raise ValueError(f"output.profiles must be 'all', 'none' or 'sample', got {profiles!r}")
+    if profiles == "none" and not features:
+        raise ValueError("output.profiles: none needs output.features: true, nothing would be stored")
+    every = max(1, int(out.get("sample_every", 100)))
+
+    if profiles == "all":
+        keep_profile = lambda i: True
+    elif profiles == "none":
+        keep_profile = lambda i: False
+    else:
+        keep_profile = lambda i: i % every == 0
+
+    cols = [c for c in OUTPUT_COLS if profiles != "none" or c not in PROFILE_COLS]
+    if features:
+        cols += ENSEMBLE_COLS if ensemble else FEATURE_COLS
+    return (pattern_reducer if features else None), keep_profile, cols
+
+def sensitivity_plan(cfg):
+    """
+    Read the optional `sensitivity:` block of the config:
+      params: [act_prod_rate]  -> parameters to differentiate by (default: the swept model parameters)
+      metrics: [mean_a, var_a] -> differentiable metrics of the final activator (sensitivity.METRICS)
+      method: steady           -> steady: implicit/adjoint solve at the final state (converged runs)
+                                  forward: tangents integrated along the run (any run, ~1+P times the cost)
+    Returns (run_simulation sensitivity options or None, output columns d_<metric>_d_<param>).
+    """
+    sc = cfg.get("sensitivity")
+    if not sc:
+        return None, []
+    if int(cfg.get("replicates", 1)) > 1:
+        raise ValueError("sensitivity: is not supported for ensemble sweeps (replicates > 1)")
+    sc = {} if sc is True else sc
+    params = list(sc.get("params") or [k for k in cfg.get("sweeps", {}) if k in SENSITIVITY_PARAMS])
+    metrics = list(sc.get("metrics", ["mean_a", "var_a"]))
+    method = sc.get("method", "steady")
+    bad = [k for k in params if k not in SENSITIVITY_PARAMS] + [m for m in metrics if m not in METRICS]
+    if bad or not params:
+        raise ValueError(f"sensitivity: unknown or missing params/metrics {bad}; "
+                         f"params from {SENSITIVITY_PARAMS}, metrics from {tuple(METRICS)}")
+    if method not in ("steady", "forward"):
+        raise ValueError(f"sensitivity.method must be 'steady' or 'forward', got {method!r}")
+    cols = (["stability"] if method == "steady" else []) + [f"d_{m}_d_{k}" for m in metrics for k in params]
+    return {"params": params, "metrics": metrics, "method": method}, cols
+
+MULTILEVEL_COLS = ["ml_coarse_steps", "ml_fine_steps", "ml_t_coarse", "ml_t_fine",
+                   "ml_coarse_steps_per_sec", "ml_fine_steps_per_sec"]
+MULTILEVEL_COMPARE_COLS = ["ml_direct_steps", "ml_t_direct", "ml_time_saved", "ml_speedup",
+                           "ml_activator_max_abs_diff", "ml_activator_rel_l2_diff",
+                           "ml_inhibitor_max_abs_diff", "ml_inhibitor_rel_l2_diff"]
+
+def multilevel_plan(cfg):
+    """
+    Read the optional `multilevel:` block of the config (1D paracrine sweeps only):
+      factor: 4          -> the coarse grid has N / factor cells over the same domain
+      coarse_tol: 10.0   -> the coarse stage stops at coarse_tol * stopping_threshold
+      coarse_dt: null    -> time step of the coarse stage (default: dt)
+      compare: false     -> also run directly and record speedup and field differences
+    Returns (run_simulation multilevel options or None, output columns ml_*).
+    """
+    mc = cfg.get("multilevel")
+    if not mc:
+        return None, []
+    mc = {} if mc is True else dict(mc)
+    unknown = set(mc) - {"factor", "coarse_tol", "coarse_dt", "compare"}
+    if unknown:
+        raise ValueError(f"multilevel: unknown options {sorted(unknown)}")
+    if int(cfg.get("replicates", 1)) > 1:
+        raise ValueError("multilevel: is not supported for ensemble sweeps (replicates > 1)")
+    check_multilevel(cfg.get("base", {}), cfg.get("base", {}).get("activator_type", "juxtacrine"),
+                     mc.get("factor", 4))
+    return mc, MULTILEVEL_COLS + (MULTILEVEL_COMPARE_COLS if mc.get("compare") else [])
+
+def writer_plan(cfg):
+    """
+    Read the optional `writer:` block of the config (the background result writer):
+      batch_rows: 256      -> serialize and append rows in batches of this many
+      flush_seconds: 2.0   -> or when the oldest queued row has waited this long
+      max_queue: 1024      -> finished rows waiting for the writer; beyond, the sweep waits
+    Returns ResultWriter keyword arguments.
+    """
+    wc = dict(cfg.get("writer") or {})
+    unknown = set(wc) - set(WRITER_DEFAULTS)
+    if unknown:
+        raise ValueError(f"writer: unknown options {sorted(unknown)}, expected {sorted(WRITER_DEFAULTS)}")
+    wc = {**WRITER_DEFAULTS, **wc}
+    if wc["batch_rows"] < 1 or wc["max_queue"] < 1 or wc["flush_seconds"] < 0:
+        raise ValueError(f"writer: batch_rows and max_queue must be >= 1 and flush_seconds >= 0, got {wc}")
+    return wc
+
+def run_adaptive(cfg, base, sweeps, outdir, run_batch, log=print):
+    """
+    Adaptive sweep (mode: adaptive). The sweep values define the target resolution;
+    grid.adaptive_refine starts from a coarse grid and only refines cells whose corner
+    outcomes differ. Optional `adaptive:` block:
+      coarse: 5            -> points per axis in the first round
+      budget: 5000         -> maximum number of simulations
+      max_rounds: null     -> maximum number of refinement rounds
+      label: pattern_class -> output column used to compare outcomes
+    Writes phase_diagram.npy (int8 codes at full resolution, -1 = unresolved) and
+    phase_diagram.json (axes and code table). Returns (rows, perfs) of the runs made.
+    """
+    ad = cfg.get("adaptive", {}) or {}
+    label_col = ad.get("label", "pattern_class")
+    keys, axes = sweep_axes(sweeps)
+    shape = tuple(len(a) for a in axes)
+    rows, perfs = [], []
+    round_no = [0]
+
+    def evaluate(points):
+        plist = [params_at(base, keys, axes, idx) for idx in points]
+        results = run_batch(plist, start=len(rows), desc=f"Adaptive round {round_no[0]}")
+        labels = []
+        for row, perf in results:
+            row["refine_round"] = round_no[0]
+            rows.append(row)
+            perfs.append(perf)
+            labels.append(row[label_col])
+        round_no[0] += 1
+        return labels
+
+    evaluated, leaves, rounds = adaptive_refine(
+        shape, evaluate, coarse=int(ad.get("coarse", 5)),
+        budget=ad.get("budget"), max_rounds=ad.get("max_rounds"),
+    )
+    codes = {label: code for code, label in enumerate(sorted(set(evaluated.values()), key=str))}
+    phase = fill_phase(shape, evaluated, leaves, codes)
+    np.save(os.path.join(outdir, "phase_diagram.npy"), phase)
+    with open(os.path.join(outdir, "phase_diagram.json"), "w") as f:
+        json.dump({"keys": keys, "axes": [a.tolist() for a in axes], "label": label_col,
+                   "codes": {str(k): v for k, v in codes.items()}, "rounds": rounds}, f, indent=2)
+    log(f"Adaptive sweep: {len(evaluated)} of {int(np.prod(shape))} grid points simulated in {rounds} rounds, "
+        f"{int((phase < 0).sum())} left unresolved")
+    return rows, perfs
+
+def run_screened(cfg, param_list, varied_keys, base, outdir, run_batch, log=print):
+    """
+    Surrogate screening (optional `surrogate:` block):
+      train: [runs/exp-007-..., ...] -> earlier run dirs to learn from (comparable settings only)
+      confidence: 0.95               -> skip points whose predicted outcome is at least this certain
+      audit_fraction: 0.05           -> still simulate this share of confident points, to measure accuracy
+      round_size: null               -> simulate uncertain points in rounds of this size, refitting
+                                        the surrogate on new results between rounds (active learning)
+      k: 15                          -> neighbours of the k-NN surrogate
+      min_train: 100                 -> below this many training runs, simulate everything
+    Uncertain points are simulated first, most uncertain first. Skipped points get
+    predicted outcomes with surrogate = "predicted". Writes surrogate_report.json.
+    Returns (rows, perfs) in param_list order.
+    """
+    sc = cfg["surrogate"]
+    threshold = float(sc.get("confidence", 0.95))
+    audit_fraction = float(sc.get("audit_fraction", 0.05))
+    round_size = sc.get("round_size")
+    rng = np.random.default_rng(cfg.get("seed", 0))
+
+    X, y, lam, steps = load_training(sc.get("train", []), varied_keys, base)
+    n_train = len(y)
+    Q = np.array([[p[k] for k in varied_keys] for p in param_list], dtype=float)
+    rows, perfs = [None] * len(param_list), []
+
+    if n_train < int(sc.get("min_train", 100)):
+        log(f"Surrogate: only {n_train} comparable training runs, simulating all points")
+        results = run_batch(param_list)
+        for j, (row, perf) in enumerate(results):
+            row["surrogate"] = "simulated"
+            rows[j] = row
+            perfs.append(perf)
+        return rows, perfs
+
+    model = KNNSurrogate(k=int(sc.get("k", 15))).fit(X, y, lam, steps)
+    remaining = np.arange(len(param_list))
+    audits, rounds = [], 0
+    while len(remaining):
+        pred = model.predict(Q[remaining])
+        confident = pred["confidence"] >= threshold
+        audit = confident & (rng.random(len(remaining)) < audit_fraction)
+
+        for j in np.flatnonzero(confident & ~audit):
+            idx = remaining[j]
+            row = {k: param_list[idx][k] for k in varied_keys}
+            row.update({
+                "steps_used": int(round(pred["steps_used"][j])),
+                "pattern_class": "pattern" if pred["p_patterned"][j] >= 0.5 else "homogeneous",
+                "dct_wavelength": pred["dct_wavelength"][j],
+                "surrogate": "predicted",
+                "p_patterned": pred["p_patterned"][j],
+            })
+            rows[idx] = row
+
+        todo = np.flatnonzero(~confident | audit)
+        todo = todo[np.argsort(pred["confidence"][todo], kind="stable")]
+        batch = todo if round_size is None else todo[:int(round_size)]
+        if len(batch) == 0:
+            break
+        results = run_batch([param_list[remaining[j]] for j in batch],
+                            start=sum(r is not None and r["surrogate"] != "predicted" for r in rows),
+                            desc=f"Surrogate round {rounds}")
+        new_X, new_y, new_lam, new_steps = [], [], [], []
+        for j, (row, perf) in zip(batch, results):
+            idx = remaining[j]
+            row["surrogate"] = "audit" if audit[j] else "simulated"
+            row["p_patterned"] = pred["p_patterned"][j]
+            if audit[j]:
+                audits.append((pred["p_patterned"][j] >= 0.5, row["pattern_class"] == "pattern"))
+            rows[idx] = row
+            perfs.append(perf)
+            new_X.append(Q[idx])
+            new_y.append(row["pattern_class"] == "pattern")
+            new_lam.append(row.get("dct_wavelength", np.nan))
+            new_steps.append(row["steps_used"])
+        rounds += 1
+
+        # refit on everything simulated so far, then re-screen what is left
+        X = np.vstack([X, new_X])
+        y = np.concatenate([y, new_y])
+        lam = np.concatenate([lam, np.asarray(new_lam, dtype=float)])
+        steps = np.concatenate([steps, np.asarray(new_steps, dtype=float)])
+        model.fit(X, y, lam, steps)
+        remaining = remaining[todo[len(batch):]]
+
+    n_pred = sum(r["surrogate"] == "predicted" for r in rows)
+    report = {
+        "points": len(param_list),
+        "simulated": len(param_list) - n_pred,
+        "predicted": n_pred,
+        "training_runs": n_train,
+        "rounds": rounds,
+        "confidence_threshold": threshold,
+        "audited": len(audits),
+        "audit_accuracy": float(np.mean([a == b for a, b in audits])) if audits else None,
+    }
+    with open(os.path.join(outdir, "surrogate_report.json"), "w") as f:
+        json.dump(report, f, indent=2)
+    log(f"Surrogate: simulated {report['simulated']} of {len(param_list)} points "
+        f"({n_pred} predicted, audit accuracy {report['audit_accuracy']})")
+    return rows, perfs
 
-    cfg_path = Path(args.config)
+class SweepCancelled(Exception):
+    """Raised inside run_sweep when its cancel event is set."""
+
+
+def iter_execute(tasks, n_jobs, desc="Running simulations", progress=None, cancel=None):
+    """
+    Run joblib delayed tasks in parallel and yield their results in order. Results
+    are consumed as they complete (return_as="generator"), so `progress(done, total, desc)`
+    sees every completion and setting the `cancel` event stops the sweep between
+    completions; the remaining tasks are then abandoned. Without a progress callback
+    a tqdm bar is shown.
+    """
+    from joblib import Parallel
+
+    tasks = list(tasks)
+    gen = Parallel(n_jobs=n_jobs, return_as="generator")(tasks)
+    done = 0
+    try:
+        if progress is None:
+            from tqdm import tqdm
+            gen_iter = tqdm(gen, total=len(tasks), desc=desc)
+        else:
+            gen_iter = gen
+        for r in gen_iter:
+            done += 1
+            yield r
+            if progress is not None:
+                progress(done, len(tasks), desc)
+            if cancel is not None and cancel.is_set():
+                raise SweepCancelled(f"cancelled after {done} of {len(tasks)} runs ({desc})")
+    finally:
+        gen.close()
+
+def execute(tasks, n_jobs, desc="Running simulations", progress=None, cancel=None):
+    """iter_execute collected into a list."""
+    return list(iter_execute(tasks, n_jobs, desc, progress, cancel))
+
+
+def load_config(path):
+    import yaml  # <— requires PyYAML: pip install pyyaml
+
+    cfg_path = Path(path)
     if not cfg_path.exists():
         raise FileNotFoundError(f"Config file not found: {cfg_path.resolve()}")
-
     with open(cfg_path, "r") as f:
-        cfg = yaml.safe_load(f)
+        return yaml.safe_load(f)
 
-    # read config
-    OUTDIR = cfg.get("outdir", "runs/default")
-    MODE = cfg.get("mode", "grid")
-    BASE = cfg["base"]
-    SWEEPS = cfg.get("sweeps", {})
 
-    os.makedirs(OUTDIR, exist_ok=True)
-    varied_keys = list(SWEEPS.keys())
+def sweep_plan(cfg):
+    """
+    Validate a parsed config and derive everything a sweep needs: base parameters,
+    varied keys, the output plan, telemetry, worker count, result cache and sweep seed.
+    Also writes constants.txt to the output directory. Shared by run_sweep and the
+    shared-filesystem work queue (rd_batch.work_queue), whose workers rebuild the
+    plan from the queued config.
+    """
+    outdir = cfg.get("outdir", "runs/default")
+    mode = cfg.get("mode", "grid")
+    base = cfg["base"]
+    sweeps = cfg.get("sweeps", {})
 
-    # build grid and constants
-    param_list = make_param_grid(BASE, sweeps=SWEEPS, mode=MODE)
-    constants = {k: v for k, v in BASE.items() if k not in varied_keys}
-    write_constants_txt(constants, os.path.join(OUTDIR, "constants.txt"))
+    replicates = int(cfg.get("replicates", 1))
+    if replicates > 1:  # run K initial-noise realizations of every point together in one worker
+        base = {**base, "replicates": replicates}
 
-    # run sims
-    results = Parallel(n_jobs=-1)(
-        delayed(run_one)(p, varied_keys) for p in tqdm(param_list, desc="Running simulations")
+    varied_keys = list(sweeps.keys())
+    # fail fast on misspelled keys or invalid values, before any worker starts
+    check_keys(list(base) + varied_keys)
+    if mode in ("grid", "zip", "adaptive"):
+        keys, axes = sweep_axes(sweeps)
+        for corner in ((0,) * len(keys), tuple(len(a) - 1 for a in axes)):
+            ModelParams.from_dict(params_at(base, keys, axes, corner))
+    os.makedirs(outdir, exist_ok=True)
+
+    # constants
+    constants = {k: v for k, v in base.items() if k not in varied_keys}
+    write_constants_txt(constants, os.path.join(outdir, "constants.txt"))
+
+    reducer, keep_profile, output_cols = output_plan(cfg)
+    log_level, profile_path = telemetry_plan(cfg, outdir)
+    if is_stochastic(base) and "seed" not in base:
+        output_cols = output_cols + ["seed"]
+    sensitivity, sensitivity_cols = sensitivity_plan(cfg)
+    output_cols = output_cols + sensitivity_cols
+    multilevel, multilevel_cols = multilevel_plan(cfg)
+    output_cols = output_cols + multilevel_cols
+    return {
+        "outdir": outdir, "mode": mode, "base": base, "sweeps": sweeps, "varied_keys": varied_keys,
+        "constants": constants, "reducer": reducer, "keep_profile": keep_profile,
+        "output_cols": output_cols, "log_level": log_level, "profile_path": profile_path,
+        "n_jobs": cfg.get("n_jobs", -1), "cache": cache_from_config(cfg),
+        "sweep_seed": int(cfg.get("seed", 0)), "dedup": cfg.get("dedup", True), "sensitivity": sensitivity,
+        "multilevel": multilevel, "writer": writer_plan(cfg),
+    }
+
+def open_writer(plan):
+    """A ResultWriter for the sweep's batch_results.csv (varied params + outputs only)."""
+    columns = plan["varied_keys"] + plan["output_cols"]
+    return ResultWriter(os.path.join(plan["outdir"], "batch_results.csv"), columns,
+                        dtypes={c: COLUMN_DTYPES[c] for c in plan["output_cols"] if c in COLUMN_DTYPES},
+                        **plan["writer"])
+
+def write_store(plan, rows, perfs, wall_time, log=print, writer=None):
+    """
+    Write batch_results.csv and perf_summary.json for a finished sweep; returns run_sweep's
+    result dict. With `writer`, the rows were already streamed to it (rows is unused) and
+    it is closed here; otherwise rows are written through a new one.
+    """
+    outdir, cache = plan["outdir"], plan["cache"]
+    if writer is None:
+        writer = open_writer(plan)
+        try:
+            for row in rows:
+                writer.put(row)
+        except BaseException:
+            writer.close(commit=False)
+            raise
+    csv_path = writer.path
+    writer_stats = writer.close()
+    n_rows = writer_stats["rows"]
+
+    # per-sweep performance summary
+    n_jobs = plan["n_jobs"]
+    workers = os.cpu_count() if n_jobs == -1 else max(1, int(n_jobs))
+    summary = perf_summary(perfs, wall_time, min(workers, n_rows))
+    summary["writer"] = writer_stats
+    with open(os.path.join(outdir, "perf_summary.json"), "w") as f:
+        json.dump(summary, f, indent=2)
+    logger.info("Perf summary: %s", json.dumps(summary))
+
+    log(f"Wrote {len(plan['constants'])} constants to {outdir}/constants.txt")
+    log(f"Saved {n_rows} rows to {csv_path} in {writer_stats['flushes']} flushes "
+        f"(p95 {1000 * (writer_stats['flush_latency_s']['p95'] or 0):.0f} ms, "
+        f"sweep blocked {writer_stats['put_blocked_s']:.2f}s on the writer)")
+    if summary["runs"]:
+        log(f"{summary['runs']} runs in {wall_time:.1f}s ({summary['runs_per_sec']:.2f} runs/s, "
+            f"{summary['cell_steps_per_sec_mean']:.3g} cell-steps/s per worker); see {outdir}/perf_summary.json")
+    else:
+        log(f"No runs in {wall_time:.1f}s; see {outdir}/perf_summary.json")
+    if cache is not None:
+        log(f"{summary['cache_hits']} of {summary['runs']} runs served from the result cache at {cache.path}")
+    return {"outdir": outdir, "csv": csv_path, "rows": n_rows, "summary": summary}
+
+def iter_tasks(plan, indexed_params, desc="Running simulations", progress=None, cancel=None):
+    """
+    Run (index, params) pairs through run_one in parallel, yielding (row, perf) in order;
+    the index selects profile keeping and cProfile output.
+    """
+    from joblib import delayed
+
+    return iter_execute(
+        (delayed(run_one)(p, plan["varied_keys"], plan["reducer"], plan["keep_profile"](i), plan["log_level"],
+                          plan["profile_path"](i), plan["cache"], plan["sensitivity"], plan["multilevel"])
+         for i, p in indexed_params),
+        plan["n_jobs"], desc, progress, cancel,
     )
 
-    # save CSV with only varied params + outputs
-    df = pd.DataFrame(results)[varied_keys + OUTPUT_COLS]
-    df.to_csv(os.path.join(OUTDIR, "batch_results.csv"), index=False)
+def run_tasks(plan, indexed_params, desc="Running simulations", progress=None, cancel=None):
+    """iter_tasks collected into a list."""
+    return list(iter_tasks(plan, indexed_params, desc, progress, cancel))
+
+def dedup_owners(param_list):
+    """Index of the first entry with the same canonical parameters, for every entry of param_list."""
+    first = {}
+    return [first.setdefault(canonical_params(p), i) for i, p in enumerate(param_list)]
+
+def iter_fan_out(param_list, owner, unique, results, varied_keys):
+    """
+    Expand results of the unique entries ((row, perf) for each index of the sorted list
+    `unique`) back to every entry of param_list, yielding (row, perf) in param_list order
+    as soon as the owner of each entry has finished. A unique row is released after its
+    last copy.
+    """
+    last = {o: i for i, o in enumerate(owner)}
+    by_index, nxt = {}, 0
+    unique = iter(unique)
+    for result in results:  # not zip(): the results generator must run to its end
+        by_index[next(unique)] = result
+        while nxt < len(param_list) and owner[nxt] in by_index:
+            row, perf = by_index[owner[nxt]]
+            if last[owner[nxt]] == nxt:
+                del by_index[owner[nxt]]
+            if owner[nxt] != nxt:
+                row = dict(row)
+                row.update({k: param_list[nxt][k] for k in varied_keys})
+                perf = None
+            yield row, perf
+            nxt += 1
+
+def fan_out(param_list, owner, by_index, varied_keys):
+    """Expand results of the unique entries (by_index[i] = (row, perf)) back to every entry of param_list."""
+    unique = sorted(by_index)
+    return list(iter_fan_out(param_list, owner, unique, (by_index[i] for i in unique), varied_keys))
+
+def run_sweep(cfg, progress=None, cancel=None, log=print):
+    """
+    Run the sweep described by a parsed config dict and write its result store
+    (constants.txt, batch_results.csv, perf_summary.json, ...) to cfg["outdir"].
+
+    This is the body of the batch_runner CLI, shared with the long-lived rd_batch.service:
+    `progress` and `cancel` are passed to iter_execute(), `log` receives the summary lines
+    that the CLI prints. Grid, zip and sampling sweeps stream their rows to a background
+    ResultWriter as they finish; adaptive and surrogate sweeps, which revisit rows between
+    rounds, hand them over at the end. Returns {"outdir", "csv", "rows", "summary"}.
+    """
+    plan = sweep_plan(cfg)
+    varied_keys, output_cols = plan["varied_keys"], plan["output_cols"]
+    dedup = plan["dedup"]
+    dedup_counts = [0, 0]
+
+    def iter_batch(param_list, start=0, desc="Running simulations"):
+        """
+        Run param_list in parallel, yielding (row, perf) per entry in order as runs finish.
+        With dedup on, each canonical configuration is simulated once and its row is fanned
+        back out to all equivalent entries (with their own varied values; perf is None for
+        the copies).
+        """
+        param_list = [with_run_seed(p, plan["sweep_seed"]) for p in param_list]
+        if not dedup:
+            return iter_tasks(plan, ((start + i, p) for i, p in enumerate(param_list)), desc, progress, cancel)
+        owner = dedup_owners(param_list)
+        unique = sorted(set(owner))
+        dedup_counts[0] += len(param_list)
+        dedup_counts[1] += len(unique)
+        results = iter_tasks(plan, ((start + i, param_list[i]) for i in unique), desc, progress, cancel)
+        return iter_fan_out(param_list, owner, unique, results, varied_keys)
+
+    def run_batch(param_list, start=0, desc="Running simulations"):
+        return list(iter_batch(param_list, start, desc))
+
+    # run sims
+    t0 = time.perf_counter()
+    writer = None
+    if plan["mode"] == "adaptive":
+        rows, perfs = run_adaptive(cfg, plan["base"], plan["sweeps"], plan["outdir"], run_batch, log=log)
+        output_cols = output_cols + ["refine_round"]
+    else:
+        param_list = make_param_grid(plan["base"], sweeps=plan["sweeps"], mode=plan["mode"],
+                                     n_samples=cfg.get("samples"), seed=cfg.get("seed", 0))
+        if cfg.get("surrogate"):
+            rows, perfs = run_screened(cfg, param_list, varied_keys, plan["base"], plan["outdir"], run_batch,
+                                       log=log)
+            output_cols = output_cols + ["surrogate", "p_patterned"]
+        else:  # rows stream to the background writer as they finish
+            writer = open_writer(plan)
+            rows, perfs = None, []
+            try:
+                for row, perf in iter_batch(param_list):
+                    writer.put(row)
+                    perfs.append(perf)
+            except BaseException:
+                writer.close(commit=False)
+                raise
+    wall_time = time.perf_counter() - t0
+    if dedup and dedup_counts[0] > dedup_counts[1]:
+        log(f"Deduplicated {dedup_counts[0]} points to {dedup_counts[1]} unique simulations")
+    return write_store({**plan, "output_cols": output_cols}, rows, perfs, wall_time, log=log, writer=writer)
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--config", "-c", default="config.yaml", help="Path to YAML config")
+    ap.add_argument("--local", action="store_true",
+                    help="Run in this process even when an rd_batch.service is running")
+    ap.add_argument("--priority", type=int, default=0,
+                    help="Queue priority when submitted to the service (higher runs first)")
+    args = ap.parse_args()
+
+    cfg = load_config(args.config)
+
+    if not args.local:  # hand the sweep to a warm service if one is listening
+        if __package__:
+            from .service import Client
+        else:
+            from service import Client
+        client = Client()
+        if client.is_running():
+            print(f"Submitting to rd_batch.service at {client.url} (use --local to run here)")
+            raise SystemExit(client.run(cfg, priority=args.priority))
 
-    print(f"Wrote {len(constants)} constants to {OUTDIR}/constants.txt")
-    print(f"Saved {len(df)} rows to {OUTDIR}/batch_results.csv")
+    run_sweep(cfg)
 
 if __name__ == "__main__":
     main()
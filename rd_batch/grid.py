@@ -28,7 +28,8 @@ def _to_values(val: Union[ArrayLike, Dict[str, Tuple[float, float, int]], List[A
         # Concatenate if it's a list-of-specs (e.g., [[...], {...}, ...])
         if any(isinstance(x, (list, tuple, dict)) for x in val):
             parts = [_to_values(x) for x in val]
-            # optional: drop duplicate touching endpoints between segments
+            # duplicate touching endpoints between segments are kept here and
+            # deduplicated at dispatch (batch_runner, simulation.canonical_params)
             out = np.concatenate(parts)
             return out
         # A single 3-item numeric spec => linspace
@@ -41,14 +42,164 @@ def _to_values(val: Union[ArrayLike, Dict[str, Tuple[float, float, int]], List[A
     # Fallback: explicit iterable
     return np.array(list(val), dtype=float)
 
+# ---------- Quasi-random / random sampling ----------
+SAMPLING_MODES = ("sobol", "lhs", "random")
+
+# Sobol direction numbers (Joe & Kuo, new-joe-kuo-6.21201) for dimensions 2..21:
+# (degree s, polynomial coefficients a, initial m_1..m_s); dimension 1 is the van der Corput sequence
+_SOBOL_DIRECTIONS = [
+    (1, 0, (1,)),
+    (2, 1, (1, 3)),
+    (3, 1, (1, 3, 1)),
+    (3, 2, (1, 1, 1)),
+    (4, 1, (1, 1, 3, 3)),
+    (4, 4, (1, 3, 5, 13)),
+    (5, 2, (1, 1, 5, 5, 17)),
+    (5, 4, (1, 1, 5, 5, 5)),
+    (5, 7, (1, 1, 7, 11, 19)),
+    (5, 11, (1, 1, 5, 1, 1)),
+    (5, 13, (1, 1, 1, 3, 11)),
+    (5, 14, (1, 3, 5, 5, 31)),
+    (6, 1, (1, 3, 3, 9, 7, 49)),
+    (6, 13, (1, 1, 1, 15, 21, 21)),
+    (6, 16, (1, 3, 1, 13, 27, 49)),
+    (6, 19, (1, 1, 1, 15, 7, 5)),
+    (6, 22, (1, 3, 1, 15, 13, 25)),
+    (6, 25, (1, 1, 5, 5, 19, 61)),
+    (7, 1, (1, 3, 7, 11, 23, 15, 103)),
+    (7, 4, (1, 3, 7, 13, 13, 15, 69)),
+]
+_SOBOL_BITS = 32
+
+
+def _sobol_directions(n_dims: int) -> np.ndarray:
+    """(n_dims, 32) uint64 table of direction numbers v_j scaled to 32 bits."""
+    if n_dims > len(_SOBOL_DIRECTIONS) + 1:
+        raise ValueError(f"'sobol' mode supports up to {len(_SOBOL_DIRECTIONS) + 1} swept parameters, got {n_dims}")
+    L = _SOBOL_BITS
+    V = np.zeros((n_dims, L), dtype=np.uint64)
+    V[0] = [1 << (L - 1 - j) for j in range(L)]
+    for d in range(1, n_dims):
+        s, a, m = _SOBOL_DIRECTIONS[d - 1]
+        v = [0] * L
+        for j in range(min(s, L)):
+            v[j] = m[j] << (L - 1 - j)
+        for j in range(s, L):
+            v[j] = v[j - s] ^ (v[j - s] >> s)
+            for k in range(1, s):
+                if (a >> (s - 1 - k)) & 1:
+                    v[j] ^= v[j - k]
+        V[d] = v
+    return V
+
+
+def unit_sampler(mode: str, n_dims: int, n_samples: int, seed: int = 0):
+    """
+    Return f(index) -> point in [0, 1)^n_dims for sample `index` of a reproducible design.
+
+      sobol  : Sobol sequence with a seeded random digital shift (first 2^k points are balanced)
+      lhs    : Latin hypercube, one point per 1/n_samples stratum on every axis
+      random : independent uniform points
+
+    Points depend only on (mode, seed, index, n_samples), so any slice of a sweep can be
+    regenerated on its own, e.g. in a different worker.
+    """
+    if mode == "sobol":
+        V = _sobol_directions(n_dims)
+        shift = np.random.default_rng(seed).integers(0, 1 << _SOBOL_BITS, size=n_dims, dtype=np.uint64)
+        bit_idx = np.arange(_SOBOL_BITS, dtype=np.uint64)
+        scale = float(1 << _SOBOL_BITS)
+
+        def f(index):
+            gray = np.uint64(index ^ (index >> 1))
+            bits = ((gray >> bit_idx) & np.uint64(1)).astype(bool)
+            x = np.bitwise_xor.reduce(V[:, bits], axis=1) if bits.any() else np.zeros(n_dims, dtype=np.uint64)
+            return (x ^ shift).astype(float) / scale
+        return f
+
+    if mode == "lhs":
+        rng = np.random.default_rng(seed)
+        perms = np.stack([rng.permutation(n_samples) for _ in range(n_dims)], axis=1)
+
+        def f(index):
+            jitter = np.random.default_rng([seed, index]).random(n_dims)
+            return (perms[index] + jitter) / n_samples
+        return f
+
+    if mode == "random":
+        return lambda index: np.random.default_rng([seed, index]).random(n_dims)
+
+    raise ValueError(f"Unknown sampling mode: {mode}")
+
+
+def _to_sampler_range(val):
+    """
+    Map u in [0, 1) onto a sweep spec:
+      - {lin: [a, b, n]} / [a, b, n] -> uniform on [a, b]
+      - {log: [a, b, n]}             -> log-uniform on [10**a, 10**b]
+      - list of segment specs         -> piecewise, segment weight proportional to its n
+      - explicit value lists          -> uniform choice among the values
+    """
+    if isinstance(val, dict):
+        if "lin" in val:
+            a, b, n = val["lin"]
+            return [("lin", float(a), float(b), int(n))]
+        if "log" in val:
+            a, b, n = val["log"]
+            return [("log", float(a), float(b), int(n))]
+        raise ValueError(f"Unknown sweep dict: {val}")
+    if isinstance(val, (list, tuple)):
+        if any(isinstance(x, (list, tuple, dict)) for x in val):
+            return [seg for x in val for seg in _to_sampler_range(x)]
+        if len(val) == 3 and all(isinstance(x, (int, float)) for x in val):
+            a, b, n = val
+            return [("lin", float(a), float(b), int(n))]
+    values = np.array(list(val), dtype=float)
+    return [("values", values, None, len(values))]
+
+
+def _map_unit(u: float, segments) -> float:
+    weights = np.array([seg[3] for seg in segments], dtype=float)
+    edges = np.concatenate([[0.0], np.cumsum(weights) / weights.sum()])
+    k = min(int(np.searchsorted(edges, u, side="right")) - 1, len(segments) - 1)
+    w = (u - edges[k]) / (edges[k + 1] - edges[k])
+    kind, a, b, n = segments[k]
+    if kind == "lin":
+        return a + w * (b - a)
+    if kind == "log":
+        return 10.0 ** (a + w * (b - a))
+    return float(a[min(int(w * n), n - 1)])
+
+
+def iter_param_samples(base: Dict, sweeps: Dict, mode: str, n_samples: int,
+                       seed: int = 0, start: int = 0, stop: int = None):
+    """Yield parameter dicts for samples start..stop of a sobol/lhs/random design (see unit_sampler)."""
+    if not n_samples or n_samples < 1:
+        raise ValueError(f"'{mode}' mode requires a positive sample count ('samples' in the config)")
+    keys = list(sweeps.keys())
+    ranges = [_to_sampler_range(sweeps[k]) for k in keys]
+    f = unit_sampler(mode, len(keys), n_samples, seed)
+    for i in range(start, n_samples if stop is None else min(stop, n_samples)):
+        u = f(i)
+        p = base.copy()
+        for k, r, ui in zip(keys, ranges, u):
+            p[k] = _map_unit(float(ui), r)
+        yield p
+
+
 def make_param_grid(
     base: Dict,
     sweeps: Dict[str, Union[ArrayLike, Dict[str, Tuple[float, float, int]]]],
     mode: str = "grid",
+    n_samples: int = None,
+    seed: int = 0,
 ) -> List[Dict]:
     if not sweeps:
         return [base.copy()]
 
+    if mode in SAMPLING_MODES:
+        return list(iter_param_samples(base, sweeps, mode, n_samples, seed=seed))
+
     keys = list(sweeps.keys())
     vals = [_to_values(sweeps[k]) for k in keys]
     param_list: List[Dict] = []
@@ -69,6 +220,119 @@ def make_param_grid(
                 p[k] = float(vseq[i])
             param_list.append(p)
     else:
-        raise ValueError("mode must be 'grid' or 'zip'")
+        raise ValueError("mode must be 'grid', 'zip', 'sobol', 'lhs' or 'random'")
 
     return param_list
+
+
+# ---------- Adaptive refinement ----------
+def sweep_axes(sweeps: Dict) -> Tuple[List[str], List[np.ndarray]]:
+    """Keys and sorted unique values of each swept axis (the finest resolution of an adaptive sweep)."""
+    keys = list(sweeps.keys())
+    return keys, [np.unique(_to_values(sweeps[k])) for k in keys]
+
+
+def params_at(base: Dict, keys: List[str], axes: List[np.ndarray], idx: Tuple[int, ...]) -> Dict:
+    """Parameter dict for one grid index tuple."""
+    p = base.copy()
+    for k, vals, i in zip(keys, axes, idx):
+        p[k] = float(vals[i])
+    return p
+
+
+def _corners(cell):
+    return set(product(*[sorted({lo, hi}) for lo, hi in cell]))
+
+
+def _split(cell):
+    halves = []
+    for lo, hi in cell:
+        if hi - lo > 1:
+            mid = (lo + hi) // 2
+            halves.append(((lo, mid), (mid, hi)))
+        else:
+            halves.append(((lo, hi),))
+    return list(product(*halves))
+
+
+def adaptive_refine(shape: Tuple[int, ...], evaluate, coarse: int = 5,
+                    budget: int = None, max_rounds: int = None):
+    """
+    Refine a sweep only where outcomes change.
+
+    `shape` is the number of values per axis (the target resolution). The first
+    round evaluates a coarse grid with ~`coarse` points per axis. Each following round
+    splits every cell whose corners disagree at the midpoint of each axis and evaluates
+    the new corners; cells whose corners agree are not refined and are assumed to share
+    that outcome. `evaluate(list_of_index_tuples)` must return one hashable label per point.
+    Stops when no cell can be split, after `max_rounds`, or when `budget` evaluations
+    are spent (most-disagreeing cells are refined first).
+
+    Returns (evaluated, leaves, rounds): evaluated maps index tuple -> label; leaves
+    is a list of (cell, label) where cell is ((lo, hi), ...) per axis and label is the
+    common corner label, or None when the cell's corners disagree.
+    """
+    breaks = [np.unique(np.round(np.linspace(0, n - 1, max(2, min(coarse, n)))).astype(int))
+              for n in shape]
+    cells = [tuple(zip(b[:-1], b[1:])) if len(b) > 1 else ((0, 0),) for b in breaks]
+    cells = [tuple((int(lo), int(hi)) for lo, hi in c) for c in product(*cells)]
+
+    evaluated = {}
+    rounds = 0
+
+    def run(points):
+        points = sorted(p for p in points if p not in evaluated)
+        if points:
+            for pt, label in zip(points, evaluate(points)):
+                evaluated[pt] = label
+
+    run(set().union(*(_corners(c) for c in cells)))
+    rounds += 1
+
+    leaves = []
+    while cells:
+        todo, next_cells = [], []
+        for c in cells:
+            labels = {evaluated[pt] for pt in _corners(c)}
+            splittable = any(hi - lo > 1 for lo, hi in c)
+            if len(labels) == 1:
+                leaves.append((c, labels.pop()))
+            elif not splittable:
+                leaves.append((c, None))
+            else:
+                todo.append((len(labels), c))
+        if not todo or (max_rounds is not None and rounds >= max_rounds):
+            leaves.extend((c, None) for _, c in todo)
+            break
+
+        # most disagreeing, then largest cells first, so a tight budget goes where it matters
+        todo.sort(key=lambda t: (-t[0], -np.prod([hi - lo for lo, hi in t[1]])))
+        new_points = set()
+        for n_labels, c in todo:
+            children = _split(c)
+            pts = set().union(*(_corners(ch) for ch in children)) - evaluated.keys()
+            if budget is not None and len(evaluated) + len(new_points | pts) > budget:
+                leaves.append((c, None))
+                continue
+            new_points |= pts
+            next_cells.extend(children)
+        if new_points:  # children whose corners are all known are classified next round
+            run(new_points)
+            rounds += 1
+        cells = next_cells
+
+    return evaluated, leaves, rounds
+
+
+def fill_phase(shape: Tuple[int, ...], evaluated: Dict, leaves: List, codes: Dict) -> np.ndarray:
+    """
+    Dense int8 phase array at full resolution from an adaptive run: uniform cells are
+    filled with their label's code, evaluated points keep their own, the rest is -1.
+    """
+    phase = np.full(shape, -1, dtype=np.int8)
+    for cell, label in leaves:
+        if label is not None:
+            phase[tuple(slice(lo, hi + 1) for lo, hi in cell)] = codes[label]
+    for idx, label in evaluated.items():
+        phase[idx] = codes[label]
+    return phase
@@ -2,12 +2,20 @@ import json
 import numpy as np
 from typing import Dict, Any
 
+# result columns holding whole final profiles (JSON lists in batch_results.csv)
+PROFILE_COLS = ["activator_final", "inhibitor_final"]
+
 def _to_json_list(x: Any):
     """Serialize lists/ndarrays to a compact JSON string for safe CSV storage."""
     if isinstance(x, (list, tuple, np.ndarray)):
         return json.dumps([float(v) for v in x])
     return x
 
+def _to_json_column(values):
+    """_to_json_list over a column of cells; tolist() converts each array in C instead of per element."""
+    return [json.dumps(np.asarray(v, dtype=float).tolist()) if isinstance(v, (list, tuple, np.ndarray)) else v
+            for v in values]
+
 def write_constants_txt(constants: Dict[str, Any], path: str):
     with open(path, "w") as f:
         for k, v in constants.items():
@@ -0,0 +1,178 @@
+import argparse
+import os
+import pickle
+import sqlite3
+import time
+
+DEFAULT_PATH = os.path.join(os.path.expanduser("~"), ".cache", "reaction_diffusion", "results.sqlite")
+
+
+class ResultCache:
+    """
+    Content-addressed store of simulation results in a single SQLite file.
+
+    Keys come from simulation.cache_key (canonical parameters + engine version + seed),
+    values are pickled result dicts (final fields and scalar outputs). The database
+    runs in WAL mode with a busy timeout, so joblib workers in separate processes can
+    read and write the same file concurrently. When the total payload exceeds
+    `max_bytes`, least recently used entries are evicted. The total is kept in a
+    one-row table by triggers, so a write never has to scan the store.
+
+    Instances are picklable: the connection is opened lazily in each process.
+    """
+
+    def __init__(self, path=DEFAULT_PATH, max_bytes=None):
+        self.path = os.path.expanduser(str(path))
+        self.max_bytes = max_bytes
+        self._conn = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_conn"] = None
+        return state
+
+    @property
+    def conn(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=60.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA recursive_triggers=ON")  # INSERT OR REPLACE fires the delete trigger
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                " key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL,"
+                " created REAL NOT NULL, last_access REAL NOT NULL, hits INTEGER NOT NULL DEFAULT 0)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS results_last_access ON results(last_access)")
+            conn.execute("CREATE TABLE IF NOT EXISTS total ("
+                         " id INTEGER PRIMARY KEY CHECK (id = 0), size INTEGER NOT NULL)")
+            conn.execute("INSERT OR IGNORE INTO total VALUES (0, (SELECT COALESCE(SUM(size), 0) FROM results))")
+            conn.execute("CREATE TRIGGER IF NOT EXISTS results_insert AFTER INSERT ON results"
+                         " BEGIN UPDATE total SET size = size + NEW.size; END")
+            conn.execute("CREATE TRIGGER IF NOT EXISTS results_delete AFTER DELETE ON results"
+                         " BEGIN UPDATE total SET size = size - OLD.size; END")
+            self._conn = conn
+        return self._conn
+
+    def get(self, key):
+        """Return the cached value for `key` or None; a hit refreshes its LRU timestamp."""
+        row = self.conn.execute("SELECT value FROM results WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        self.conn.execute("UPDATE results SET last_access = ?, hits = hits + 1 WHERE key = ?",
+                          (time.time(), key))
+        return pickle.loads(row[0])
+
+    def put(self, key, value):
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        now = time.time()
+        self.conn.execute(
+            "INSERT OR REPLACE INTO results (key, value, size, created, last_access, hits)"
+            " VALUES (?, ?, ?, ?, ?, 0)",
+            (key, blob, len(blob), now, now),
+        )
+        if self.max_bytes is not None and self.total_bytes() > self.max_bytes:
+            self.prune(max_bytes=self.max_bytes)
+
+    def total_bytes(self):
+        """Total payload size, read from the running total (no scan)."""
+        return self.conn.execute("SELECT size FROM total").fetchone()[0]
+
+    def prune(self, max_bytes=None, older_than=None):
+        """
+        Evict entries not accessed for `older_than` seconds, then least recently used
+        entries until the total size is at most `max_bytes`. Returns the number removed.
+        """
+        removed = 0
+        conn = self.conn
+        if older_than is not None:
+            removed += conn.execute("DELETE FROM results WHERE last_access < ?",
+                                    (time.time() - older_than,)).rowcount
+        if max_bytes is not None:
+            total = self.total_bytes()
+            if total > max_bytes:
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    excess = total - max_bytes
+                    freed = 0
+                    victims = []
+                    for key, size in conn.execute("SELECT key, size FROM results ORDER BY last_access"):
+                        if freed >= excess:
+                            break
+                        victims.append((key,))
+                        freed += size
+                    conn.executemany("DELETE FROM results WHERE key = ?", victims)
+                    conn.execute("COMMIT")
+                except Exception:
+                    conn.execute("ROLLBACK")
+                    raise
+                removed += len(victims)
+        return removed
+
+    def stats(self):
+        n, total, hits, oldest, newest = self.conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(hits), 0),"
+            " MIN(last_access), MAX(last_access) FROM results"
+        ).fetchone()
+        return {
+            "path": self.path,
+            "entries": n,
+            "total_mb": total / 1e6,
+            "file_mb": os.path.getsize(self.path) / 1e6 if os.path.exists(self.path) else 0.0,
+            "hits": hits,
+            "oldest_access": time.ctime(oldest) if oldest else None,
+            "newest_access": time.ctime(newest) if newest else None,
+        }
+
+    def clear(self):
+        self.conn.execute("DELETE FROM results")
+        self.conn.execute("VACUUM")
+
+
+def from_config(cfg):
+    """
+    Build a ResultCache from the optional `cache:` block of a sweep config, or None:
+      cache:
+        path: ~/.cache/reaction_diffusion/results.sqlite
+        max_mb: 2000
+    `cache: true` uses the defaults.
+    """
+    c = cfg.get("cache")
+    if not c:
+        return None
+    if c is True:
+        c = {}
+    max_mb = c.get("max_mb")
+    return ResultCache(c.get("path", DEFAULT_PATH), max_bytes=int(max_mb * 1e6) if max_mb else None)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Inspect or prune the shared simulation result cache.")
+    ap.add_argument("--path", default=DEFAULT_PATH, help="Cache database file")
+    sub = ap.add_subparsers(dest="command", required=True)
+    sub.add_parser("stats", help="Show entry count, size and hit totals")
+    pr = sub.add_parser("prune", help="Evict old / least recently used entries")
+    pr.add_argument("--max-mb", type=float, help="Evict LRU entries until the cache is at most this size")
+    pr.add_argument("--older-than-days", type=float, help="Evict entries not used for this many days")
+    sub.add_parser("clear", help="Remove every entry")
+    args = ap.parse_args()
+
+    cache = ResultCache(args.path)
+    if args.command == "stats":
+        for k, v in cache.stats().items():
+            print(f"{k}\t{v}")
+    elif args.command == "prune":
+        removed = cache.prune(
+            max_bytes=int(args.max_mb * 1e6) if args.max_mb is not None else None,
+            older_than=args.older_than_days * 86400 if args.older_than_days is not None else None,
+        )
+        cache.conn.execute("VACUUM")
+        print(f"Removed {removed} entries; {cache.stats()['total_mb']:.1f} MB left")
+    elif args.command == "clear":
+        cache.clear()
+        print("Cache cleared")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,516 @@
+import argparse
+import difflib
+import json
+import os
+import shutil
+import sqlite3
+import time
+
+import numpy as np
+
+from model_params import RUN_KEYS
+from simulation import MODEL_KEYS
+
+if __package__:
+    from .io_utils import PROFILE_COLS
+else:  # run as a script from inside rd_batch/
+    from io_utils import PROFILE_COLS
+
+DEFAULT_PATH = os.path.join("runs", "index.sqlite")
+RESULT_FILES = ("patterning_summary.csv", "batch_results.csv")  # preferred first
+AGGREGATES = ("count", "avg", "min", "max", "sum")
+CHUNK_ROWS = 100_000
+SCAN_ROWS = 1_000_000
+
+
+def _parse_constant(v):
+    try:
+        return float(v)
+    except ValueError:
+        return v
+
+
+class ResultDB:
+    """
+    Indexed, columnar store of the results of many sweeps, for phase-diagram queries.
+
+    ingest() turns every sweep directory (batch_results.csv, or patterning_summary.csv
+    once analyze_patterns has run, plus constants.txt) into a partition: one .npy
+    column per parameter and output under <db>.columns/<sweep_id>/. Text columns
+    (pattern_class, ...) are stored as int32 codes. Final profiles go to a
+    (rows, N) float32 array when asked for. A SQLite catalogue next to it records
+    each sweep's path, constants and column types.
+
+    Queries never touch the CSVs. A condition on a parameter that a sweep held
+    constant is decided once per partition, so whole sweeps are skipped, and
+    "inh_hill_coeff = 3" matches runs whether their sweep varied it or not. The
+    needed columns are memory-mapped and filtered and grouped with NumPy, which
+    takes milliseconds over millions of runs.
+    """
+
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = os.path.expanduser(str(path))
+        self.columns_dir = os.path.splitext(self.path)[0] + ".columns"
+        self._conn = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_conn"] = None
+        return state
+
+    @property
+    def conn(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=60.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sweeps ("
+                " sweep_id INTEGER PRIMARY KEY, path TEXT UNIQUE NOT NULL, source TEXT NOT NULL,"
+                " mtime REAL NOT NULL, rows INTEGER NOT NULL, ingested REAL NOT NULL,"
+                " constants TEXT NOT NULL, columns TEXT NOT NULL)"
+            )
+            conn.execute("CREATE TABLE IF NOT EXISTS columns (name TEXT PRIMARY KEY, kind TEXT NOT NULL)")
+            self._conn = conn
+        return self._conn
+
+    def _sweep_dir(self, sweep_id):
+        return os.path.join(self.columns_dir, str(sweep_id))
+
+    # ---------- Catalogue ----------
+    def sweeps(self, sweep=None):
+        """
+        Catalogue entries as dicts (sweep_id, path, source, rows, ingested, constants,
+        columns); `sweep` selects one id or the paths matching a LIKE pattern.
+        """
+        sql = "SELECT sweep_id, path, source, rows, ingested, constants, columns FROM sweeps"
+        args = ()
+        if isinstance(sweep, int):
+            sql, args = sql + " WHERE sweep_id = ?", (sweep,)
+        elif sweep is not None:
+            sql, args = sql + " WHERE path LIKE ?", (sweep,)
+        out = []
+        for sid, path, source, rows, ingested, constants, columns in self.conn.execute(
+                sql + " ORDER BY sweep_id", args):
+            out.append({"sweep_id": sid, "path": path, "source": source, "rows": rows, "ingested": ingested,
+                        "constants": json.loads(constants), "columns": json.loads(columns)})
+        return out
+
+    def columns(self, kind=None):
+        """{column: kind} over all sweeps; kind is "param" or "output"."""
+        rows = self.conn.execute("SELECT name, kind FROM columns ORDER BY rowid").fetchall()
+        return {n: k for n, k in rows if kind is None or k == kind}
+
+    def _check_columns(self, names):
+        known = list(self.columns()) + ["sweep_id", "row"]
+        for n in names:
+            if n not in known:
+                close = difflib.get_close_matches(n, known, n=1)
+                hint = f" (did you mean {close[0]!r}?)" if close else ""
+                raise ValueError(f"Unknown column {n!r}{hint}")
+
+    # ---------- Ingestion ----------
+    def ingest(self, roots=("runs",), profiles=False, force=False, log=print):
+        """
+        Ingest every sweep directory under `roots` (or the directories themselves).
+        Sweeps already in the store are skipped unless their result file changed
+        (or `force`); changed ones are replaced. Returns the number of rows ingested.
+        """
+        total = 0
+        for root in roots:
+            for d, _, files in sorted(os.walk(root)):
+                if os.path.abspath(d).startswith(os.path.abspath(self.columns_dir)):
+                    continue
+                source = next((f for f in RESULT_FILES if f in files), None)
+                if source is not None:
+                    total += self.ingest_sweep(d, source, profiles=profiles, force=force, log=log)
+        return total
+
+    def ingest_sweep(self, sweep_dir, source="batch_results.csv", profiles=False, force=False, log=print):
+        """
+        Write one sweep's partition, reading the CSV in chunks of CHUNK_ROWS into
+        preallocated memory-mapped columns. The partition directory is renamed into
+        place before its catalogue entry is committed, so readers never see half a sweep.
+        """
+        import pandas as pd
+
+        path = os.path.abspath(sweep_dir)
+        csv = os.path.join(path, source)
+        mtime = os.stat(csv).st_mtime
+        old = self.conn.execute("SELECT sweep_id, mtime, source FROM sweeps WHERE path = ?", (path,)).fetchone()
+        if old is not None and old[1] == mtime and old[2] == source and not force:
+            return 0
+
+        constants = {}
+        constants_txt = os.path.join(path, "constants.txt")
+        if os.path.exists(constants_txt):
+            with open(constants_txt) as f:
+                for line in f:
+                    k, _, v = line.rstrip("\n").partition("\t")
+                    if k:
+                        constants[k] = _parse_constant(v)
+
+        t0 = time.perf_counter()
+        with open(csv, "rb") as f:  # rows = lines - header; sizes the memory-mapped columns
+            n_rows = sum(block.count(b"\n") for block in iter(lambda: f.read(1 << 24), b"")) - 1
+        sweep_id = self.conn.execute("SELECT COALESCE(MAX(sweep_id), 0) + 1 FROM sweeps").fetchone()[0]
+        tmp = self._sweep_dir(sweep_id) + ".tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+
+        arrays, kinds, categories = {}, {}, {}
+        pos = 0
+        for df in pd.read_csv(csv, chunksize=CHUNK_ROWS):
+            if pos == 0:
+                for c in df.columns:
+                    if c in PROFILE_COLS:
+                        continue
+                    kinds[c] = "f" if df[c].dtype.kind in "biuf" else "c"
+                    arrays[c] = np.lib.format.open_memmap(
+                        os.path.join(tmp, f"{c}.npy"), mode="w+",
+                        dtype=np.float64 if kinds[c] == "f" else np.int32, shape=(n_rows,))
+                    if kinds[c] == "c":
+                        categories[c] = {}
+            rows = slice(pos, pos + len(df))
+            for c in kinds:
+                if kinds[c] == "f":
+                    arrays[c][rows] = pd.to_numeric(df[c], errors="coerce").to_numpy(dtype=float)
+                elif kinds[c] == "c":
+                    cat = categories[c]
+                    arrays[c][rows] = [-1 if not isinstance(v, str) else cat.setdefault(v, len(cat)) for v in df[c]]
+            if profiles:
+                for c in PROFILE_COLS:
+                    if c not in df:
+                        continue
+                    vals = [json.loads(v) if isinstance(v, str) else None for v in df[c]]
+                    if c not in arrays:
+                        width = max((len(v) for v in vals if v is not None), default=0)
+                        arrays[c] = np.lib.format.open_memmap(os.path.join(tmp, f"{c}.npy"), mode="w+",
+                                                              dtype=np.float32, shape=(n_rows, width))
+                        arrays[c][:] = np.nan
+                        kinds[c] = "profile"
+                    block = arrays[c][rows]
+                    for i, v in enumerate(vals):
+                        if v is not None:
+                            v = v[:block.shape[1]]
+                            block[i, :len(v)] = v
+            pos += len(df)
+        for arr in arrays.values():
+            arr.flush()
+        del arrays
+
+        columns = {c: {"kind": k, **({"categories": list(categories[c])} if k == "c" else {})}
+                   for c, k in kinds.items()}
+        new_cols = {c: "param" if c in MODEL_KEYS or c in RUN_KEYS else "output"
+                    for c, k in kinds.items() if k != "profile"}
+        new_cols.update({c: "param" for c in constants})
+        conn = self.conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            os.replace(tmp, self._sweep_dir(sweep_id))
+            if old is not None:
+                conn.execute("DELETE FROM sweeps WHERE sweep_id = ?", (old[0],))
+            conn.execute(
+                "INSERT INTO sweeps (sweep_id, path, source, mtime, rows, ingested, constants, columns)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (sweep_id, path, source, mtime, pos, time.time(), json.dumps(constants), json.dumps(columns)))
+            conn.executemany("INSERT OR IGNORE INTO columns (name, kind) VALUES (?, ?)", new_cols.items())
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        if old is not None:
+            shutil.rmtree(self._sweep_dir(old[0]), ignore_errors=True)
+        log(f"Ingested {pos} rows from {csv} in {time.perf_counter() - t0:.1f}s")
+        return pos
+
+    def remove(self, sweep):
+        """Drop sweeps (an id or a LIKE pattern on the path) from the store; returns how many."""
+        entries = self.sweeps(sweep)
+        for s in entries:
+            self.conn.execute("DELETE FROM sweeps WHERE sweep_id = ?", (s["sweep_id"],))
+            shutil.rmtree(self._sweep_dir(s["sweep_id"]), ignore_errors=True)
+        return len(entries)
+
+    # ---------- Scans ----------
+    def scan(self, cols, where=None, sweep=None, chunk=SCAN_ROWS, codes=None):
+        """
+        Yield dicts {column: array} of the rows matching `where`, partition by partition
+        and at most `chunk` rows of a partition at a time, so memory stays bounded.
+
+        where = {column: value | (lo, hi) | [v1, v2, ...]}: equality, a closed range or
+        a set of values. `sweep` is a sweep id or a LIKE pattern on its path. Text
+        columns come back as object arrays of labels and numbers as float arrays; runs
+        without a column get NaN. "sweep_id" and "row" identify each run, and the
+        profile columns (ingested with profiles=True) come back as (rows, N) arrays.
+        `codes` = {column: labels} returns those text columns as int indices into
+        `labels` instead (len(labels) = missing); see text_labels.
+        """
+        codes = codes or {}
+        where = dict(where or {})
+        self._check_columns([c for c in cols if c not in PROFILE_COLS] + list(where))
+        for s in self.sweeps(sweep):
+            stored = s["columns"]
+            # conditions on constants (or on columns the sweep lacks) decide the whole partition
+            if not all(_matches(s["constants"].get(c), v) for c, v in where.items()
+                       if c not in stored and c not in ("sweep_id", "row")):
+                continue
+            maps = {c: np.load(os.path.join(self._sweep_dir(s["sweep_id"]), f"{c}.npy"), mmap_mode="r")
+                    for c in set(cols) | set(where) if c in stored}
+            for start in range(0, s["rows"], chunk):
+                rows = slice(start, min(start + chunk, s["rows"]))
+                n = rows.stop - rows.start
+                special = {"sweep_id": np.full(n, s["sweep_id"]), "row": np.arange(rows.start, rows.stop)}
+                mask = np.ones(n, dtype=bool)
+                for c, v in where.items():
+                    if c in maps:
+                        mask &= _array_matches(maps[c][rows], v, stored[c])
+                    elif c in special:
+                        mask &= _array_matches(special[c], v, None)
+                if not mask.any():
+                    continue
+                k = int(mask.sum())
+                out = {}
+                for c in cols:
+                    if c in special:
+                        out[c] = special[c][mask]
+                    elif c in codes:
+                        out[c] = self._codes(s, c, codes[c], maps[c][rows][mask] if c in maps else None, k)
+                    elif c in maps and stored[c]["kind"] == "c":
+                        labels = np.array(stored[c]["categories"] + [None], dtype=object)
+                        out[c] = labels[maps[c][rows][mask]]  # code -1 (missing) picks the trailing None
+                    elif c in maps:
+                        out[c] = np.asarray(maps[c][rows][mask])
+                    else:
+                        v = s["constants"].get(c)
+                        out[c] = np.full(k, v, dtype=object if isinstance(v, str) else float) if v is not None \
+                            else np.full(k, np.nan)
+                yield out
+
+    def select(self, cols, where=None, sweep=None, codes=None):
+        """All matching rows of `cols` as one dict of arrays (see scan)."""
+        parts = list(self.scan(cols, where, sweep, codes=codes))
+        if not parts:
+            return {c: np.empty(0) for c in cols}
+        return {c: np.concatenate([p[c] for p in parts]) for c in cols}
+
+    def text_labels(self, col, sweep=None):
+        """Sorted labels of a text column over the selected sweeps (stored values and constants)."""
+        labels = set()
+        for s in self.sweeps(sweep):
+            labels.update(s["columns"].get(col, {}).get("categories", []))
+            if isinstance(s["constants"].get(col), str):
+                labels.add(s["constants"][col])
+        return sorted(labels)
+
+    @staticmethod
+    def _codes(s, col, labels, local, k):
+        """A partition's text column as indices into the global `labels` (len(labels) = missing)."""
+        index = {v: i for i, v in enumerate(labels)}
+        if local is None:
+            return np.full(k, index.get(s["constants"].get(col), len(labels)), dtype=np.int64)
+        remap = np.array([index[v] for v in s["columns"][col]["categories"]] + [len(labels)], dtype=np.int64)
+        return remap[local]  # local code -1 (missing) picks the trailing entry
+
+    # ---------- Queries ----------
+    def aggregate(self, metric, by=(), where=None, aggs=("count", "avg", "min", "max"), sweep=None):
+        """
+        Aggregates of `metric` over the selected runs, grouped by the columns `by`.
+        Returns a dict of arrays: one per `by` column (sorted group keys) and one per
+        aggregate. count counts runs; avg/min/max/sum skip missing values (NaN).
+        """
+        by = list(by)
+        for a in aggs:
+            if a not in AGGREGATES:
+                raise ValueError(f"aggs must be from {AGGREGATES}, got {a!r}")
+        text = {b: self.text_labels(b, sweep) for b in by}
+        text = {b: labels for b, labels in text.items() if labels}
+        data = self.select(by + [metric], where, sweep, codes=text)
+        if by:
+            keys, inverse = _group_keys([data[b] for b in by])
+            keys = [np.array(text[b] + [None], dtype=object)[k] if b in text else k for b, k in zip(by, keys)]
+            out, n_groups = dict(zip(by, keys)), len(keys[0])
+        else:
+            inverse = np.zeros(len(data[metric]), dtype=np.int64)
+            out, n_groups = {}, 1
+        out.update(_reduce(inverse, n_groups, data[metric], aggs))
+        return out
+
+    def marginal(self, x, metric, where=None, sweep=None):
+        """count, avg, min and max of `metric` for every value of `x` (other parameters pooled)."""
+        return self.aggregate(metric, [x], where, sweep=sweep)
+
+    def slice(self, x, y, metric, where=None, agg="avg", sweep=None):
+        """
+        2D phase diagram: `agg` of `metric` for every (x, y) pair among the selected
+        runs, the other parameters fixed by `where` or pooled. Returns (x values,
+        y values, (len(y), len(x)) array of aggregates, NaN where empty, run counts).
+        """
+        r = self.aggregate(metric, [x, y], where, aggs=("count", agg), sweep=sweep)
+        xs, ix = np.unique(r[x], return_inverse=True)
+        ys, iy = np.unique(r[y], return_inverse=True)
+        values = np.full((len(ys), len(xs)), np.nan)
+        counts = np.zeros((len(ys), len(xs)), dtype=np.int64)
+        values[iy, ix] = r[agg]
+        counts[iy, ix] = r["count"]
+        return xs, ys, values, counts
+
+
+def _matches(value, cond):
+    """Whether a scalar (a sweep constant; None if missing) satisfies a where condition."""
+    if value is None:
+        return False
+    if isinstance(cond, tuple):
+        lo, hi = cond
+        return isinstance(value, float) and lo <= value <= hi
+    if isinstance(cond, list):
+        return value in cond
+    return value == cond
+
+
+def _array_matches(vals, cond, info):
+    if info is not None and info["kind"] == "c":  # compare codes, not labels
+        cats = info["categories"]
+        wanted = cond if isinstance(cond, list) else [cond]
+        return np.isin(vals, [cats.index(v) for v in wanted if v in cats])
+    if isinstance(cond, tuple):
+        lo, hi = cond
+        return (vals >= lo) & (vals <= hi)
+    if isinstance(cond, list):
+        return np.isin(vals, np.asarray(cond, dtype=float))
+    return vals == cond
+
+
+def _group_keys(columns):
+    """(sorted unique keys of each column per group, group index of every row) for a GROUP BY."""
+    codes, uniques = [], []
+    for col in columns:
+        u, inv = np.unique(col, return_inverse=True)
+        uniques.append(u)
+        codes.append(inv.ravel())
+    flat = np.zeros(len(codes[0]), dtype=np.int64)
+    for u, c in zip(uniques, codes):
+        flat = flat * len(u) + c
+    size = int(np.prod([len(u) for u in uniques], dtype=float))
+    if size <= max(len(flat), 1 << 20):  # dense key space: number the occupied cells without a sort
+        occupied = np.bincount(flat, minlength=size) > 0
+        groups = np.flatnonzero(occupied)
+        inverse = (np.cumsum(occupied) - 1)[flat]
+    else:
+        groups, inverse = np.unique(flat, return_inverse=True)
+    keys = []
+    for u in reversed(uniques):
+        groups, idx = np.divmod(groups, len(u))
+        keys.append(u[idx])
+    return keys[::-1], inverse.ravel()
+
+
+def _reduce(inverse, n_groups, values, aggs):
+    """Per-group aggregates of `values` (NaN = missing) for group indices `inverse`."""
+    values = np.asarray(values, dtype=float)
+    valid = ~np.isnan(values)
+    g, v = inverse[valid], values[valid]
+    n_valid = np.bincount(g, minlength=n_groups)
+    out = {}
+    for a in aggs:
+        if a == "count":
+            out[a] = np.bincount(inverse, minlength=n_groups)
+        elif a in ("sum", "avg"):
+            total = np.bincount(g, weights=v, minlength=n_groups)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                out[a] = np.where(n_valid > 0, total if a == "sum" else total / n_valid, np.nan)
+        else:
+            res = np.full(n_groups, np.inf if a == "min" else -np.inf)
+            (np.minimum if a == "min" else np.maximum).at(res, g, v)
+            out[a] = np.where(n_valid > 0, res, np.nan)
+    return out
+
+
+def _parse_where(items):
+    """CLI --where k=v, k=lo:hi (range) or k=v1,v2,... (set) into a ResultDB `where` dict."""
+    where = {}
+    for item in items or []:
+        k, _, v = item.partition("=")
+        if ":" in v:
+            where[k] = tuple(_parse_constant(s) for s in v.split(":", 1))
+        elif "," in v:
+            where[k] = [_parse_constant(s) for s in v.split(",")]
+        else:
+            where[k] = _parse_constant(v)
+    return where
+
+
+def _fmt(v):
+    return f"{v:.6g}" if isinstance(v, (float, np.floating)) else str(v)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Index sweep results and query phase diagrams.")
+    ap.add_argument("--db", default=DEFAULT_PATH, help="Index catalogue file (columns are stored next to it)")
+    sub = ap.add_subparsers(dest="command", required=True)
+    ig = sub.add_parser("ingest", help="Load every sweep directory under the given roots")
+    ig.add_argument("roots", nargs="*", default=["runs"])
+    ig.add_argument("--profiles", action="store_true", help="Also store final profiles (for galleries)")
+    ig.add_argument("--force", action="store_true", help="Re-ingest sweeps whose files did not change")
+    rm = sub.add_parser("remove", help="Drop sweeps whose path matches a LIKE pattern")
+    rm.add_argument("pattern")
+    sub.add_parser("sweeps", help="List ingested sweeps")
+    sub.add_parser("columns", help="List parameter and output columns")
+    for name, helptext in (("slice", "2D phase diagram of a metric over two columns"),
+                           ("marginal", "count/avg/min/max of a metric per value of one column"),
+                           ("aggregate", "Aggregates of a metric, optionally grouped")):
+        q = sub.add_parser(name, help=helptext)
+        if name == "slice":
+            q.add_argument("x")
+            q.add_argument("y")
+        elif name == "marginal":
+            q.add_argument("x")
+        q.add_argument("metric")
+        if name == "slice":
+            q.add_argument("--agg", default="avg", choices=AGGREGATES)
+        if name == "aggregate":
+            q.add_argument("--by", nargs="*", default=[])
+        q.add_argument("--where", "-w", action="append",
+                       help="k=v, k=lo:hi (range) or k=v1,v2,... (set); repeatable")
+        q.add_argument("--sweep", help="Restrict to sweeps whose path matches this LIKE pattern")
+    args = ap.parse_args()
+
+    db = ResultDB(args.db)
+    if args.command == "ingest":
+        n = db.ingest(args.roots, profiles=args.profiles, force=args.force)
+        print(f"{n} rows ingested into {db.path}")
+        return
+    if args.command == "remove":
+        print(f"Removed {db.remove(args.pattern)} sweeps")
+        return
+    if args.command == "sweeps":
+        for s in db.sweeps():
+            print(f"{s['sweep_id']}\t{s['rows']}\t{s['source']}\t{s['path']}")
+        return
+    if args.command == "columns":
+        for k, kind in db.columns().items():
+            print(f"{kind}\t{k}")
+        return
+
+    t0 = time.perf_counter()
+    where = _parse_where(args.where)
+    if args.command == "slice":
+        xs, ys, values, counts = db.slice(args.x, args.y, args.metric, where, args.agg, args.sweep)
+        elapsed = time.perf_counter() - t0
+        print("\t".join([f"{args.y}\\{args.x}"] + [_fmt(v) for v in xs]))
+        for yv, row in zip(ys, values):
+            print("\t".join([_fmt(yv)] + [_fmt(v) for v in row]))
+        n = int(counts.sum())
+    else:
+        by = [args.x] if args.command == "marginal" else args.by
+        r = db.aggregate(args.metric, by, where, sweep=args.sweep)
+        elapsed = time.perf_counter() - t0
+        print("\t".join(r))
+        for row in zip(*r.values()):
+            print("\t".join(_fmt(v) for v in row))
+        n = int(np.sum(r["count"]))
+    print(f"# {n} runs, {1000 * elapsed:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
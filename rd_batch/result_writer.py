@@ -0,0 +1,145 @@
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+
+if __package__:
+    from .io_utils import _to_json_column
+else:  # run as a script from inside rd_batch/
+    from io_utils import _to_json_column
+
+WRITER_DEFAULTS = {"batch_rows": 256, "flush_seconds": 2.0, "max_queue": 1024}
+_CLOSE = object()
+
+
+def rows_frame(rows, columns, dtypes=None):
+    """
+    DataFrame of result rows with exactly `columns`. Array cells (profiles, ensemble
+    steady states) are serialized to JSON lists here, a whole column at a time, so
+    workers hand back plain arrays. `dtypes` maps columns to fixed pandas dtypes
+    (e.g. nullable "Int64"), so every batch formats a column the same way.
+    """
+    import pandas as pd
+
+    df = pd.DataFrame(rows).reindex(columns=columns)
+    if dtypes:
+        df = df.astype(dtypes)
+    for c in df.columns:
+        if df[c].dtype == object:
+            df[c] = _to_json_column(df[c])
+    return df
+
+
+class ResultWriter:
+    """
+    Bounded background writer for batch_results.csv.
+
+    put() hands a finished row to a writer thread through a queue of at most
+    `max_queue` rows; when the disk falls behind, put() blocks until there is room,
+    so a sweep never buffers more than that. The thread collects rows into batches
+    and serializes and appends a batch when it holds `batch_rows` rows or its oldest
+    row has waited `flush_seconds`. Rows go to batch_results.partial.csv, which
+    close() renames into place: readers never see a half-written store, and a
+    cancelled or failed sweep leaves the rows finished so far in the partial file.
+
+    Rows must be put in their final order; `dtypes` is passed to rows_frame. stats()
+    reports rows, flush count and latency, queue depth and the time put() spent blocked.
+    """
+
+    def __init__(self, path, columns, batch_rows=256, flush_seconds=2.0, max_queue=1024, dtypes=None):
+        import pandas  # noqa: F401  imported here, not inside the first timed flush
+
+        self.path = path
+        self.partial_path = os.path.splitext(path)[0] + ".partial.csv"
+        self.columns = list(columns)
+        self.dtypes = dict(dtypes or {})
+        self.batch_rows = max(1, int(batch_rows))
+        self.flush_seconds = float(flush_seconds)
+        self._queue = queue.Queue(maxsize=max(1, int(max_queue)))
+        self._file = open(self.partial_path, "w", newline="")
+        self._error = None
+        self._rows = self._bytes = 0
+        self._flush_times = []
+        self._depth_max = self._depth_sum = self._puts = 0
+        self._blocked = 0.0
+        self._thread = threading.Thread(target=self._run, name="rd-result-writer", daemon=True)
+        self._thread.start()
+
+    def put(self, row):
+        if self._error is not None:
+            raise RuntimeError(f"result writer for {self.path} failed") from self._error
+        depth = self._queue.qsize()
+        self._depth_max = max(self._depth_max, depth)
+        self._depth_sum += depth
+        self._puts += 1
+        t0 = time.perf_counter()
+        self._queue.put(row)  # blocks while the queue is full: backpressure on the sweep
+        self._blocked += time.perf_counter() - t0
+
+    def _run(self):
+        batch, oldest = [], None
+        while True:
+            timeout = None if not batch else max(0.0, oldest + self.flush_seconds - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            if item is _CLOSE:
+                break
+            if item is not None and self._error is None:  # after a failure, only drain so put() never hangs
+                if not batch:
+                    oldest = time.monotonic()
+                batch.append(item)
+            if batch and (len(batch) >= self.batch_rows or time.monotonic() - oldest >= self.flush_seconds):
+                self._flush(batch)
+                batch = []
+        if batch:
+            self._flush(batch)
+
+    def _flush(self, batch):
+        if self._error is not None:
+            return
+        try:
+            t0 = time.perf_counter()
+            text = rows_frame(batch, self.columns, self.dtypes).to_csv(header=self._rows == 0, index=False)
+            self._file.write(text)
+            self._file.flush()
+            self._flush_times.append(time.perf_counter() - t0)
+            self._rows += len(batch)
+            self._bytes += len(text)
+        except Exception as e:  # re-raised in the sweep by put() or close()
+            self._error = e
+
+    def close(self, commit=True):
+        """
+        Flush what is queued and stop the thread. With `commit`, move the file into place
+        (raising if the writer failed); without, leave the partial file. Returns stats().
+        """
+        self._queue.put(_CLOSE)
+        self._thread.join()
+        try:
+            if self._error is None and commit and self._rows == 0:  # header only, as for an empty sweep
+                self._file.write(rows_frame([], self.columns, self.dtypes).to_csv(index=False))
+        finally:
+            self._file.close()
+        if commit:
+            if self._error is not None:
+                raise RuntimeError(f"result writer for {self.path} failed") from self._error
+            os.replace(self.partial_path, self.path)
+        return self.stats()
+
+    def stats(self):
+        lat = np.array(self._flush_times)
+        return {
+            "rows": self._rows,
+            "flushes": len(lat),
+            "bytes": self._bytes,
+            "flush_latency_s": {q: float(np.quantile(lat, v)) if len(lat) else None
+                                for q, v in (("p50", 0.5), ("p95", 0.95), ("max", 1.0))},
+            "flush_time_total_s": float(lat.sum()),
+            "queue_depth_max": self._depth_max,
+            "queue_depth_mean": self._depth_sum / self._puts if self._puts else 0.0,
+            "put_blocked_s": self._blocked,
+        }
@@ -0,0 +1,429 @@
+import argparse
+import heapq
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+import traceback
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Only the standard library is imported here: the batch_runner CLI imports Client to
+# check for a running service, and must stay fast when there is none.
+
+DEFAULT_URL = os.environ.get("RD_SERVICE_URL", "http://127.0.0.1:8765")
+FINISHED = ("done", "failed", "cancelled")
+PROGRESS_INTERVAL = 0.2  # seconds between streamed progress events of one job
+
+logger = logging.getLogger("rd_batch.service")
+
+
+# ---------- Service ----------
+class Job:
+    """One submitted sweep: its config, queue position and the event log streamed to clients."""
+
+    def __init__(self, job_id, cfg, priority, name):
+        self.id = job_id
+        self.cfg = cfg
+        self.priority = priority
+        self.name = name or os.path.basename(str(cfg.get("outdir", "runs/default")))
+        self.state = "queued"
+        self.events = []
+        self.cancel = threading.Event()
+        self.submitted = time.time()
+        self.started = self.finished = None
+        self._last_progress = 0.0
+
+    def info(self):
+        return {"id": self.id, "name": self.name, "priority": self.priority, "state": self.state,
+                "outdir": self.cfg.get("outdir"), "submitted": self.submitted,
+                "started": self.started, "finished": self.finished, "events": len(self.events)}
+
+
+class SimulationService:
+    """
+    Long-lived sweep runner. Jobs (parsed batch_runner configs) wait in a priority
+    queue (higher priority first, FIFO within a priority) and run one at a time
+    through batch_runner.run_sweep, each using the whole worker pool (a config's own
+    n_jobs is overridden, with a log event when it differs).
+
+    The pool is joblib's reusable loky executor. It is started and primed at launch
+    (workers import the simulation core) and kept alive for `idle_timeout` seconds
+    between jobs, so a sweep submitted to a running service skips process start-up
+    and imports. Each job keeps an append-only event log (state, log, progress,
+    done/error) that clients stream from any offset.
+    """
+
+    def __init__(self, n_jobs=-1, idle_timeout=3600):
+        self.n_jobs = n_jobs
+        self.idle_timeout = idle_timeout
+        self.jobs = {}
+        self._queue = []
+        self._ids = itertools.count(1)
+        self._order = itertools.count()
+        self._cond = threading.Condition()
+        self._stopping = False
+        self.started = time.time()
+        self._thread = threading.Thread(target=self._dispatch, name="rd-dispatch", daemon=True)
+        self._thread.start()
+
+    # -- job bookkeeping (all under self._cond) --
+    def _emit(self, job, kind, **data):
+        with self._cond:
+            job.events.append({"event": kind, "time": time.time(), **data})
+            self._cond.notify_all()
+
+    def submit(self, cfg, priority=0, name=None):
+        with self._cond:
+            job = Job(str(next(self._ids)), cfg, int(priority), name)
+            self.jobs[job.id] = job
+            heapq.heappush(self._queue, (-job.priority, next(self._order), job.id))
+            ahead = sum(1 for j in self.jobs.values() if j.state == "running") + len(self._queue) - 1
+            self._emit(job, "state", state="queued", ahead=ahead)
+        return job
+
+    def cancel(self, job_id):
+        """Cancel a queued job, or ask a running one to stop after its next completed run."""
+        with self._cond:
+            job = self.jobs[job_id]
+            if job.state == "queued":
+                self._finish(job, "cancelled")
+            elif job.state == "running":
+                job.cancel.set()
+            return job.state
+
+    def _finish(self, job, state, **data):
+        with self._cond:
+            job.state = state
+            job.finished = time.time()
+            self._emit(job, state, **data)
+
+    def wait_events(self, job, since, timeout=5.0):
+        """Events of `job` from index `since`, blocking until there are some or the job has finished."""
+        with self._cond:
+            self._cond.wait_for(lambda: len(job.events) > since or job.state in FINISHED, timeout=timeout)
+            return job.events[since:], job.state in FINISHED
+
+    def shutdown(self):
+        with self._cond:
+            self._stopping = True
+            for job in self.jobs.values():
+                if job.state == "running":
+                    job.cancel.set()
+            self._cond.notify_all()
+
+    # -- dispatcher thread --
+    def _progress(self, job):
+        def progress(done, total, desc):
+            now = time.monotonic()
+            if done == total or now - job._last_progress >= PROGRESS_INTERVAL:
+                job._last_progress = now
+                self._emit(job, "progress", done=done, total=total, desc=desc)
+        return progress
+
+    def _dispatch(self):
+        from joblib import parallel_config, Parallel, delayed
+        if __package__:
+            from .batch_runner import run_sweep, SweepCancelled
+        else:
+            from batch_runner import run_sweep, SweepCancelled
+
+        # parallel_config is per thread: warm-up and every sweep run here, so they share one executor
+        with parallel_config(backend="loky", idle_worker_timeout=self.idle_timeout):
+            t0 = time.perf_counter()
+            n = os.cpu_count() if self.n_jobs == -1 else max(1, int(self.n_jobs))
+            Parallel(n_jobs=self.n_jobs)(delayed(_warm_worker)() for _ in range(n))
+            logger.info("Warmed %d workers in %.1fs", n, time.perf_counter() - t0)
+
+            while True:
+                with self._cond:
+                    self._cond.wait_for(lambda: self._queue or self._stopping)
+                    if self._stopping:
+                        return
+                    job = self.jobs[heapq.heappop(self._queue)[2]]
+                    if job.state != "queued":  # cancelled while waiting
+                        continue
+                    job.state = "running"
+                    job.started = time.time()
+                self._emit(job, "state", state="running")
+                cfg = dict(job.cfg)
+                if cfg.get("n_jobs", self.n_jobs) != self.n_jobs:  # every job runs on the one warm pool
+                    self._emit(job, "log", message=f"Ignoring n_jobs: {cfg['n_jobs']}; "
+                                                   f"the service runs jobs with n_jobs {self.n_jobs}")
+                cfg["n_jobs"] = self.n_jobs
+                try:
+                    result = run_sweep(cfg, progress=self._progress(job), cancel=job.cancel,
+                                       log=lambda msg, job=job: self._emit(job, "log", message=msg))
+                except SweepCancelled as e:
+                    self._finish(job, "cancelled", message=str(e))
+                except Exception as e:
+                    logger.exception("Job %s failed", job.id)
+                    self._finish(job, "failed", message=f"{type(e).__name__}: {e}",
+                                 traceback=traceback.format_exc())
+                else:
+                    self._finish(job, "done", result=result)
+
+
+def _warm_worker():
+    """Import the simulation core and run_one's module in a pool worker."""
+    if __package__:
+        from . import batch_runner  # noqa: F401
+    else:
+        import batch_runner  # noqa: F401
+    return os.getpid()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """
+    JSON over HTTP on localhost:
+      GET  /status                      service info and all jobs
+      GET  /jobs/<id>                   one job
+      GET  /jobs/<id>/events?since=k    newline-delimited JSON events, streamed until the job finishes
+      POST /jobs                        {"config": {...}, "priority": 0, "name": null} -> job info
+      POST /jobs/<id>/cancel            cancel a queued or running job
+      POST /shutdown                    stop the service
+    """
+
+    def log_message(self, fmt, *args):
+        logger.debug("%s " + fmt, self.address_string(), *args)
+
+    def _send(self, obj, code=200):
+        body = json.dumps(obj).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _job(self, job_id):
+        job = self.server.service.jobs.get(job_id)
+        if job is None:
+            self._send({"error": f"no job {job_id}"}, 404)
+        return job
+
+    def do_GET(self):
+        service = self.server.service
+        url = urlparse(self.path)
+        parts = url.path.strip("/").split("/")
+        if parts == ["status"]:
+            self._send({"uptime": time.time() - service.started, "n_jobs": service.n_jobs,
+                        "pid": os.getpid(), "jobs": [j.info() for j in service.jobs.values()]})
+        elif len(parts) == 2 and parts[0] == "jobs":
+            job = self._job(parts[1])
+            if job is not None:
+                self._send(job.info())
+        elif len(parts) == 3 and parts[0] == "jobs" and parts[2] == "events":
+            job = self._job(parts[1])
+            if job is None:
+                return
+            since = int(parse_qs(url.query).get("since", ["0"])[0])
+            # no Content-Length: HTTP/1.0 framing, the body ends when the connection closes
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.end_headers()
+            finished = False
+            while not finished:
+                events, finished = service.wait_events(job, since)
+                for ev in events:
+                    self.wfile.write(json.dumps(ev).encode() + b"\n")
+                self.wfile.flush()
+                since += len(events)
+        else:
+            self._send({"error": f"unknown path {url.path}"}, 404)
+
+    def do_POST(self):
+        service = self.server.service
+        parts = urlparse(self.path).path.strip("/").split("/")
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        if parts == ["jobs"]:
+            job = service.submit(body["config"], body.get("priority", 0), body.get("name"))
+            self._send(job.info(), 201)
+        elif len(parts) == 3 and parts[0] == "jobs" and parts[2] == "cancel":
+            if self._job(parts[1]) is not None:
+                self._send({"id": parts[1], "state": service.cancel(parts[1])})
+        elif parts == ["shutdown"]:
+            self._send({"state": "stopping"})
+            service.shutdown()
+            threading.Thread(target=self.server.shutdown, daemon=True).start()
+        else:
+            self._send({"error": f"unknown path {self.path}"}, 404)
+
+
+def make_server(url=DEFAULT_URL, n_jobs=-1, idle_timeout=3600):
+    """
+    HTTP server with a started SimulationService, bound to the host and port of `url`
+    (port 0 picks a free one, see server.server_address). Run it with serve_forever().
+    """
+    u = urlparse(url)
+    server = ThreadingHTTPServer((u.hostname, u.port), _Handler)
+    server.daemon_threads = True
+    server.service = SimulationService(n_jobs=n_jobs, idle_timeout=idle_timeout)
+    return server
+
+
+def serve(url=DEFAULT_URL, n_jobs=-1, idle_timeout=3600):
+    """Run the service until POST /shutdown or Ctrl-C. Binds to the host and port of `url`."""
+    server = make_server(url, n_jobs=n_jobs, idle_timeout=idle_timeout)
+    print(f"rd_batch.service listening on {url} (pid {os.getpid()})", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.service.shutdown()
+    finally:
+        server.server_close()
+
+
+# ---------- Client ----------
+def resolve_paths(cfg, base_dir):
+    """Copy of cfg with outdir, cache path and surrogate training dirs made absolute (the service has its own cwd)."""
+    cfg = dict(cfg)
+    absolute = lambda p: os.path.join(base_dir, os.path.expanduser(str(p)))
+    cfg["outdir"] = absolute(cfg.get("outdir", "runs/default"))
+    if isinstance(cfg.get("cache"), dict) and "path" in cfg["cache"]:
+        cfg["cache"] = {**cfg["cache"], "path": absolute(cfg["cache"]["path"])}
+    if isinstance(cfg.get("surrogate"), dict):
+        cfg["surrogate"] = {**cfg["surrogate"],
+                            "train": [absolute(p) for p in cfg["surrogate"].get("train", [])]}
+    return cfg
+
+
+class Client:
+    """Thin client for a running SimulationService (see batch_runner --local to bypass it)."""
+
+    def __init__(self, url=DEFAULT_URL):
+        self.url = url.rstrip("/")
+
+    def _request(self, path, body=None, timeout=30.0):
+        data = None if body is None else json.dumps(body).encode()
+        req = urllib.request.Request(self.url + path, data=data, method="GET" if body is None else "POST",
+                                     headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(req, timeout=timeout) as r:
+            return json.loads(r.read())
+
+    def is_running(self, timeout=0.5):
+        try:
+            self._request("/status", timeout=timeout)
+            return True
+        except (OSError, ValueError):
+            return False
+
+    def status(self, job_id=None):
+        return self._request("/status" if job_id is None else f"/jobs/{job_id}")
+
+    def submit(self, cfg, priority=0, name=None, base_dir=None):
+        cfg = resolve_paths(cfg, base_dir or os.getcwd())
+        return self._request("/jobs", {"config": cfg, "priority": priority, "name": name})
+
+    def cancel(self, job_id):
+        return self._request(f"/jobs/{job_id}/cancel", {})
+
+    def shutdown(self):
+        return self._request("/shutdown", {})
+
+    def events(self, job_id, since=0):
+        """Yield a job's events as they happen, ending with its done/failed/cancelled event."""
+        with urllib.request.urlopen(f"{self.url}/jobs/{job_id}/events?since={since}") as r:
+            for line in r:
+                yield json.loads(line)
+
+    def run(self, cfg, priority=0, name=None):
+        """
+        Submit a sweep and follow it like a local batch_runner run: log lines are printed,
+        progress is shown as tqdm bars, Ctrl-C cancels the job. Returns an exit code.
+        """
+        from tqdm import tqdm
+
+        job = self.submit(cfg, priority=priority, name=name)
+        bar = None
+        try:
+            for ev in self.events(job["id"]):
+                kind = ev["event"]
+                if kind == "progress":
+                    if bar is None or bar.desc != ev["desc"] or bar.total != ev["total"]:
+                        if bar is not None:
+                            bar.close()
+                        bar = tqdm(total=ev["total"], desc=ev["desc"])
+                    bar.update(ev["done"] - bar.n)
+                    continue
+                if bar is not None:
+                    bar.close()
+                    bar = None
+                if kind == "state" and ev["state"] == "queued" and ev["ahead"] > 0:
+                    print(f"Job {job['id']} queued behind {ev['ahead']} job(s)")
+                elif kind == "log":
+                    print(ev["message"])
+                elif kind == "failed":
+                    print(ev.get("traceback") or ev["message"])
+                    return 1
+                elif kind == "cancelled":
+                    print(f"Job {job['id']} {ev.get('message', 'cancelled')}")
+                    return 130
+                elif kind == "done":
+                    return 0
+        except KeyboardInterrupt:
+            print(f"\nCancelling job {job['id']}")
+            self.cancel(job["id"])
+            return 130
+        finally:
+            if bar is not None:
+                bar.close()
+        return 1
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Long-lived local sweep service with a warm worker pool.")
+    ap.add_argument("--url", default=DEFAULT_URL, help="Service address (default $RD_SERVICE_URL or %(default)s)")
+    sub = ap.add_subparsers(dest="command", required=True)
+    sv = sub.add_parser("serve", help="Start the service in the foreground")
+    sv.add_argument("--n-jobs", type=int, default=-1, help="Worker processes (-1 = all cores)")
+    sv.add_argument("--idle-timeout", type=float, default=3600,
+                    help="Seconds an idle worker pool is kept alive between jobs")
+    sv.add_argument("--log-level", default="INFO")
+    sb = sub.add_parser("submit", help="Queue a sweep config and follow its progress")
+    sb.add_argument("config", help="Path to YAML config (same format as batch_runner)")
+    sb.add_argument("--priority", type=int, default=0, help="Higher runs first")
+    sb.add_argument("--detach", action="store_true", help="Print the job id and return immediately")
+    st = sub.add_parser("status", help="List jobs, or show one")
+    st.add_argument("job", nargs="?")
+    cn = sub.add_parser("cancel", help="Cancel a queued or running job")
+    cn.add_argument("job")
+    sub.add_parser("shutdown", help="Stop the service")
+    args = ap.parse_args()
+
+    if args.command == "serve":
+        logging.basicConfig(format="%(asctime)s %(name)s %(levelname)s: %(message)s")
+        logger.setLevel(str(args.log_level).upper())
+        serve(args.url, n_jobs=args.n_jobs, idle_timeout=args.idle_timeout)
+        return
+
+    client = Client(args.url)
+    if not client.is_running():
+        raise SystemExit(f"No rd_batch.service at {client.url} (start one with: rd-service serve)")
+    if args.command == "submit":
+        if __package__:
+            from .batch_runner import load_config
+        else:
+            from batch_runner import load_config
+        cfg = load_config(args.config)
+        if args.detach:
+            print(client.submit(cfg, priority=args.priority)["id"])
+        else:
+            raise SystemExit(client.run(cfg, priority=args.priority))
+    elif args.command == "status":
+        info = client.status(args.job)
+        for j in ([info] if args.job else info["jobs"]):
+            print(f"{j['id']}\t{j['state']}\tpriority {j['priority']}\t{j['name']}\t{j['outdir']}")
+    elif args.command == "cancel":
+        print(client.cancel(args.job)["state"])
+    elif args.command == "shutdown":
+        client.shutdown()
+        print("Service stopping")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+import os
+import numpy as np
+
+if __package__:
+    from .analyze_patterns import parse_profiles
+else:  # imported from a script inside rd_batch/
+    from analyze_patterns import parse_profiles
+from pattern_analysis import extract_features, classify_patterns, PATTERN_CLASSES, PATTERN
+
+
+def read_constants(run_dir):
+    """Parse constants.txt written by batch_runner into a dict (numbers as floats)."""
+    path = os.path.join(run_dir, "constants.txt")
+    out = {}
+    if not os.path.exists(path):
+        return out
+    with open(path) as f:
+        for line in f:
+            k, _, v = line.rstrip("\n").partition("\t")
+            try:
+                out[k] = float(v)
+            except ValueError:
+                out[k] = v
+    return out
+
+
+def _matches(value, target):
+    if isinstance(target, (int, float)) and not isinstance(target, bool):
+        try:
+            return np.isclose(float(value), float(target))
+        except (TypeError, ValueError):
+            return False
+    return str(value) == str(target)
+
+
+def load_training(run_dirs, keys, base):
+    """
+    Collect (X, patterned, wavelength, steps_used) from earlier result stores.
+
+    Each run dir needs batch_results.csv (or patterning_summary.csv) and constants.txt.
+    Parameters in `keys` come from the CSV column or, if constant there, from
+    constants.txt. Rows are dropped when any other model setting in `base` differs
+    (e.g. a different activator_type or N), so only comparable runs are used.
+    Outcomes use the pattern_class column when present, else are recomputed from
+    the stored final profiles.
+    """
+    import pandas as pd
+
+    X, patterned, wavelength, steps = [], [], [], []
+    for run_dir in run_dirs:
+        csv = os.path.join(run_dir, "patterning_summary.csv")
+        if not os.path.exists(csv):
+            csv = os.path.join(run_dir, "batch_results.csv")
+        df = pd.read_csv(csv)
+        consts = read_constants(run_dir)
+
+        keep = np.ones(len(df), dtype=bool)
+        for k, v in base.items():
+            if k in keys:
+                continue
+            if k in df:
+                keep &= np.array([_matches(x, v) for x in df[k]], dtype=bool)
+            elif k in consts and not _matches(consts[k], v):
+                keep[:] = False
+        missing = [k for k in keys if k not in df and k not in consts]
+        if missing or not keep.any():
+            continue
+        df = df[keep]
+
+        cols = np.column_stack([df[k].to_numpy(dtype=float) if k in df
+                                else np.full(len(df), float(consts[k])) for k in keys])
+
+        if "pattern_class" in df:
+            label = df["pattern_class"].to_numpy() == PATTERN_CLASSES[PATTERN]
+            lam = df["dct_wavelength"].to_numpy(dtype=float) if "dct_wavelength" in df \
+                else np.full(len(df), np.nan)
+        else:
+            feats = extract_features(parse_profiles(df["activator_final"]))
+            label = classify_patterns(feats) == PATTERN
+            lam = feats["dct_wavelength"]
+        X.append(cols)
+        patterned.append(label)
+        wavelength.append(lam)
+        steps.append(df["steps_used"].to_numpy(dtype=float))
+
+    if not X:
+        return np.empty((0, len(keys))), np.empty(0, bool), np.empty(0), np.empty(0)
+    X = np.vstack(X)
+    ok = np.all(np.isfinite(X), axis=1)
+    return X[ok], np.concatenate(patterned)[ok], np.concatenate(wavelength)[ok], np.concatenate(steps)[ok]
+
+
+class KNNSurrogate:
+    """
+    Distance-weighted k-nearest-neighbour surrogate over swept parameters.
+
+    Positive parameters are compared on a log scale, then every axis is scaled to
+    [0, 1] over the training range. predict() returns P(patterned), a confidence
+    max(P, 1-P), and neighbour averages of dominant wavelength (patterned neighbours
+    only) and steps_used. Distances are computed in chunks to bound memory.
+    """
+
+    def __init__(self, k=15, chunk=4096):
+        self.k = k
+        self.chunk = chunk
+
+    def _transform(self, X):
+        X = np.asarray(X, dtype=float)
+        Z = np.where(self.log_axes, np.log10(np.maximum(X, 1e-300)), X)
+        return (Z - self.lo) / self.span
+
+    def fit(self, X, patterned, wavelength, steps_used):
+        X = np.asarray(X, dtype=float)
+        self.log_axes = np.all(X > 0, axis=0)
+        Z = np.where(self.log_axes, np.log10(np.maximum(X, 1e-300)), X)
+        self.lo = Z.min(axis=0)
+        self.span = np.where(Z.max(axis=0) > self.lo, Z.max(axis=0) - self.lo, 1.0)
+        self.Z = (Z - self.lo) / self.span
+        self.y = np.asarray(patterned, dtype=float)
+        self.wavelength = np.asarray(wavelength, dtype=float)
+        self.steps = np.asarray(steps_used, dtype=float)
+        return self
+
+    def predict(self, Q):
+        Q = self._transform(Q)
+        k = min(self.k, len(self.y))
+        prob, lam, steps = [], [], []
+        for i in range(0, len(Q), self.chunk):
+            q = Q[i:i + self.chunk]
+            d2 = (np.sum(q * q, axis=1)[:, None] - 2.0 * q @ self.Z.T
+                  + np.sum(self.Z * self.Z, axis=1)[None, :])
+            nn = np.argpartition(np.maximum(d2, 0.0), k - 1, axis=1)[:, :k]
+            w = 1.0 / (np.sqrt(np.maximum(np.take_along_axis(d2, nn, axis=1), 0.0)) + 1e-6)
+            y = self.y[nn]
+            prob.append(np.sum(w * y, axis=1) / np.sum(w, axis=1))
+
+            wl = self.wavelength[nn]
+            wp = w * y * np.isfinite(wl)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                lam.append(np.sum(wp * np.nan_to_num(wl), axis=1) / np.sum(wp, axis=1))
+            steps.append(np.sum(w * self.steps[nn], axis=1) / np.sum(w, axis=1))
+        prob = np.concatenate(prob)
+        return {
+            "p_patterned": prob,
+            "confidence": np.maximum(prob, 1.0 - prob),
+            "dct_wavelength": np.concatenate(lam),
+            "steps_used": np.concatenate(steps),
+        }
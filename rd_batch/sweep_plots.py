@@ -0,0 +1,430 @@
+import argparse
+import os
+import time
+
+import numpy as np
+
+if __package__:
+    from .result_db import ResultDB, DEFAULT_PATH, AGGREGATES, SCAN_ROWS, _parse_where
+else:  # run as a script from inside rd_batch/
+    from result_db import ResultDB, DEFAULT_PATH, AGGREGATES, SCAN_ROWS, _parse_where
+from history_io import open_history, frame_steps
+
+# Plots of whole sweeps, read from the result store (result_db) rather than from the
+# CSVs. Grids and images are computed with NumPy over streamed chunks, so memory is
+# bounded by the plot size, not the number of runs; matplotlib is imported only by
+# the functions that draw, and only to draw one figure per plot.
+
+HEATMAP_AGGS = AGGREGATES + ("mode",)
+
+
+# ---------- Phase-diagram heatmaps ----------
+def _axis_index(v, axis):
+    """Cell index along one heatmap axis for the values `v` of a chunk; -1 = missing."""
+    kind, ref = axis
+    if kind == "text":  # global codes; len(labels) marks a missing label
+        return np.where(v < len(ref), v, -1)
+    v = np.asarray(v, dtype=float)
+    ok = ~np.isnan(v)
+    if kind == "values":
+        idx = np.searchsorted(ref, np.where(ok, v, ref[0]))
+    else:  # equal-width bins over [edges[0], edges[-1]]
+        lo, hi, n = ref[0], ref[-1], len(ref) - 1
+        scaled = (np.where(ok, v, lo) - lo) / (hi - lo) * n if hi > lo else np.zeros(len(v))
+        idx = np.clip(scaled.astype(np.int64), 0, n - 1)
+    return np.where(ok, idx, -1)
+
+
+def heatmap_grid(db, x, y, metric, bins=None, where=None, agg="avg", sweep=None, chunk=SCAN_ROWS):
+    """
+    Aggregate `metric` on a grid over the columns `x` and `y`, the other parameters
+    fixed by `where` or pooled. The matching runs are streamed from the result store
+    `chunk` rows at a time: one pass finds the axes, a second fills the cells.
+
+    bins=None keeps every distinct value of x and y (as ResultDB.slice does); an int
+    or (nx, ny) cuts numeric axes into equal-width bins over their range, for sampled
+    sweeps whose points never repeat. Text axes keep one cell per label. agg is one of
+    AGGREGATES, or "mode" for a text metric such as pattern_class (most frequent label).
+
+    Returns a dict with x, y (values, labels or bin centres), x_edges and y_edges (binned
+    axes), values of shape (len(y), len(x)) with NaN for empty cells, counts, and for
+    mode the labels that values index.
+    """
+    if agg not in HEATMAP_AGGS:
+        raise ValueError(f"agg must be one of {HEATMAP_AGGS}, got {agg!r}")
+    text = {c: db.text_labels(c, sweep) for c in {x, y, metric}}
+    text = {c: labels for c, labels in text.items() if labels}
+    if agg == "mode" and metric not in text:
+        raise ValueError(f"agg='mode' needs a text metric such as pattern_class, {metric!r} is numeric")
+    if metric in text and agg not in ("count", "mode"):
+        raise ValueError(f"{metric!r} is a text column: use agg='mode' or 'count'")
+    nbins = bins if bins is None or np.ndim(bins) else (bins, bins)
+    nbins = (None, None) if nbins is None else tuple(nbins)
+
+    # pass 1: distinct values (or, for binned axes, the range) of the numeric axes
+    nb = dict(zip((x, y), nbins))
+    found = {c: [] for c in (x, y) if c not in text}
+    for part in (db.scan(list(found), where, sweep, chunk) if found else ()):
+        for c in found:
+            v = part[c][~np.isnan(part[c])]
+            if len(v):
+                found[c].append(np.unique(v) if nb[c] is None else np.array([v.min(), v.max()]))
+    axes, out = [], {}
+    for name, c in (("x", x), ("y", y)):
+        if c in text:
+            axes.append(("text", text[c]))
+            out[name] = np.array(text[c], dtype=object)
+            continue
+        if not found[c]:
+            raise ValueError(f"No runs with a value of {c!r} match {where or {}}")
+        vals = np.unique(np.concatenate(found[c]))
+        if nb[c] is None:
+            axes.append(("values", vals))
+            out[name] = vals
+        else:
+            edges = np.linspace(vals[0], vals[-1], int(nb[c]) + 1)
+            axes.append(("bins", edges))
+            out[name], out[f"{name}_edges"] = 0.5 * (edges[:-1] + edges[1:]), edges
+    nx, ny = len(out["x"]), len(out["y"])
+    cells = nx * ny
+
+    # pass 2: accumulate per cell
+    counts = np.zeros(cells, dtype=np.int64)
+    n_valid = np.zeros(cells, dtype=np.int64)
+    total = np.zeros(cells)
+    lo, hi = np.full(cells, np.inf), np.full(cells, -np.inf)
+    k = len(text.get(metric, []))
+    votes = np.zeros(cells * k, dtype=np.int64) if agg == "mode" else None
+    cols = list(dict.fromkeys([x, y, metric]))
+    for part in db.scan(cols, where, sweep, chunk, codes=text):
+        ix, iy = _axis_index(part[x], axes[0]), _axis_index(part[y], axes[1])
+        keep = (ix >= 0) & (iy >= 0)
+        flat = (iy * nx + ix)[keep]
+        counts += np.bincount(flat, minlength=cells)
+        m = part[metric][keep]
+        if agg == "mode":
+            has = m < k
+            votes += np.bincount(flat[has] * k + m[has], minlength=cells * k)
+        elif agg != "count":
+            m = np.asarray(m, dtype=float)
+            ok = ~np.isnan(m)
+            g, v = flat[ok], m[ok]
+            n_valid += np.bincount(g, minlength=cells)
+            if agg in ("sum", "avg"):
+                total += np.bincount(g, weights=v, minlength=cells)
+            else:
+                (np.minimum if agg == "min" else np.maximum).at(lo if agg == "min" else hi, g, v)
+
+    if agg == "count":
+        values = np.where(counts > 0, counts, np.nan)
+    elif agg == "mode":
+        votes = votes.reshape(cells, k)
+        values = np.where(votes.sum(axis=1) > 0, votes.argmax(axis=1), np.nan)
+        out["labels"] = text[metric]
+    else:
+        res = {"sum": total, "min": lo, "max": hi}.get(agg)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            res = total / n_valid if agg == "avg" else res
+        values = np.where(n_valid > 0, res, np.nan)
+    out.update({"values": values.reshape(ny, nx), "counts": counts.reshape(ny, nx),
+                "x_name": x, "y_name": y, "metric": metric, "agg": agg})
+    return out
+
+
+def _palette(n):
+    """n distinct RGB colours for categorical labels (pattern classes)."""
+    import matplotlib
+
+    cmap = matplotlib.colormaps["tab10" if n <= 10 else "tab20"]
+    return np.array([cmap(i % 20)[:3] for i in range(n)])
+
+
+def _ticks(ax, axis, labels, max_ticks=12):
+    """Label an index axis with (a readable subset of) its values."""
+    step = max(1, int(np.ceil(len(labels) / max_ticks)))
+    pos = np.arange(0, len(labels), step)
+    text = [f"{v:.4g}" if isinstance(v, (float, np.floating)) else str(v) for v in np.asarray(labels)[pos]]
+    getattr(ax, f"set_{axis}ticks")(pos)
+    getattr(ax, f"set_{axis}ticklabels")(text, rotation=45 if axis == "x" else 0)
+
+
+def plot_heatmap(grid, outfile_png, title=None, cmap="viridis", figsize=(6.4, 4.8), dpi=100):
+    """
+    Draw a heatmap_grid result and save it as PNG. Binned axes are drawn to scale;
+    distinct values (often log-spaced) and labels are drawn one cell each. A mode
+    grid gets one colour per label and a legend.
+    """
+    from matplotlib.figure import Figure
+    from matplotlib.colors import ListedColormap
+    from matplotlib.patches import Patch
+
+    fig = Figure(figsize=figsize, dpi=dpi)
+    ax = fig.add_subplot()
+    values = np.ma.masked_invalid(grid["values"])
+    kwargs = {"cmap": cmap}
+    if grid["agg"] == "mode":
+        colours = _palette(len(grid["labels"]))
+        kwargs = {"cmap": ListedColormap(colours), "vmin": -0.5, "vmax": len(colours) - 0.5}
+
+    if "x_edges" in grid and "y_edges" in grid:
+        im = ax.pcolormesh(grid["x_edges"], grid["y_edges"], values, **kwargs)
+    else:
+        im = ax.imshow(values, origin="lower", aspect="auto", interpolation="nearest", **kwargs)
+        _ticks(ax, "x", grid["x"])
+        _ticks(ax, "y", grid["y"])
+    if grid["agg"] == "mode":
+        ax.legend(handles=[Patch(color=c, label=l) for c, l in zip(colours, grid["labels"])],
+                  loc="upper left", bbox_to_anchor=(1.02, 1.0), fontsize=8, frameon=False)
+    else:
+        fig.colorbar(im, ax=ax, label=f"{grid['agg']}({grid['metric']})")
+    ax.set_xlabel(grid["x_name"])
+    ax.set_ylabel(grid["y_name"])
+    ax.set_title(title or f"{grid['metric']} ({int(grid['counts'].sum())} runs)")
+    fig.tight_layout()
+    fig.savefig(outfile_png)
+
+
+# ---------- Profile galleries ----------
+def _thumbnails(profiles, tile, normalize, vmin=None, vmax=None):
+    """
+    Render profiles of shape (k, N) as (k, height, width) filled line plots (True = ink).
+    Each profile is resampled to `width` columns by taking the maximum over the cells of
+    a column, so narrow spikes survive downsampling.
+    """
+    height, width = tile
+    n = profiles.shape[1]
+    starts = (np.arange(width) * n) // width
+    v = np.fmax.reduceat(profiles, starts, axis=1)
+    if normalize == "tile":
+        with np.errstate(invalid="ignore"):
+            lo = np.nanmin(v, axis=1, keepdims=True)
+            hi = np.nanmax(v, axis=1, keepdims=True)
+    else:
+        lo, hi = vmin, vmax
+    with np.errstate(invalid="ignore", divide="ignore"):
+        v = np.where(hi > lo, (v - lo) / (hi - lo), 0.5)
+    v = np.nan_to_num(v, nan=-1.0)
+    levels = (height - 0.5 - np.arange(height)) / height  # top row = highest value
+    return levels[None, :, None] <= v[:, None, :]
+
+
+def profile_gallery(db, column="activator_final", where=None, sweep=None, sort_by=(), color_by=None,
+                    max_tiles=400, columns=20, tile=(24, 64), normalize="tile", gap=1, chunk=20_000):
+    """
+    Thumbnails of the stored final profiles of the matching runs (ingested with
+    profiles=True), tiled into one RGB image array instead of one figure per run.
+
+    The runs are streamed in chunks of `chunk` rows and decimated on the fly: every
+    stride-th profile is kept, and the stride doubles whenever more than 2 * max_tiles
+    are held, so at most `max_tiles` evenly spread runs are drawn whatever the store
+    size. Tiles are ordered by the `sort_by` columns, coloured by the labels (or
+    values) of `color_by`, and scaled per tile or over all tiles (normalize="global").
+
+    Returns (image of shape (rows * (h + gap) + gap, columns * (w + gap) + gap, 3) with
+    values in [0, 1], dict of arrays describing the tiles in order: sweep_id, row, the
+    sort_by and color_by columns, and "colors" = {label: RGB} when colouring by labels).
+    """
+    if normalize not in ("tile", "global"):
+        raise ValueError(f"normalize must be 'tile' or 'global', got {normalize!r}")
+    sort_by = list(sort_by)
+    meta_cols = list(dict.fromkeys(["sweep_id", "row"] + sort_by + ([color_by] if color_by else [])))
+    text = {c: db.text_labels(c, sweep) for c in meta_cols if c not in ("sweep_id", "row")}
+    text = {c: labels for c, labels in text.items() if labels}
+
+    kept, stride, seen = [], 1, 0
+    for s in db.sweeps(sweep):
+        if column not in s["columns"]:  # ingested without profiles
+            continue
+        for part in db.scan(meta_cols + [column], where, s["sweep_id"], chunk, codes=text):
+            has = ~np.all(np.isnan(part[column]), axis=1)
+            idx = np.flatnonzero(has)
+            pick = idx[(seen + np.arange(len(idx))) % stride == 0]
+            seen += len(idx)
+            if len(pick):
+                kept.append({c: part[c][pick] for c in meta_cols + [column]})
+            held = sum(len(k["row"]) for k in kept)
+            if held > 2 * max_tiles:
+                merged = {c: np.concatenate([k[c] for k in kept]) for c in kept[0]}
+                kept = [{c: v[::2] for c, v in merged.items()}]
+                stride *= 2
+    if not kept:
+        raise ValueError(f"No stored {column} profiles match {where or {}}; ingest with profiles=True")
+    widths = {k[column].shape[1] for k in kept}
+    if len(widths) > 1:  # sweeps of different N: resample onto the widest grid
+        n = max(widths)
+        for k in kept:
+            src = k[column]
+            k[column] = src[:, (np.arange(n) * src.shape[1]) // n]
+    tiles = {c: np.concatenate([k[c] for k in kept]) for c in kept[0]}
+    if len(tiles["row"]) > max_tiles:
+        pick = np.linspace(0, len(tiles["row"]) - 1, max_tiles).round().astype(np.int64)
+        tiles = {c: v[pick] for c, v in tiles.items()}
+    if sort_by:
+        order = np.lexsort([tiles[c] for c in reversed(sort_by)])
+        tiles = {c: v[order] for c, v in tiles.items()}
+
+    profiles = tiles.pop(column).astype(float)
+    vmin = vmax = None
+    if normalize == "global":
+        vmin, vmax = float(np.nanmin(profiles)), float(np.nanmax(profiles))
+    ink = _thumbnails(profiles, tile, normalize, vmin, vmax)
+
+    k = len(ink)
+    colours = np.tile([0.15, 0.15, 0.15], (k, 1))
+    meta = dict(tiles)
+    if color_by:
+        import matplotlib
+        if color_by in text:
+            labels = text[color_by]
+            palette = np.vstack([_palette(len(labels)), [0.15, 0.15, 0.15]])  # last: missing label
+            colours = palette[tiles[color_by]]
+            meta["colors"] = {l: tuple(float(c) for c in palette[i]) for i, l in enumerate(labels)}
+        else:
+            v = tiles[color_by].astype(float)
+            lo, hi = np.nanmin(v), np.nanmax(v)
+            scaled = (v - lo) / (hi - lo) if hi > lo else np.full(k, 0.5)
+            colours = matplotlib.colormaps["viridis"](np.nan_to_num(scaled))[:, :3]
+    for c in text:  # report labels, not codes
+        meta[c] = np.array(text[c] + [None], dtype=object)[tiles[c]]
+
+    h, w = tile
+    rows = -(-k // columns)
+    image = np.ones((rows * (h + gap) + gap, columns * (w + gap) + gap, 3))
+    for i in range(k):
+        r, c = divmod(i, columns)
+        y0, x0 = gap + r * (h + gap), gap + c * (w + gap)
+        image[y0:y0 + h, x0:x0 + w][ink[i]] = colours[i]
+    return image, meta
+
+
+def save_image(image, outfile_png, scale=1):
+    """Write an image array (e.g. from profile_gallery) as PNG, enlarged `scale` times."""
+    from matplotlib.image import imsave
+
+    if scale > 1:
+        image = np.repeat(np.repeat(image, scale, axis=0), scale, axis=1)
+    imsave(outfile_png, np.clip(image, 0.0, 1.0))
+
+
+# ---------- Downsampled kymographs ----------
+def kymograph_array(history_path, species=0, t=slice(None), x=slice(None), max_rows=1000, max_cols=1000,
+                    chunk=256):
+    """
+    Space-time image of one species of an on-disk 1D history (history_io), at most
+    max_rows x max_cols. Unlike the strided visualize.plot_kymograph, every frame
+    counts: rows average consecutive frames and columns average neighbouring cells,
+    so oscillations faster than the row spacing blur instead of aliasing. The
+    window is read `chunk` frames at a time.
+
+    Returns (image, step of the first frame of each row (history_io.frame_steps),
+    first cell of each column).
+    """
+    frames, meta = open_history(history_path)
+    if frames.ndim != 3:
+        raise ValueError(f"kymographs need a 1D history, {history_path} has frames of shape {frames.shape[2:]}")
+    t_idx = np.arange(frames.shape[0])[t]
+    x_idx = np.arange(frames.shape[-1])[x]
+    window = frames[t, species][:, x]  # basic slices keep the memmap lazy
+    T, n = window.shape
+    if T == 0 or n == 0:
+        raise ValueError("Empty kymograph window")
+    rows, cols = min(T, max_rows), min(n, max_cols)
+    t_starts = (np.arange(rows) * T) // rows
+    x_starts = (np.arange(cols) * n) // cols
+    row_of = np.repeat(np.arange(rows), np.diff(np.append(t_starts, T)))
+    per_row = np.bincount(row_of, minlength=rows)
+    per_col = np.diff(np.append(x_starts, n))
+
+    image = np.zeros((rows, cols))
+    for s in range(0, T, chunk):
+        block = np.add.reduceat(np.asarray(window[s:s + chunk], dtype=float), x_starts, axis=1)
+        r = row_of[s:s + len(block)]
+        starts = np.flatnonzero(np.diff(r, prepend=-1))  # rows are runs of consecutive frames
+        image[r[starts]] += np.add.reduceat(block, starts, axis=0)
+    image /= per_row[:, None] * per_col[None, :]
+    return image, frame_steps(t_idx[t_starts], meta.get("save_every", 1)), x_idx[x_starts]
+
+
+def plot_kymographs(history_paths, outfile_png, species=0, titles=None, columns=4, max_rows=400,
+                    max_cols=400, cmap="inferno", panel_size=(3.2, 2.6), dpi=100):
+    """
+    Downsampled kymographs (kymograph_array) of several histories side by side in one
+    figure, each panel with its own colour scale.
+    """
+    from matplotlib.figure import Figure
+
+    history_paths = list(history_paths)
+    columns = min(columns, len(history_paths))
+    rows = -(-len(history_paths) // columns)
+    fig = Figure(figsize=(panel_size[0] * columns, panel_size[1] * rows), dpi=dpi)
+    for i, path in enumerate(history_paths):
+        image, steps, cells = kymograph_array(path, species, max_rows=max_rows, max_cols=max_cols)
+        ax = fig.add_subplot(rows, columns, i + 1)
+        im = ax.imshow(image, aspect="auto", origin="lower", cmap=cmap, interpolation="nearest",
+                       extent=(cells[0] - 0.5, cells[-1] + 0.5, steps[0], steps[-1]))
+        fig.colorbar(im, ax=ax)
+        ax.set_title(titles[i] if titles else os.path.basename(path), fontsize=9)
+        ax.set_xlabel("Cell")
+        ax.set_ylabel("Step")
+    fig.tight_layout()
+    fig.savefig(outfile_png)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Plot phase diagrams, profile galleries and kymographs of sweeps.")
+    ap.add_argument("--db", default=DEFAULT_PATH, help="Result store catalogue (see rd-db)")
+    sub = ap.add_subparsers(dest="command", required=True)
+    hm = sub.add_parser("heatmap", help="Aggregate a metric over two columns")
+    hm.add_argument("x")
+    hm.add_argument("y")
+    hm.add_argument("metric")
+    hm.add_argument("--agg", default="avg", choices=HEATMAP_AGGS)
+    hm.add_argument("--bins", type=int, nargs="+", help="Equal-width bins per axis (one value or nx ny)")
+    hm.add_argument("--cmap", default="viridis")
+    ga = sub.add_parser("gallery", help="Thumbnails of stored final profiles in one image")
+    ga.add_argument("--column", default="activator_final")
+    ga.add_argument("--sort-by", nargs="*", default=[])
+    ga.add_argument("--color-by")
+    ga.add_argument("--max-tiles", type=int, default=400)
+    ga.add_argument("--columns", type=int, default=20, help="Tiles per row")
+    ga.add_argument("--tile", type=int, nargs=2, default=[24, 64], metavar=("H", "W"))
+    ga.add_argument("--normalize", choices=("tile", "global"), default="tile")
+    ga.add_argument("--scale", type=int, default=1, help="Enlarge the image this many times")
+    for p in (hm, ga):
+        p.add_argument("--where", "-w", action="append",
+                       help="k=v, k=lo:hi (range) or k=v1,v2,... (set); repeatable")
+        p.add_argument("--sweep", help="Restrict to sweeps whose path matches this LIKE pattern")
+    ky = sub.add_parser("kymograph", help="Downsampled kymographs of history files")
+    ky.add_argument("histories", nargs="+")
+    ky.add_argument("--species", type=int, default=0, help="0 = activator, 1 = inhibitor")
+    ky.add_argument("--max-rows", type=int, default=400)
+    ky.add_argument("--max-cols", type=int, default=400)
+    ky.add_argument("--columns", type=int, default=4, help="Panels per row")
+    for p in (hm, ga, ky):
+        p.add_argument("--out", "-o", required=True, help="Output PNG")
+    args = ap.parse_args()
+
+    t0 = time.perf_counter()
+    if args.command == "heatmap":
+        bins = args.bins[0] if args.bins and len(args.bins) == 1 else args.bins
+        grid = heatmap_grid(ResultDB(args.db), args.x, args.y, args.metric, bins=bins,
+                            where=_parse_where(args.where), agg=args.agg, sweep=args.sweep)
+        plot_heatmap(grid, args.out, cmap=args.cmap)
+        print(f"Wrote {args.out}: {grid['values'].shape[1]}x{grid['values'].shape[0]} cells, "
+              f"{int(grid['counts'].sum())} runs, {time.perf_counter() - t0:.2f}s")
+    elif args.command == "gallery":
+        image, meta = profile_gallery(ResultDB(args.db), args.column, _parse_where(args.where), args.sweep,
+                                      sort_by=args.sort_by, color_by=args.color_by, max_tiles=args.max_tiles,
+                                      columns=args.columns, tile=tuple(args.tile), normalize=args.normalize)
+        save_image(image, args.out, scale=args.scale)
+        print(f"Wrote {args.out}: {len(meta['row'])} profiles, {time.perf_counter() - t0:.2f}s")
+        for label, rgb in meta.get("colors", {}).items():
+            print(f"  {label}\t#{''.join(f'{round(255 * c):02x}' for c in rgb)}")
+    else:
+        plot_kymographs(args.histories, args.out, species=args.species, columns=args.columns,
+                        max_rows=args.max_rows, max_cols=args.max_cols)
+        print(f"Wrote {args.out}: {len(args.histories)} kymographs, {time.perf_counter() - t0:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
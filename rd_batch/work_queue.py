@@ -0,0 +1,269 @@
+import argparse
+import json
+import os
+import pickle
+import socket
+import threading
+import time
+
+if __package__:
+    from .batch_runner import (sweep_plan, run_tasks, with_run_seed, dedup_owners, fan_out, write_store,
+                               load_config, setup_logging, logger)
+    from .grid import make_param_grid
+else:  # run as a script from inside rd_batch/
+    from batch_runner import (sweep_plan, run_tasks, with_run_seed, dedup_owners, fan_out, write_store,
+                              load_config, setup_logging, logger)
+    from grid import make_param_grid
+
+# Sub-directories of a queue. A task file moves pending/ -> claimed/ -> done/ by
+# os.rename, which is atomic on a POSIX (and NFS) filesystem: of several workers
+# renaming the same pending file, exactly one succeeds.
+QUEUE_DIRS = ("pending", "claimed", "done", "shards")
+
+
+# ---------- Coordinator ----------
+def init_queue(cfg, queue_dir, chunk_size=50):
+    """
+    Turn a sweep config into a work queue on a shared filesystem.
+
+    The coordinator expands the grid (make_param_grid), assigns every stochastic
+    point its seed and removes duplicates exactly as run_sweep would, then writes
+    the unique points in chunks of `chunk_size` as pending/chunk_NNNNNN.json.
+    queue.json keeps the config; points.pkl keeps the full point list for merge_queue.
+    Adaptive and surrogate-screened sweeps need the results of one round to plan
+    the next, so they cannot be queued up front.
+    """
+    if cfg.get("mode") == "adaptive" or cfg.get("surrogate"):
+        raise ValueError("work queues support grid, zip and sampling sweeps, not adaptive or surrogate modes")
+    if os.path.exists(os.path.join(queue_dir, "queue.json")):
+        raise FileExistsError(f"{queue_dir} already holds a work queue")
+    plan = sweep_plan(cfg)
+    param_list = make_param_grid(plan["base"], sweeps=plan["sweeps"], mode=plan["mode"],
+                                 n_samples=cfg.get("samples"), seed=cfg.get("seed", 0))
+    param_list = [with_run_seed(p, plan["sweep_seed"]) for p in param_list]
+    owner = dedup_owners(param_list) if plan["dedup"] else list(range(len(param_list)))
+    unique = sorted(set(owner))
+
+    for d in QUEUE_DIRS:
+        os.makedirs(os.path.join(queue_dir, d), exist_ok=True)
+    with open(os.path.join(queue_dir, "points.pkl"), "wb") as f:
+        pickle.dump({"params": param_list, "owner": owner}, f, protocol=pickle.HIGHEST_PROTOCOL)
+    chunks = [unique[i:i + chunk_size] for i in range(0, len(unique), chunk_size)]
+    for c, idx in enumerate(chunks):
+        _write_atomic(os.path.join(queue_dir, "pending", f"chunk_{c:06d}.json"),
+                      json.dumps({"chunk": c, "points": [[i, param_list[i]] for i in idx]},
+                                 default=_json_scalar).encode())
+    # written last: workers only start once every chunk is in place
+    _write_atomic(os.path.join(queue_dir, "queue.json"),
+                  json.dumps({"config": cfg, "chunks": len(chunks), "points": len(param_list),
+                              "unique": len(unique), "created": time.time()}, indent=2).encode())
+    return len(chunks)
+
+
+def _json_scalar(x):
+    """json.dumps fallback for NumPy scalars in sampled parameters."""
+    return x.item()
+
+
+def _write_atomic(path, data):
+    tmp = f"{path}.tmp.{socket.gethostname()}.{os.getpid()}"
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _read_queue(queue_dir):
+    with open(os.path.join(queue_dir, "queue.json")) as f:
+        return json.load(f)
+
+
+def requeue_stale(queue_dir, stale_after):
+    """
+    Move claims whose heartbeat (the claimed file's mtime) is older than `stale_after`
+    seconds back to pending/. Returns the requeued task names. Claims whose shard
+    already exists are moved to done/ instead (the worker died after writing it).
+    Hosts compare mtimes written by other hosts, so stale_after must exceed the
+    clock skew between them by a wide margin.
+    """
+    requeued = []
+    now = time.time()
+    claimed = os.path.join(queue_dir, "claimed")
+    for name in os.listdir(claimed):
+        path = os.path.join(claimed, name)
+        try:
+            if now - os.stat(path).st_mtime < stale_after:
+                continue
+            target = "done" if os.path.exists(_shard_path(queue_dir, name)) else "pending"
+            os.rename(path, os.path.join(queue_dir, target, name))
+        except FileNotFoundError:  # finished or requeued by someone else meanwhile
+            continue
+        if target == "pending":
+            requeued.append(name)
+    return requeued
+
+
+def queue_status(queue_dir):
+    info = _read_queue(queue_dir)
+    counts = {d: sum(".tmp." not in n for n in os.listdir(os.path.join(queue_dir, d))) for d in QUEUE_DIRS}
+    ages = [time.time() - os.stat(os.path.join(queue_dir, "claimed", n)).st_mtime
+            for n in os.listdir(os.path.join(queue_dir, "claimed"))]
+    return {"chunks": info["chunks"], "points": info["points"], "unique": info["unique"], **counts,
+            "oldest_heartbeat_s": max(ages) if ages else None}
+
+
+# ---------- Worker ----------
+def _shard_path(queue_dir, task_name):
+    return os.path.join(queue_dir, "shards", task_name.replace(".json", ".pkl"))
+
+
+def claim(queue_dir):
+    """Atomically claim one pending task; returns its name, or None when nothing is pending."""
+    pending = os.path.join(queue_dir, "pending")
+    for name in sorted(os.listdir(pending)):
+        if not name.endswith(".json"):
+            continue
+        dst = os.path.join(queue_dir, "claimed", name)
+        try:
+            os.rename(os.path.join(pending, name), dst)
+        except FileNotFoundError:  # another worker won the race
+            continue
+        os.utime(dst)  # the heartbeat starts now, not when the task was written
+        return name
+    return None
+
+
+def _heartbeat(path, interval, stop):
+    while not stop.wait(interval):
+        try:
+            os.utime(path)
+        except FileNotFoundError:  # requeued as stale; our shard is still valid if we finish
+            return
+
+
+def work(queue_dir, n_jobs=None, heartbeat=30.0, stale_after=600.0, poll=5.0, max_chunks=None, log=print):
+    """
+    Claim and run chunks until the queue is drained. Any number of workers, on any
+    host that sees `queue_dir`, can run this concurrently.
+
+    While a chunk runs, a thread refreshes the claim's mtime every `heartbeat` seconds.
+    Idle workers requeue stale claims (see requeue_stale) and keep polling while other
+    workers hold claims, so chunks of a crashed worker are picked up again. A chunk's
+    results are written atomically to shards/ before the claim moves to done/, and
+    every point carries its own seed, so a chunk run twice gives the same shard.
+    Returns the number of chunks this worker completed.
+    """
+    cfg = dict(_read_queue(queue_dir)["config"])
+    if n_jobs is not None:
+        cfg["n_jobs"] = n_jobs
+    plan = sweep_plan(cfg)
+    setup_logging(plan["log_level"])
+    worker = f"{socket.gethostname()}.{os.getpid()}"
+    completed = 0
+    while max_chunks is None or completed < max_chunks:
+        name = claim(queue_dir)
+        if name is None:
+            for r in requeue_stale(queue_dir, stale_after):
+                log(f"[{worker}] requeued stale claim {r}")
+            if not os.listdir(os.path.join(queue_dir, "pending")):
+                if not os.listdir(os.path.join(queue_dir, "claimed")):
+                    break  # drained
+                time.sleep(poll)
+            continue
+
+        path = os.path.join(queue_dir, "claimed", name)
+        stop = threading.Event()
+        beat = threading.Thread(target=_heartbeat, args=(path, heartbeat, stop), daemon=True)
+        beat.start()
+        try:
+            with open(path) as f:
+                task = json.load(f)
+            t0 = time.perf_counter()
+            results = run_tasks(plan, [(i, p) for i, p in task["points"]], desc=f"{worker} {name}")
+            shard = {"worker": worker, "wall_time": time.perf_counter() - t0,
+                     "results": {i: r for (i, _), r in zip(task["points"], results)}}
+            _write_atomic(_shard_path(queue_dir, name), pickle.dumps(shard, protocol=pickle.HIGHEST_PROTOCOL))
+        finally:
+            stop.set()
+            beat.join()
+        try:
+            os.rename(path, os.path.join(queue_dir, "done", name))
+        except FileNotFoundError:  # requeued meanwhile; the shard marks it complete anyway
+            logger.warning("Claim %s was requeued while %s ran it", name, worker)
+        completed += 1
+        log(f"[{worker}] finished {name} ({len(task['points'])} points)")
+    return completed
+
+
+# ---------- Merge ----------
+def merge_queue(queue_dir, outdir=None, log=print):
+    """
+    Assemble the result store of a drained queue: read every shard, fan deduplicated
+    results back out to all grid points and write batch_results.csv and
+    perf_summary.json (to the config's outdir unless `outdir` is given).
+    The sweep wall time is the span from queue creation to the newest shard.
+    """
+    info = _read_queue(queue_dir)
+    cfg = dict(info["config"])
+    if outdir is not None:
+        cfg["outdir"] = outdir
+    plan = sweep_plan(cfg)
+    with open(os.path.join(queue_dir, "points.pkl"), "rb") as f:
+        points = pickle.load(f)
+
+    by_index, newest = {}, info["created"]
+    for c in range(info["chunks"]):
+        path = _shard_path(queue_dir, f"chunk_{c:06d}.json")
+        if not os.path.exists(path):
+            raise RuntimeError(f"{path} is missing: run more workers before merging "
+                               f"({queue_status(queue_dir)})")
+        with open(path, "rb") as f:
+            by_index.update(pickle.load(f)["results"])
+        newest = max(newest, os.stat(path).st_mtime)
+
+    results = fan_out(points["params"], points["owner"], by_index, plan["varied_keys"])
+    if info["unique"] < info["points"]:
+        log(f"Deduplicated {info['points']} points to {info['unique']} unique simulations")
+    return write_store(plan, [row for row, _ in results], [perf for _, perf in results],
+                       newest - info["created"], log=log)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Run a sweep through a work queue on a shared filesystem.")
+    sub = ap.add_subparsers(dest="command", required=True)
+    it = sub.add_parser("init", help="Write the task chunks of a sweep config")
+    it.add_argument("queue_dir")
+    it.add_argument("--config", "-c", required=True, help="Path to YAML config")
+    it.add_argument("--chunk-size", type=int, default=50, help="Simulations per task file")
+    wk = sub.add_parser("work", help="Claim and run chunks until the queue is drained")
+    wk.add_argument("queue_dir")
+    wk.add_argument("--n-jobs", type=int, help="Local worker processes (default: the config's n_jobs)")
+    wk.add_argument("--heartbeat", type=float, default=30.0, help="Seconds between claim refreshes")
+    wk.add_argument("--stale-after", type=float, default=600.0,
+                    help="Requeue claims not refreshed for this many seconds")
+    wk.add_argument("--poll", type=float, default=5.0, help="Seconds between checks while other workers hold claims")
+    wk.add_argument("--max-chunks", type=int, help="Stop after this many chunks")
+    st = sub.add_parser("status", help="Count pending, claimed and finished chunks")
+    st.add_argument("queue_dir")
+    mg = sub.add_parser("merge", help="Assemble batch_results.csv from the result shards")
+    mg.add_argument("queue_dir")
+    mg.add_argument("--outdir", help="Write the result store here instead of the config's outdir")
+    args = ap.parse_args()
+
+    if args.command == "init":
+        n = init_queue(load_config(args.config), args.queue_dir, chunk_size=args.chunk_size)
+        print(f"Wrote {n} chunks to {args.queue_dir}/pending")
+    elif args.command == "work":
+        n = work(args.queue_dir, n_jobs=args.n_jobs, heartbeat=args.heartbeat,
+                 stale_after=args.stale_after, poll=args.poll, max_chunks=args.max_chunks)
+        print(f"Worker finished {n} chunks")
+    elif args.command == "status":
+        for k, v in queue_status(args.queue_dir).items():
+            print(f"{k}\t{v}")
+    elif args.command == "merge":
+        merge_queue(args.queue_dir, outdir=args.outdir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,367 @@
+import difflib
+
+import numpy as np
+
+from model_params import ipow
+
+# How a species reaches the Hill terms that read it, and whether it moves:
+#   diffusible -> senses its own level and diffuses (the "paracrine" activator, the inhibitor)
+#   juxtacrine -> senses the average over contacting cells, does not diffuse
+#   tethered   -> senses its own level, does not diffuse (cell-autonomous)
+TRANSPORT_MODES = ("diffusible", "juxtacrine", "tethered")
+SPECIES_KEYS = ("transport", "diffusion", "decay", "production")
+TERM_KEYS = ("activators", "repressors", "basal")
+INPUT_KEYS = ("species", "half_sat", "hill")
+GEOMETRIES = ("neumann_1d", "periodic_2d")
+
+
+def _check(keys, valid, where):
+    for k in keys:
+        if k not in valid:
+            close = difflib.get_close_matches(k, valid, n=1)
+            hint = f" (did you mean {close[0]!r}?)" if close else ""
+            raise ValueError(f"Unknown key {k!r} in {where}{hint}")
+
+
+class ReactionNetwork:
+    """
+    Declarative multi-species reaction network on a tissue, compiled to one step kernel.
+
+    A spec (dict or YAML) lists species and Hill-type regulatory terms. Every
+    number in it is either a literal or the name of a parameter, looked up in the
+    parameter dict at compile time:
+
+        species:
+          A: {transport: diffusible, diffusion: act_diffusion, decay: act_decay_rate,
+              production: {H: act_prod_rate}}
+          I: {transport: diffusible, diffusion: inh_diffusion, decay: inh_decay_rate,
+              production: {H: inh_prod_rate}}
+        terms:
+          H: {activators: [{species: A, half_sat: act_half_sat, hill: act_hill_coeff}],
+              repressors: [{species: I, half_sat: inh_half_sat, hill: inh_hill_coeff}],
+              basal: basal_prod}
+
+    A term with activator powers a_k = (s_k / K_k)^n_k and repressor powers r_k is
+    (sum a_k + basal) / (sum a_k + sum r_k + 1 + basal), the form of
+    simulation.hill_function. Species change by sum(rate * term) - decay * x, plus
+    diffusion for diffusible species. activator_inhibitor() builds the two-species
+    model of simulation.py.
+    """
+
+    def __init__(self, species, terms):
+        self.species = {name: dict(s) for name, s in species.items()}
+        self.terms = {name: dict(t) for name, t in terms.items()}
+        self._validate()
+
+    @classmethod
+    def from_dict(cls, spec):
+        _check(spec, ("species", "terms"), "the network spec")
+        return cls(spec["species"], spec.get("terms", {}))
+
+    @classmethod
+    def from_yaml(cls, path):
+        """ReactionNetwork from a YAML spec file (PyYAML is imported on use)."""
+        import yaml
+        with open(path) as f:
+            return cls.from_dict(yaml.safe_load(f))
+
+    def _validate(self):
+        if not self.species:
+            raise ValueError("A reaction network needs at least one species")
+        names = list(self.species) + list(self.terms)
+        for n in names:
+            if not n.isidentifier() or n.startswith("_") or names.count(n) > 1:
+                raise ValueError(f"Species and term names must be unique identifiers, got {n!r}")
+        for name, s in self.species.items():
+            _check(s, SPECIES_KEYS, f"species {name!r}")
+            mode = s.setdefault("transport", "diffusible")
+            if mode not in TRANSPORT_MODES:
+                raise ValueError(f"Species {name!r}: transport must be one of {TRANSPORT_MODES}, got {mode!r}")
+            s.setdefault("diffusion", 0.0)
+            s.setdefault("decay", 0.0)
+            s["production"] = dict(s.get("production") or {})
+            _check(s["production"], list(self.terms), f"the production of species {name!r}")
+        for name, t in self.terms.items():
+            _check(t, TERM_KEYS, f"term {name!r}")
+            t.setdefault("basal", 0.0)
+            for role in ("activators", "repressors"):
+                t[role] = [dict(x) for x in t.get(role) or []]
+                for x in t[role]:
+                    _check(x, INPUT_KEYS, f"the {role} of term {name!r}")
+                    if "species" not in x or "half_sat" not in x:
+                        raise ValueError(f"Term {name!r}: every input needs a species and a half_sat")
+                    _check([x["species"]], list(self.species), f"the {role} of term {name!r}")
+                    x.setdefault("hill", 1)
+
+    def parameter_names(self):
+        """Names of the parameters the spec refers to, in order of first use."""
+        refs = []
+        for s in self.species.values():
+            refs += [s["diffusion"], s["decay"], *s["production"].values()]
+        for t in self.terms.values():
+            refs.append(t["basal"])
+            refs += [x[k] for role in ("activators", "repressors") for x in t[role] for k in ("half_sat", "hill")]
+        return list(dict.fromkeys(r for r in refs if isinstance(r, str)))
+
+    def _resolve(self, p):
+        """Spec with every parameter name replaced by its float value from `p` (dict or ModelParams)."""
+        if hasattr(p, "to_dict"):
+            p = p.to_dict()
+        missing = [k for k in self.parameter_names() if k not in p]
+        if missing:
+            raise ValueError(f"Missing network parameters: {', '.join(missing)}")
+
+        def val(v, what):
+            v = p[v] if isinstance(v, str) else v
+            if isinstance(v, bool) or not isinstance(v, (int, float, np.number)) or not np.isfinite(v) or v < 0:
+                raise ValueError(f"{what} must be a finite number >= 0, got {v!r}")
+            return float(v)
+
+        species = {n: {"transport": s["transport"], "diffusion": val(s["diffusion"], f"{n}.diffusion"),
+                       "decay": val(s["decay"], f"{n}.decay"),
+                       "production": {t: val(r, f"{n}.production.{t}") for t, r in s["production"].items()}}
+                   for n, s in self.species.items()}
+        terms = {}
+        for n, t in self.terms.items():
+            terms[n] = {"basal": val(t["basal"], f"{n}.basal")}
+            for role in ("activators", "repressors"):
+                inputs = []
+                for x in t[role]:
+                    K = val(x["half_sat"], f"{n}.half_sat")
+                    h = val(x["hill"], f"{n}.hill")
+                    if not (K > 0 and h > 0):
+                        raise ValueError(f"Term {n!r}: half_sat and hill must be > 0")
+                    # integral Hill coefficients become ints, so ipow multiplies instead of calling pow
+                    inputs.append((x["species"], K, int(h) if h == int(h) else h))
+                terms[n][role] = inputs
+        return species, terms
+
+    # ---------- Code generation ----------
+    def source(self, p, dt, dx, homogeneous=False):
+        """
+        Python source of the fused step kernel for parameters `p`, time step dt and
+        spacing dx; every coefficient is inlined as a literal. The kernel is
+        step(<species...>) -> tuple of new fields. With `homogeneous`, it is instead
+        rates(<species...>) -> the well-mixed reaction rates dx/dt (no transport).
+        """
+        species, terms = self._resolve(p)
+        if homogeneous:
+            dt = 1.0
+        names = list(species)
+        lines = [f"def {'rates' if homogeneous else 'step'}({', '.join(names)}):"]
+        signal = {}
+        for n, s in species.items():
+            if s["transport"] == "juxtacrine" and not homogeneous:
+                signal[n] = f"_s_{n}"
+                lines.append(f"    _s_{n} = _avg({n})")
+            else:
+                signal[n] = n
+        used = {t for s in species.values() for t in s["production"]}
+        for tn, t in terms.items():
+            if tn not in used:
+                continue
+            powers = {}
+            for role in ("activators", "repressors"):
+                powers[role] = []
+                for sp, K, h in t[role]:
+                    v = f"_p{len(lines)}"
+                    lines.append(f"    {v} = _ipow(_np.maximum({signal[sp]}, 0.0) * {1.0 / K!r}, {h!r})")
+                    powers[role].append(v)
+            num = " + ".join(powers["activators"] + [repr(t["basal"])])
+            den = " + ".join(powers["activators"] + powers["repressors"] + ["1.0", repr(t["basal"])])
+            lines.append(f"    {tn} = ({num}) / ({den})")
+        out = []
+        for n, s in species.items():
+            reaction = [f"{r * dt!r} * {tn}" for tn, r in s["production"].items()]
+            expr = " + ".join(reaction) or "0.0"
+            if s["decay"]:
+                expr += f" - {s['decay'] * dt!r} * {n}"
+            if homogeneous:
+                lines.append(f"    _{n}_new = {expr}")
+            else:
+                lines.append(f"    _{n}_new = {n} + ({expr})")
+                if s["transport"] == "diffusible":
+                    lines.append(f"    _{n}_new += {s['diffusion'] * dt / dx**2!r} * _lap({n})")
+            out.append(f"_{n}_new")
+        lines.append(f"    return {', '.join(out)},")
+        return "\n".join(lines) + "\n"
+
+    def compile(self, p, dt, dx, geometry="neumann_1d"):
+        """
+        Compile the step kernel for parameters `p` (dict or ModelParams), dt and dx.
+
+        geometry: "neumann_1d" (fields of shape (N,) or stacked (K, N), zero-flux ends,
+        as simulation.step_neumann_batch), "periodic_2d" (as simulation_2d.step_2d) or
+        a simulation_graph.CellGraph.
+        """
+        lap, avg = _geometry(geometry)
+        return CompiledNetwork(self, self.source(p, dt, dx), {"_lap": lap, "_avg": avg}, "step")
+
+    def rates(self, p):
+        """Compiled well-mixed reaction rates: rates(*levels) -> tuple of dx/dt per species."""
+        return CompiledNetwork(self, self.source(p, 1.0, 1.0, homogeneous=True), {}, "rates")
+
+    # ---------- Homogeneous steady states ----------
+    def homogeneous_steady_states(self, p, tol=1e-12, max_newton=60):
+        """
+        All well-mixed steady states found by Newton's method from a ladder of starting
+        points between 0 and each species' production ceiling (sum of rates / decay,
+        since every term is < 1). Returns a list of (levels, stable) with levels an
+        array in species order and stable = every Jacobian eigenvalue < 0.
+        """
+        species, _ = self._resolve(p)
+        f = self.rates(p)
+        ceiling = np.array([sum(s["production"].values()) / s["decay"] if s["decay"] > 0 else 1.0
+                            for s in species.values()])
+
+        def F(x):
+            return np.array(f(*x), dtype=float)
+
+        found = []
+        for frac in (0.9, 0.5, 0.2, 0.05, 0.01, 0.0):
+            x = frac * ceiling
+            for _ in range(max_newton):
+                fx = F(x)
+                if np.max(np.abs(fx)) < tol:
+                    break
+                J = _jacobian(F, x, fx)
+                try:
+                    dx = np.linalg.solve(J, -fx)
+                except np.linalg.LinAlgError:
+                    break
+                x = np.maximum(x + dx, 0.0)
+            else:
+                continue
+            if np.max(np.abs(F(x))) < tol and not any(np.allclose(x, y, rtol=1e-8, atol=1e-12) for y, _ in found):
+                ev = np.linalg.eigvals(_jacobian(F, x, F(x)))
+                found.append((x, bool(np.all(ev.real < 0))))
+        return found
+
+    def steady_state(self, p, tol=1e-12):
+        """
+        The non-null, reaction-stable well-mixed steady state with the highest total
+        level (the upper branch, as finding_steady_states.fast_stable_steady_state),
+        as {species: level}; None when there is none.
+        """
+        cands = [x for x, stable in self.homogeneous_steady_states(p, tol) if stable and np.any(x > 1e-9)]
+        if not cands:
+            return None
+        best = max(cands, key=lambda x: float(np.sum(x)))
+        return dict(zip(self.species, (float(v) for v in best)))
+
+
+class CompiledNetwork:
+    """
+    A kernel generated by ReactionNetwork (see ReactionNetwork.source): call it with
+    one array per species, in spec order. `source` keeps the generated code.
+    """
+
+    def __init__(self, network, source, namespace, name):
+        self.network = network
+        self.species = list(network.species)
+        self.source = source
+        ns = {"_np": np, "_ipow": ipow, **namespace}
+        exec(compile(source, f"<reaction_network {name}>", "exec"), ns)
+        self._fn = ns[name]
+
+    def __call__(self, *fields):
+        return self._fn(*fields)
+
+
+def _geometry(geometry):
+    """(laplacian, neighbour average) stencils, in cell units, of a geometry name or CellGraph."""
+    if geometry == "neumann_1d":
+        from simulation import neumann_stencil, neighbour_average
+        return neumann_stencil, neighbour_average
+    if geometry == "periodic_2d":
+        from simulation_2d import laplacian, neighbor_sum
+        return (lambda Z: laplacian(Z, 1.0)), (lambda Z: 0.25 * neighbor_sum(Z))
+    if hasattr(geometry, "laplacian") and hasattr(geometry, "neighbour_average"):
+        return geometry.laplacian, geometry.neighbour_average
+    raise ValueError(f"geometry must be one of {GEOMETRIES} or a CellGraph, got {geometry!r}")
+
+
+def _jacobian(F, x, fx):
+    """Forward-difference Jacobian of F at x (fx = F(x)); networks are small."""
+    J = np.empty((len(fx), len(x)))
+    for j in range(len(x)):
+        h = 1e-7 * max(1.0, abs(x[j]))
+        xh = x.copy()
+        xh[j] += h
+        J[:, j] = (F(xh) - fx) / h
+    return J
+
+
+def activator_inhibitor(activator_type="juxtacrine"):
+    """
+    The two-species model of simulation.py as a ReactionNetwork, with the parameter
+    names of parameters.params. A "paracrine" activator diffuses; any other
+    activator_type is juxtacrine (senses its neighbours, does not diffuse).
+    """
+    return ReactionNetwork(
+        species={
+            "A": {"transport": "diffusible" if activator_type == "paracrine" else "juxtacrine",
+                  "diffusion": "act_diffusion" if activator_type == "paracrine" else 0.0,
+                  "decay": "act_decay_rate", "production": {"H": "act_prod_rate"}},
+            "I": {"transport": "diffusible", "diffusion": "inh_diffusion",
+                  "decay": "inh_decay_rate", "production": {"H": "inh_prod_rate"}},
+        },
+        terms={
+            "H": {"activators": [{"species": "A", "half_sat": "act_half_sat", "hill": "act_hill_coeff"}],
+                  "repressors": [{"species": "I", "half_sat": "inh_half_sat", "hill": "inh_hill_coeff"}],
+                  "basal": "basal_prod"},
+        },
+    )
+
+
+# ---------- Runs ----------
+NETWORK_INIT_MODES = ("random_tight", "steady_state", "spike", "all_off")
+
+
+def initial_fields_network(network, shape, p, init_mode="random_tight", spike_value=5.0, seed=None):
+    """
+    Initial fields (one array per species, spec order) of the given shape:
+      random_tight -> uniform within 5% of the well-mixed steady state (spike_value where
+                      there is none), drawn species by species as simulation.initialize_fields
+      steady_state -> the well-mixed steady state everywhere
+      spike        -> spike_value in the centre cell of the first species, 0 elsewhere
+      all_off      -> zeros
+    """
+    shape = (shape,) if np.isscalar(shape) else tuple(shape)
+    if init_mode not in NETWORK_INIT_MODES:
+        raise ValueError(f"Unknown init_mode {init_mode!r} (expected one of {NETWORK_INIT_MODES})")
+    if init_mode == "spike":
+        fields = [np.zeros(shape) for _ in network.species]
+        fields[0][tuple(s // 2 for s in shape)] = spike_value
+        return fields
+    if init_mode == "all_off":
+        return [np.zeros(shape) for _ in network.species]
+    ss = network.steady_state(p) or dict.fromkeys(network.species, float(spike_value))
+    if init_mode == "steady_state":
+        return [np.full(shape, ss[n]) for n in network.species]
+    rng = np.random.default_rng(seed)
+    return [rng.uniform(0.95 * ss[n], 1.05 * ss[n], shape) for n in network.species]
+
+
+def run_network(network, fields, steps, dt, dx, p, stopping_threshold, min_steps,
+                geometry="neumann_1d", save_every=10):
+    """
+    Run a ReactionNetwork from initial `fields` (one array per species, spec order),
+    with the stopping rule of simulation.run_coupled_neumann averaged over all
+    species. Returns ({species: history list}, step). Deterministic runs only.
+    """
+    kernel = network.compile(p, dt, dx, geometry)
+    fields = tuple(np.array(f, dtype=float) for f in fields)
+    histories = [[f.copy()] for f in fields]
+    n_values = sum(f.size for f in fields)
+
+    step = -1
+    for step in range(steps):
+        fields = kernel(*fields)
+        if step % save_every == 0:
+            diff = sum(np.sum(np.abs(f - h[-1])) for f, h in zip(fields, histories))
+            for f, h in zip(fields, histories):
+                h.append(f.copy())
+            if step > min_steps and diff / n_values < stopping_threshold:
+                break
+    return dict(zip(network.species, histories)), step
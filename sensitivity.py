@@ -0,0 +1,258 @@
+import numpy as np
+
+from model_params import ModelParams
+from simulation import neumann_stencil, neighbour_average, noise_settings
+
+# Parameters the model right-hand side can be differentiated by
+SENSITIVITY_PARAMS = tuple(ModelParams.__dataclass_fields__)
+HILL_PARAMS = ("act_half_sat", "inh_half_sat", "act_hill_coeff", "inh_hill_coeff", "basal_prod")
+
+
+# ---------- Hill partial derivatives ----------
+def hill_partials(act_signal, inh_signal, p):
+    """
+    simulation.hill_function over arrays and its partial derivatives:
+    returns (H, dH/d act_signal, dH/d inh_signal, {hill parameter: dH/dparam}).
+
+    With aa = (s/ka)^n, ii = (i/ki)^m and D = aa + ii + 1 + basal,
+    H = (aa + basal) / D. finding_steady_states.hill_with_grads uses
+    H = basal + aa/D instead, which agrees only for basal_prod = 0, so its
+    gradients are not reused here.
+    """
+    s = np.maximum(np.asarray(act_signal, dtype=float), 0.0)
+    i = np.maximum(np.asarray(inh_signal, dtype=float), 0.0)
+    ka, ki = p["act_half_sat"], p["inh_half_sat"]
+    n, m, b = p["act_hill_coeff"], p["inh_hill_coeff"], p["basal_prod"]
+    aa = (s / ka) ** n
+    ii = (i / ki) ** m
+    D = aa + ii + 1.0 + b
+    H = (aa + b) / D
+    dH_daa = (ii + 1.0) / D**2
+    dH_dii = -(aa + b) / D**2
+
+    pos_s, pos_i = s > 0, i > 0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        daa_ds = np.where(pos_s, n * aa / s, 0.0)
+        dii_di = np.where(pos_i, m * ii / i, 0.0)
+        log_s = np.where(pos_s, np.log(np.where(pos_s, s, 1.0) / ka), 0.0)
+        log_i = np.where(pos_i, np.log(np.where(pos_i, i, 1.0) / ki), 0.0)
+    dparams = {
+        "act_half_sat": dH_daa * (-n * aa / ka),
+        "inh_half_sat": dH_dii * (-m * ii / ki),
+        "act_hill_coeff": dH_daa * aa * log_s,
+        "inh_hill_coeff": dH_dii * ii * log_i,
+        "basal_prod": dH_daa,  # d/db (aa+b)/D = (D - aa - b)/D^2, the same as dH/daa
+    }
+    return H, dH_daa * daa_ds, dH_dii * dii_di, dparams
+
+
+# ---------- Linearization of the 1D Neumann model ----------
+def _stencil_matrix(N):
+    """Matrix of simulation.neumann_stencil (zero-flux ends)."""
+    L = np.diag(np.full(N, -2.0)) + np.diag(np.ones(N - 1), 1) + np.diag(np.ones(N - 1), -1)
+    L[0, 0] = L[-1, -1] = -1.0
+    return L
+
+
+def _average_matrix(N):
+    """Matrix of simulation.neighbour_average (the juxtacrine signal)."""
+    M = 0.5 * (np.diag(np.ones(N - 1), 1) + np.diag(np.ones(N - 1), -1))
+    M[0, 1] = M[-1, -2] = 1.0
+    return M
+
+
+def linearize(A, I, dx, p, activator_type="juxtacrine", params=SENSITIVITY_PARAMS):
+    """
+    Jacobian of the 1D model's right-hand side F(A, I) (the per-unit-time rate of
+    simulation.step_neumann_batch) at the fields A, I, and its partial derivatives by
+    the given parameters. Returns (J, dF) with J of shape (2N, 2N) on the stacked
+    state [A, I] and dF a dict {param: (2N,) array}.
+    """
+    p = p if isinstance(p, ModelParams) else ModelParams.from_dict(p, strict=False)
+    A = np.asarray(A, dtype=float)
+    I = np.asarray(I, dtype=float)
+    N = A.size
+    paracrine = activator_type == "paracrine"
+    L = _stencil_matrix(N) / dx**2
+    act_signal = A if paracrine else neighbour_average(A)
+    H, H_s, H_i, H_theta = hill_partials(act_signal, I, p)
+
+    dH_dA = np.diag(H_s) if paracrine else H_s[:, None] * _average_matrix(N)
+    dH_dI = np.diag(H_i)
+    eye = np.eye(N)
+    J_AA = p.act_prod_rate * dH_dA - p.act_decay_rate * eye
+    if paracrine:
+        J_AA += p.act_diffusion * L
+    J = np.block([
+        [J_AA, p.act_prod_rate * dH_dI],
+        [p.inh_prod_rate * dH_dA, p.inh_prod_rate * dH_dI - p.inh_decay_rate * eye + p.inh_diffusion * L],
+    ])
+
+    zero = np.zeros(N)
+    direct = {
+        "act_prod_rate": (H, zero),
+        "act_decay_rate": (-A, zero),
+        "inh_prod_rate": (zero, H),
+        "inh_decay_rate": (zero, -I),
+        "inh_diffusion": (zero, neumann_stencil(I) / dx**2),
+        "act_diffusion": (neumann_stencil(A) / dx**2 if paracrine else zero, zero),
+    }
+    dF = {}
+    for k in params:
+        if k in HILL_PARAMS:
+            dF[k] = np.concatenate([p.act_prod_rate * H_theta[k], p.inh_prod_rate * H_theta[k]])
+        elif k in direct:
+            dF[k] = np.concatenate(direct[k])
+        else:
+            raise ValueError(f"Unknown sensitivity parameter {k!r}; choose from {SENSITIVITY_PARAMS}")
+    return J, dF
+
+
+# ---------- Differentiable pattern metrics of the activator profile ----------
+def _one_hot(N, j):
+    e = np.zeros(N)
+    e[j] = 1.0
+    return e
+
+
+# name -> (value(A), d value / dA); max/min/diff are differentiable where the extremum is unique
+METRICS = {
+    "mean_a": lambda A: (A.mean(), np.full(A.size, 1.0 / A.size)),
+    "var_a": lambda A: (A.var(), 2.0 * (A - A.mean()) / A.size),
+    "max_a": lambda A: (A.max(), _one_hot(A.size, np.argmax(A))),
+    "min_a": lambda A: (A.min(), _one_hot(A.size, np.argmin(A))),
+    "diff_a": lambda A: (A.max() - A.min(), _one_hot(A.size, np.argmax(A)) - _one_hot(A.size, np.argmin(A))),
+}
+
+
+def steady_state_sensitivity(A, I, dx, p, activator_type="juxtacrine", params=SENSITIVITY_PARAMS,
+                             metrics=(), fields=True):
+    """
+    Sensitivities of a converged 1D steady state (A, I) by implicit differentiation:
+    F(u*, theta) = 0 gives du*/dtheta = -J^-1 dF/dtheta.
+
+    With `fields`, all field derivatives come from one multi-right-hand-side solve,
+    returned as {"fields": {param: (dA, dI)}}. Metric gradients use the adjoint:
+    one solve J^T lambda = dg/du per metric, then dg/dtheta = -lambda . dF/dtheta for
+    every parameter at once. These are returned as {"metrics": {metric: {"value": g,
+    param: dg/dparam}}}.
+
+    "stability" is the largest real part of the Jacobian's eigenvalues. Near zero the
+    state is close to a bifurcation (patterning switching on or off) and the
+    sensitivities grow without bound. Positive values mean the fields are not a
+    stable steady state, so the result does not apply.
+    """
+    J, dF = linearize(A, I, dx, p, activator_type, params)
+    A = np.asarray(A, dtype=float)
+    N = A.size
+    out = {"stability": float(np.max(np.linalg.eigvals(J).real))}
+    if fields and params:
+        X = np.linalg.solve(J, -np.column_stack([dF[k] for k in params]))
+        out["fields"] = {k: (X[:N, j], X[N:, j]) for j, k in enumerate(params)}
+    if metrics:
+        values, grads = zip(*(METRICS[name](A) for name in metrics))
+        G = np.zeros((2 * N, len(metrics)))
+        G[:N] = np.column_stack(grads)
+        lam = np.linalg.solve(J.T, G)
+        out["metrics"] = {
+            name: {"value": float(values[j]), **{k: float(-lam[:, j] @ dF[k]) for k in params}}
+            for j, name in enumerate(metrics)
+        }
+    return out
+
+
+def forward_sensitivity(A0, I0, steps, dt, dx, p, activator_type="juxtacrine", params=SENSITIVITY_PARAMS,
+                        metrics=()):
+    """
+    Forward (tangent) sensitivities of the explicit Euler trajectory from fixed initial
+    fields A0, I0 over `steps` steps. The tangents S = du/dtheta of all parameters are
+    advanced with the same discrete map, S <- S + dt (J S + dF/dtheta). So the result
+    is the exact derivative of the simulated final state, also for runs that have not
+    converged (transients, oscillations). Initial fields count as fixed, even when an
+    init mode derives them from the parameters. Costs about (1 + len(params)) runs.
+
+    Returns {"A", "I", "fields": {param: (dA, dI)}, "metrics": {...}} as in
+    steady_state_sensitivity.
+    """
+    mp = p if isinstance(p, ModelParams) else ModelParams.from_dict(p, strict=False)
+    if not isinstance(p, ModelParams) and noise_settings(p) is not None:
+        raise ValueError("forward sensitivities need a deterministic run (no noise)")
+    paracrine = activator_type == "paracrine"
+    A = np.array(A0, dtype=float)
+    I = np.array(I0, dtype=float)
+    P = len(params)
+    SA = np.zeros((P, A.size))
+    SI = np.zeros((P, A.size))
+    hill_keys = [j for j, k in enumerate(params) if k in HILL_PARAMS]
+    for _ in range(steps):
+        act_signal = A if paracrine else neighbour_average(A)
+        H, H_s, H_i, H_theta = hill_partials(act_signal, I, mp)
+        # tangent of H: chain rule through the signals, plus explicit Hill-parameter terms
+        dH = H_s * (SA if paracrine else neighbour_average(SA)) + H_i * SI
+        for j in hill_keys:
+            dH[j] += H_theta[params[j]]
+        dSA = mp.act_prod_rate * dH - mp.act_decay_rate * SA
+        dSI = mp.inh_prod_rate * dH - mp.inh_decay_rate * SI + mp.inh_diffusion / dx**2 * neumann_stencil(SI)
+        if paracrine:
+            dSA += mp.act_diffusion / dx**2 * neumann_stencil(SA)
+        for j, k in enumerate(params):
+            if k == "act_prod_rate":
+                dSA[j] += H
+            elif k == "act_decay_rate":
+                dSA[j] -= A
+            elif k == "inh_prod_rate":
+                dSI[j] += H
+            elif k == "inh_decay_rate":
+                dSI[j] -= I
+            elif k == "inh_diffusion":
+                dSI[j] += neumann_stencil(I) / dx**2
+            elif k == "act_diffusion" and paracrine:
+                dSA[j] += neumann_stencil(A) / dx**2
+            elif k not in SENSITIVITY_PARAMS:
+                raise ValueError(f"Unknown sensitivity parameter {k!r}; choose from {SENSITIVITY_PARAMS}")
+
+        dA = mp.act_prod_rate * H - mp.act_decay_rate * A
+        dI = mp.inh_prod_rate * H - mp.inh_decay_rate * I + mp.inh_diffusion / dx**2 * neumann_stencil(I)
+        if paracrine:
+            dA += mp.act_diffusion / dx**2 * neumann_stencil(A)
+        A, I = A + dt * dA, I + dt * dI
+        SA += dt * dSA
+        SI += dt * dSI
+
+    out = {"A": A, "I": I, "fields": {k: (SA[j], SI[j]) for j, k in enumerate(params)}}
+    if metrics:
+        out["metrics"] = {}
+        for name in metrics:
+            value, grad = METRICS[name](A)
+            out["metrics"][name] = {"value": float(value), **{k: float(grad @ SA[j]) for j, k in enumerate(params)}}
+    return out
+
+
+def run_sensitivity(result, params=SENSITIVITY_PARAMS, metrics=("mean_a", "var_a"), method="steady", fields=False):
+    """
+    Sensitivities of a single run_simulation result. method="steady" linearizes
+    around the final fields (valid when the run converged, see result["converged"]).
+    method="forward" re-integrates the run from its initial fields with tangents.
+    Without `fields`, field derivatives are dropped to keep results small.
+    """
+    p = result["parameters"]
+    if np.ndim(result["activator_final"]) != 1:
+        raise ValueError("sensitivities are computed for single runs, not ensembles")
+    activator_type = p.get("activator_type", "juxtacrine")
+    if method == "steady":
+        out = steady_state_sensitivity(result["activator_final"], result["inhibitor_final"], p["dx"], p,
+                                       activator_type, params, metrics, fields)
+    elif method == "forward":
+        # activator_final is the last saved frame: the state after loop index
+        # (steps_used // save_every) * save_every, not after steps_used
+        save_every = p.get("save_every", 100)
+        steps = int(result["steps_used"]) // save_every * save_every + 1
+        out = forward_sensitivity(result["activator_initial"], result["inhibitor_initial"],
+                                  steps, p["dt"], p["dx"], p, activator_type, params, metrics)
+        del out["A"], out["I"]
+        if not fields:
+            del out["fields"]
+    else:
+        raise ValueError(f"method must be 'steady' or 'forward', got {method!r}")
+    out["method"] = method
+    return out
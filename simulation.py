@@ -1,6 +1,18 @@
+import hashlib
+import logging
+import sys
+import time
 import numpy as np
-import random
 from finding_steady_states import fast_stable_steady_state
+from history_io import HistoryWriter
+from model_params import ModelParams, step_constants, ipow
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
 
 
 def hill_function(act_signal, inh_signal,
@@ -11,147 +23,215 @@ def hill_function(act_signal, inh_signal,
     inh_term = (inh_signal / inh_half_sat) ** inh_hill_coeff if inh_signal > 0 else 0.0
     return (act_term + basal_prod) / (act_term + inh_term + 1.0 + basal_prod)
 
-def initialize_fields(N, init_mode, spike_value, spike_value_a = 0, spike_value_i = 0):
-    """Initialize activator/inhibitor concentrations depending on mode."""
-    activator = np.zeros(N)
-    inhibitor = np.zeros(N)
+RANDOM_INIT_MODES = ("random", "random_tight")
+
+
+def initialize_fields(N, init_mode, spike_value, spike_value_a = 0, spike_value_i = 0, rng=None):
+    """
+    Initialize activator/inhibitor concentrations depending on mode.
+
+    N is the number of cells or, for 2D and higher, the field shape; spikes are
+    placed at the centre (or the first cell). The random modes draw from `rng`,
+    which may be a numpy Generator, a seed or a SeedSequence (None = fresh entropy).
+    """
+    shape = (N,) if np.isscalar(N) else tuple(N)
+    centre = tuple(s // 2 for s in shape)
+    first = (0,) * len(shape)
+    activator = np.zeros(shape)
+    inhibitor = np.zeros(shape)
+
+    if init_mode in RANDOM_INIT_MODES:
+        rng = np.random.default_rng(rng)
 
     if init_mode == "random_tight": #5% random noise around steady state value of a and i
-        activator = [random.uniform(spike_value_a - 0.05 * spike_value_a, spike_value_a + 0.05 * spike_value_a) for _ in range(N)]
-        inhibitor = [random.uniform(spike_value_i - 0.05 * spike_value_i, spike_value_i + 0.05 * spike_value_i) for _ in range(N)]
+        activator = rng.uniform(0.95 * spike_value_a, 1.05 * spike_value_a, shape)
+        inhibitor = rng.uniform(0.95 * spike_value_i, 1.05 * spike_value_i, shape)
     elif init_mode == "spike_steady_state": #Starts with calculated steady state value (no diffusion) at one point in space
-        activator[N // 2] = spike_value_a
-        inhibitor[N // 2] = spike_value_i
+        activator[centre] = spike_value_a
+        inhibitor[centre] = spike_value_i
     elif init_mode == "activator_spike_steady_state":   # single activator spike
-        activator[N // 2] = spike_value_a
+        activator[centre] = spike_value_a
     elif init_mode == "two_activator_spikes":          # two activator spikes
-        activator[0] = spike_value
-        activator[100] = spike_value
+        activator[first] = spike_value
+        activator[(100,) + first[1:]] = spike_value
     elif init_mode == "activator_spike":   # single activator spike
-        activator[N // 2] = spike_value
+        activator[centre] = spike_value
     elif init_mode == "side_activator_spike":   # single activator spike
-        activator[0] = spike_value
+        activator[first] = spike_value
     elif init_mode == "activator_spike_with_background":   # single activator spike
-        activator = [0.2] * N
-        activator[N // 2] = spike_value
+        activator[:] = 0.2
+        activator[centre] = spike_value
     elif init_mode == "both_spike":
-        activator[N // 2] = spike_value
-        inhibitor[N // 2] = spike_value
+        activator[centre] = spike_value
+        inhibitor[centre] = spike_value
     elif init_mode == "inhibitor_spike":   # single inhibitor spike
-        inhibitor[N // 2] = spike_value
+        inhibitor[centre] = spike_value
     elif init_mode == "random":
-        activator = [random.uniform(0, spike_value) for _ in range(N)]
-        inhibitor = [random.uniform(0, spike_value) for _ in range(N)]
+        activator = rng.uniform(0, spike_value, shape)
+        inhibitor = rng.uniform(0, spike_value, shape)
     elif init_mode == "activator_on":
-        activator = [spike_value] * N
+        activator[:] = spike_value
     elif init_mode == "inhibitor_on":
-        inhibitor = [spike_value] * N
+        inhibitor[:] = spike_value
     elif init_mode == "both_on":
-        activator = [spike_value] * N
-        inhibitor = [spike_value] * N
+        activator[:] = spike_value
+        inhibitor[:] = spike_value
     elif init_mode == "all_off":
         pass
     else:
         raise ValueError(f"Unknown init_mode: {init_mode}")
 
-    # Ensure float arrays in all cases
-    activator = np.array(activator, dtype=float)
-    inhibitor = np.array(inhibitor, dtype=float)
-
     return activator, inhibitor
 
 
+def initial_levels(p, activator_type, spike_value):
+    """
+    Non-null, reaction-stable homogeneous steady state (a_ss, i_ss) used to seed the
+    *_steady_state and random_tight init modes; falls back to spike_value for both
+    when the solver finds no positive state.
+    """
+    try:
+        a_ss, i_ss, H_ss = fast_stable_steady_state(p, activator_type, tol=5e-4, max_newton=12)
+    except Exception:
+        a_ss = i_ss = 0.0
+    if not (a_ss > 0.0 and i_ss > 0.0 and np.isfinite(a_ss) and np.isfinite(i_ss)):
+        a_ss = float(spike_value)
+        i_ss = float(spike_value)
+    return a_ss, i_ss
+
+
+# ---------- Stochastic (Euler–Maruyama) noise ----------
+NOISE_TYPES = ("none", "additive", "multiplicative")
+NOISE_STREAM = 0x6E6F6973  # spawn key of the noise sub-stream of a run's seed
+
+
+def noise_settings(p):
+    """
+    (kind, sigma_a, sigma_i) from p["noise"] ("none" | "additive" | "multiplicative"),
+    p["noise_a"] and p["noise_i"], or None for a deterministic run.
+    """
+    kind = p.get("noise", "none") or "none"
+    if kind not in NOISE_TYPES:
+        raise ValueError(f"Unknown noise type: {kind!r} (expected one of {NOISE_TYPES})")
+    if kind == "none":
+        return None
+    return kind, float(p.get("noise_a", 0.0)), float(p.get("noise_i", 0.0))
+
+
+def is_stochastic(p):
+    """True when the result of a run depends on its seed (random init or noise)."""
+    return p.get("init_mode", "activator_spike") in RANDOM_INIT_MODES or noise_settings(p) is not None
+
+
+class NoiseSource:
+    """
+    Euler–Maruyama noise for fields of a given shape:
+        A += sigma_a * g(A) * sqrt(dt) * xi_a,   I += sigma_i * g(I) * sqrt(dt) * xi_i
+    with g = 1 (additive) or g = the pre-step value (multiplicative). Normals are
+    drawn in blocks of many steps at once from a Generator on the noise sub-stream
+    of `seed` (int, SeedSequence, or a Generator used as is); the block size does not
+    change the draws. Concentrations are clamped at 0 after each increment.
+    """
+
+    def __init__(self, kind, sigma_a, sigma_i, shape, dt, seed=None, block=None):
+        if isinstance(seed, np.random.Generator):
+            self.rng = seed
+        else:
+            ss = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+            self.rng = np.random.default_rng(
+                np.random.SeedSequence(ss.entropy, spawn_key=tuple(ss.spawn_key) + (NOISE_STREAM,)))
+        self.multiplicative = kind == "multiplicative"
+        self.scale_a = sigma_a * np.sqrt(dt)
+        self.scale_i = sigma_i * np.sqrt(dt)
+        self.shape = (2,) + tuple(shape)
+        size = int(np.prod(self.shape))
+        self.block = block or max(1, min(256, (1 << 22) // size))  # <= ~32 MB of normals
+        self._buf = None
+        self._pos = self.block
+
+    def normals(self):
+        if self._pos == self.block:
+            self._buf = self.rng.standard_normal((self.block,) + self.shape)
+            self._pos = 0
+        xi = self._buf[self._pos]
+        self._pos += 1
+        return xi
+
+    def apply(self, A_old, I_old, A_new, I_new):
+        """Add one step's noise increment to A_new, I_new in place."""
+        xi = self.normals()
+        if self.multiplicative:
+            A_new += self.scale_a * A_old * xi[0]
+            I_new += self.scale_i * I_old * xi[1]
+        else:
+            A_new += self.scale_a * xi[0]
+            I_new += self.scale_i * xi[1]
+        np.maximum(A_new, 0.0, out=A_new)
+        np.maximum(I_new, 0.0, out=I_new)
+
+
+def hill_step(act_signal, inh_signal, c):
+    """hill_function for one cell using precomputed StepConstants `c`."""
+    act_term = (act_signal * c.inv_act_half_sat) ** c.act_hill_coeff if act_signal > 0 else 0.0
+    inh_term = (inh_signal * c.inv_inh_half_sat) ** c.inh_hill_coeff if inh_signal > 0 else 0.0
+    return (act_term + c.basal_prod) / (act_term + inh_term + 1.0 + c.basal_prod)
+
+
 def update_interior(activator, inhibitor, activator_new, inhibitor_new, N, dt, dx, p, activator_type):
-    """Update interior grid points (1 .. N-2)."""
+    """Update interior grid points (1 .. N-2). `p` may be a dict, ModelParams or StepConstants."""
+    c = step_constants(p, dt, dx)
+    paracrine = activator_type == "paracrine"
     for i in range(1, N - 1):
         #Set input activator value as self or as neighbours
-        if activator_type == "paracrine":
+        if paracrine:
             act_signal = activator[i]
         else:
             act_signal = (activator[i - 1] + activator[i + 1])/2
         #set inhibitor value as self
         inh_signal = inhibitor[i]
         #calculate transcriptional reaction (Hill function)
-        hill_value = hill_function(
-            act_signal, inh_signal,
-            p["act_half_sat"], p["inh_half_sat"],
-            p["act_hill_coeff"], p["inh_hill_coeff"],
-            p["basal_prod"]
-        )
+        hill_value = hill_step(act_signal, inh_signal, c)
         #How much are we updating the activation concentration? Computing reaction and diffusion separately
-        reaction = dt * (p["act_prod_rate"] * hill_value - p["act_decay_rate"] * activator[i])
-        diffusion = (p["act_diffusion"] * dt / dx**2 * (activator[i + 1] - 2.0 * activator[i] + activator[i - 1])
-             if activator_type == "paracrine" else 0.0) #NO diffusion if activator is membrane-tethered
+        reaction = c.act_prod_dt * hill_value - c.act_decay_dt * activator[i]
+        diffusion = (c.act_diff_num * (activator[i + 1] - 2.0 * activator[i] + activator[i - 1])
+             if paracrine else 0.0) #NO diffusion if activator is membrane-tethered
         #Actual update
         activator_new[i] = activator[i] + reaction + diffusion
 
         #inhibitor is always paracrine, so we can compute all at once
         inhibitor_new[i] = (
             inhibitor[i]
-            + dt * (p["inh_prod_rate"] * hill_value - p["inh_decay_rate"] * inhibitor[i]) #reaction
-            + p["inh_diffusion"] * dt / dx**2 * (inhibitor[i + 1] - 2.0 * inhibitor[i] + inhibitor[i - 1]) #diffusion
+            + c.inh_prod_dt * hill_value - c.inh_decay_dt * inhibitor[i] #reaction
+            + c.inh_diff_num * (inhibitor[i + 1] - 2.0 * inhibitor[i] + inhibitor[i - 1]) #diffusion
         )
 
 
 def update_boundaries(activator, inhibitor, activator_new, inhibitor_new, N, dt, dx, p, activator_type):
-    """Update Neumann boundary conditions (zero-flux)."""
-    # Left boundary
-    idx, left = 0, 1
-    if activator_type == "paracrine":
-        act_signal = activator[idx]
-    else:
-        act_signal = activator[left]
-    inh_signal = inhibitor[idx]
-
-    #Calculate transcriptional reaction (Hill function)
-    hill_value = hill_function(
-        act_signal, inh_signal,
-        p["act_half_sat"], p["inh_half_sat"],
-        p["act_hill_coeff"], p["inh_hill_coeff"],
-        p["basal_prod"]
-    )
+    """Update Neumann boundary conditions (zero-flux). `p` may be a dict, ModelParams or StepConstants."""
+    c = step_constants(p, dt, dx)
+    # Left boundary (idx, its only neighbour), then right boundary
+    for idx, nb in ((0, 1), (N - 1, N - 2)):
+        if activator_type == "paracrine":
+            act_signal = activator[idx]
+        else:
+            act_signal = activator[nb]
+        inh_signal = inhibitor[idx]
 
-    #How much are we updating the activation concentration? Computing reaction and diffusion separately
-    reaction = dt * (p["act_prod_rate"] * hill_value - p["act_decay_rate"] * activator[idx])
-    diffusion = (p["act_diffusion"] * dt / dx**2 * (activator[left] - activator[idx])
-         if activator_type == "paracrine" else 0.0) #NO diffusion if activator is membrane-tethered
-    #Actual update
-    activator_new[idx] = activator[idx] + reaction + diffusion
-
-    inhibitor_new[idx] = (
-        inhibitor[idx] +
-        dt * (p["inh_prod_rate"] * hill_value - p["inh_decay_rate"] * inhibitor[idx]) #reaction
-        + p["inh_diffusion"] * dt / dx**2 * (inhibitor[left] - inhibitor[idx]) #diffusion
-    )
+        #Calculate transcriptional reaction (Hill function)
+        hill_value = hill_step(act_signal, inh_signal, c)
 
-    # Right boundary
-    idx, right = N - 1, N - 2
-    if activator_type == "paracrine":
-        act_signal = activator[idx]
-    else:
-        act_signal = activator[right]
-    inh_signal = inhibitor[idx]
-
-    #calculate transcriptional reaction (Hill function)
-    hill_value = hill_function(
-        act_signal, inh_signal,
-        p["act_half_sat"], p["inh_half_sat"],
-        p["act_hill_coeff"], p["inh_hill_coeff"],
-        p["basal_prod"]
-    )
+        #How much are we updating the activation concentration? Computing reaction and diffusion separately
+        reaction = c.act_prod_dt * hill_value - c.act_decay_dt * activator[idx]
+        diffusion = (c.act_diff_num * (activator[nb] - activator[idx])
+             if activator_type == "paracrine" else 0.0) #NO diffusion if activator is membrane-tethered
+        #Actual update
+        activator_new[idx] = activator[idx] + reaction + diffusion
 
-    #How much are we updating the activation concentration? Computing reaction and diffusion separately
-    reaction = dt * (p["act_prod_rate"] * hill_value - p["act_decay_rate"] * activator[idx])
-    diffusion = (p["act_diffusion"] * dt / dx**2 * (activator[right] - activator[idx])
-         if activator_type == "paracrine" else 0.0) #NO diffusion if activator is membrane-tethered
-    #Actual update
-    activator_new[idx] = activator[idx] + reaction + diffusion
-
-    inhibitor_new[idx] = (
-        inhibitor[idx] +
-        dt * (p["inh_prod_rate"] * hill_value - p["inh_decay_rate"] * inhibitor[idx]) #reaction
-        + p["inh_diffusion"] * dt / dx**2 * (inhibitor[right] - inhibitor[idx]) #diffusion
-    )
+        inhibitor_new[idx] = (
+            inhibitor[idx] +
+            c.inh_prod_dt * hill_value - c.inh_decay_dt * inhibitor[idx] #reaction
+            + c.inh_diff_num * (inhibitor[nb] - inhibitor[idx]) #diffusion
+        )
 
 
 def run_coupled_neumann(
@@ -159,95 +239,631 @@ def run_coupled_neumann(
     init_mode="spikes",
     activator_type="juxtacrine",
     spike_value=5.0,
-    save_every=10
+    save_every=10,
+    history_path=None,
+    timings=None,
+    seed=None,
+    initial=None
 ):
-    """Run activator–inhibitor simulation with Neumann boundary conditions."""
+    """
+    Run activator–inhibitor simulation with Neumann boundary conditions.
+
+    If `history_path` is given, every saved frame is streamed to a memory-mapped
+    .npy file (see history_io) and the returned histories only hold the first two
+    and the last two frames, keeping memory bounded for long runs.
+
+    If `timings` is a dict, wall-clock seconds per phase are accumulated into it
+    (steady_state, init, step, convergence, history).
+
+    `seed` (int, SeedSequence or Generator) makes the random init modes reproducible.
+    `initial` = (activator, inhibitor) starts from these fields instead of init_mode.
+
+    With p["noise"] set (see noise_settings), each step gets an Euler–Maruyama noise
+    increment and every saved frame after the first is the average of the fields over
+    the steps since the previous save. The stopping rule and the final profile then
+    use these time-averaged statistics instead of a single noisy snapshot.
+    """
+    clock = time.perf_counter
+    t = {"steady_state": 0.0, "init": 0.0, "step": 0.0, "convergence": 0.0, "history": 0.0}
 
     # --- Build initial fields ---
     # Try to get the non-null, reaction-stable steady state (fast)
-    try:
-        a_ss, i_ss, H_ss = fast_stable_steady_state(p, activator_type, tol=5e-4, max_newton=12)
-    except Exception:
-        a_ss = i_ss = 0.0
-
-    # Fallback to provided spike_value if solver didn't find a non-null state
-    if not (a_ss > 0.0 and i_ss > 0.0 and np.isfinite(a_ss) and np.isfinite(i_ss)):
-        a_ss = float(spike_value)
-        i_ss = float(spike_value)
+    # (falls back to spike_value if the solver didn't find a non-null state)
+    t0 = clock()
+    a_ss, i_ss = initial_levels(p, activator_type, spike_value)
+    t1 = clock()
+    t["steady_state"] += t1 - t0
 
     # Use the steady-state values as per-species spikes/levels
-    activator, inhibitor = initialize_fields(
-        N,
-        init_mode,
-        spike_value,               # keep generic spike_value if your initializer uses it
-        spike_value_a=float(a_ss),
-        spike_value_i=float(i_ss),
-    )
+    if initial is not None:
+        activator, inhibitor = (np.array(f, dtype=float) for f in initial)
+    else:
+        activator, inhibitor = initialize_fields(
+            N,
+            init_mode,
+            spike_value,               # keep generic spike_value if your initializer uses it
+            spike_value_a=float(a_ss),
+            spike_value_i=float(i_ss),
+            rng=seed,
+        )
 
     activator_history = [activator.copy()]
     inhibitor_history = [inhibitor.copy()]
 
-    for step in range(steps):
-        activator_previous = activator.copy()
-        inhibitor_previous = inhibitor.copy()
+    writer = None
+    if history_path is not None:
+        meta = {"params": dict(p), "N": N, "dt": dt, "dx": dx, "save_every": save_every,
+                "init_mode": init_mode, "activator_type": activator_type,
+                "activator_steady-state": a_ss, "inhibitor_steady-state": i_ss}
+        writer = HistoryWriter(history_path, N, steps // save_every + 2, meta=meta)
+        writer.append(activator, inhibitor)
+
+    c = step_constants(p, dt, dx)  # validated once; the loop never touches the dict
+    noise = noise_settings(p)
+    if noise is not None:
+        noise = NoiseSource(*noise, (N,), dt, seed=seed)
+        sum_a, sum_i, n_avg = np.zeros(N), np.zeros(N), 0
+    t0 = clock()
+    t["init"] += t0 - t1
 
+    for step in range(steps):
         activator_new = np.empty_like(activator)
         inhibitor_new = np.empty_like(inhibitor)
 
-        update_interior(activator, inhibitor, activator_new, inhibitor_new, N, dt, dx, p, activator_type)
-        update_boundaries(activator, inhibitor, activator_new, inhibitor_new, N, dt, dx, p, activator_type)
+        update_interior(activator, inhibitor, activator_new, inhibitor_new, N, dt, dx, c, activator_type)
+        update_boundaries(activator, inhibitor, activator_new, inhibitor_new, N, dt, dx, c, activator_type)
 
         # Enforce non-negativity
         #activator_new = np.maximum(activator_new, 0.0)
         #inhibitor_new = np.maximum(inhibitor_new, 0.0)
 
+        if noise is not None:
+            noise.apply(activator, inhibitor, activator_new, inhibitor_new)
+            sum_a += activator_new
+            sum_i += inhibitor_new
+            n_avg += 1
+
         activator, inhibitor = activator_new, inhibitor_new
 
         if step % save_every == 0:
+            t1 = clock()
+            t["step"] += t1 - t0
+            if noise is None:
+                frame_a, frame_i = activator.copy(), inhibitor.copy()
+            else:  # time average since the previous save
+                frame_a, frame_i = sum_a / n_avg, sum_i / n_avg
+                sum_a[:] = 0.0
+                sum_i[:] = 0.0
+                n_avg = 0
             #Compare the two steps to decide when to stop simulation
-            diff = np.sum(np.abs(activator_new - activator_history[-1])) + np.sum(np.abs(inhibitor_new - inhibitor_history[-1]))
+            diff = np.sum(np.abs(frame_a - activator_history[-1])) + np.sum(np.abs(frame_i - inhibitor_history[-1]))
+            t2 = clock()
+            t["convergence"] += t2 - t1
 
             #Add new values to history
-            activator_history.append(activator.copy())
-            inhibitor_history.append(inhibitor.copy())
+            activator_history.append(frame_a)
+            inhibitor_history.append(frame_i)
+            if writer is not None:
+                writer.append(frame_a, frame_i)
+                if len(activator_history) > 4:  # on-disk history: keep first two + last two frames only
+                    del activator_history[2], inhibitor_history[2]
+            t0 = clock()
+            t["history"] += t0 - t2
 
             #Sum of differences for each point for activator + inhibitor between new and previous steps
             if step > min_steps and diff/(2*N) < stopping_threshold: #average change per step per tile of less than 0.000001
                 break
-    print(f"Stopped at step {step}, total average difference per tile over {save_every} steps = {diff/(2*N)}")
+    else:
+        t["step"] += clock() - t0
+    logger.info("Stopped at step %d, total average difference per tile over %d steps = %g",
+                step, save_every, diff / (2 * N))
+    if writer is not None:
+        t0 = clock()
+        writer.close(stop_step=step)
+        t["history"] += clock() - t0
+
+    if timings is not None:
+        for k, v in t.items():
+            timings[k] = timings.get(k, 0.0) + v
 
     return activator_history, inhibitor_history, step, a_ss, i_ss
 
 
-def run_simulation(params):
+# ---------- Batched ensemble engine ----------
+def hill_batch(act_signal, inh_signal, c):
+    """Vectorized hill_step over arrays (non-positive signals contribute 0); `c` is a StepConstants."""
+    act_term = ipow(np.maximum(act_signal, 0.0) * c.inv_act_half_sat, c.act_hill_coeff)
+    inh_term = ipow(np.maximum(inh_signal, 0.0) * c.inv_inh_half_sat, c.inh_hill_coeff)
+    return (act_term + c.basal_prod) / (act_term + inh_term + 1.0 + c.basal_prod)
+
+
+def neumann_stencil(Z):
+    """Z[i+1] - 2 Z[i] + Z[i-1] along the last axis with zero-flux ends (edge padding)."""
+    L = np.empty_like(Z)
+    L[..., 1:-1] = Z[..., 2:] - 2.0 * Z[..., 1:-1] + Z[..., :-2]
+    L[..., 0] = Z[..., 1] - Z[..., 0]
+    L[..., -1] = Z[..., -2] - Z[..., -1]
+    return L
+
+
+def neighbour_average(Z):
+    """Mean of the two neighbours along the last axis; the end cells see their single neighbour."""
+    S = np.empty_like(Z)
+    S[..., 1:-1] = (Z[..., :-2] + Z[..., 2:]) / 2
+    S[..., 0] = Z[..., 1]
+    S[..., -1] = Z[..., -2]
+    return S
+
+
+def step_neumann_batch(A, I, dt, dx, p, activator_type):
     """
-    Thin wrapper to call run_coupled_neumann with a parameter dict.
+    One Euler step for any number of independent 1D fields stacked along the leading
+    axes, e.g. (K, N). Same discretization as update_interior/update_boundaries.
+    `p` may be a dict, a ModelParams (also a stacked one, one row per replicate) or
+    precomputed StepConstants.
     """
-    result = run_coupled_neumann(
-        params["N"],
-        params["steps"],
-        params["dt"],
-        params["dx"],
-        params,
-        params.get("stopping_threshold", 1e-4),
-        params.get("min_steps", 10000),
-        init_mode=params.get("init_mode", "activator_spike"),
-        activator_type=params.get("activator_type", "juxtacrine"),
-        spike_value=params.get("spike_value", 5.0),
-        save_every=params.get("save_every", 100),
+    c = step_constants(p, dt, dx)
+    act_signal = A if activator_type == "paracrine" else neighbour_average(A)
+    H = hill_batch(act_signal, I, c)
+    A_new = A + (c.act_prod_dt * H - c.act_decay_dt * A)
+    if activator_type == "paracrine":
+        A_new += c.act_diff_num * neumann_stencil(A)
+    I_new = (I + (c.inh_prod_dt * H - c.inh_decay_dt * I)
+             + c.inh_diff_num * neumann_stencil(I))
+    return A_new, I_new
 
-    )
 
-    activator_hist, inhibitor_hist, steps_used, a_ss, i_ss = result
+def run_ensemble_neumann(
+    N, K, steps, dt, dx, p, stopping_threshold, min_steps,
+    init_mode="spikes",
+    activator_type="juxtacrine",
+    spike_value=5.0,
+    save_every=10,
+    timings=None,
+    seed=None
+):
+    """
+    Run K replicates of one parameter set together as (K, N) arrays.
+
+    Replicate k starts from initialize_fields with the k-th child of SeedSequence(seed),
+    so replicates differ only for the random init modes. Each replicate follows the
+    stopping rule of run_coupled_neumann on its own and is frozen once it stops; the
+    loop ends when all have stopped. Returns a dict with (K, N) initial/final fields
+    (final = last saved frame, as in run_coupled_neumann), per-replicate steps_used
+    and final_change, and the steady-state levels.
+
+    With p["noise"] set, the noise for all replicates is drawn from one stream of
+    `seed` and saved frames are time averages, as in run_coupled_neumann.
+    """
+    clock = time.perf_counter
+    t = {"steady_state": 0.0, "init": 0.0, "step": 0.0, "convergence": 0.0, "history": 0.0}
+
+    t0 = clock()
+    a_ss, i_ss = initial_levels(p, activator_type, spike_value)
+    t1 = clock()
+    t["steady_state"] += t1 - t0
+
+    seeds = np.random.SeedSequence(seed).spawn(K)
+    fields = [initialize_fields(N, init_mode, spike_value, spike_value_a=float(a_ss),
+                                spike_value_i=float(i_ss), rng=s) for s in seeds]
+    A = np.array([a for a, _ in fields])
+    I = np.array([i for _, i in fields])
+    A0, I0 = A.copy(), I.copy()
+    saved_A, saved_I = A.copy(), I.copy()
+
+    steps_used = np.full(K, steps - 1)
+    final_change = np.full(K, np.inf)
+    active = np.ones(K, dtype=bool)
+
+    c = step_constants(p, dt, dx)  # validated once; the loop never touches the dict
+    noise = noise_settings(p)
+    if noise is not None:
+        noise = NoiseSource(*noise, (K, N), dt, seed=seed)
+        sum_A, sum_I, n_avg = np.zeros((K, N)), np.zeros((K, N)), 0
+    t0 = clock()
+    t["init"] += t0 - t1
+
+    for step in range(steps):
+        A_new, I_new = step_neumann_batch(A, I, dt, dx, c, activator_type)
+        if noise is not None:
+            noise.apply(A, I, A_new, I_new)
+        if active.all():
+            A, I = A_new, I_new
+        else:  # stopped replicates are frozen
+            A = np.where(active[:, None], A_new, A)
+            I = np.where(active[:, None], I_new, I)
+        if noise is not None:
+            sum_A += A
+            sum_I += I
+            n_avg += 1
+
+        if step % save_every == 0:
+            t1 = clock()
+            t["step"] += t1 - t0
+            if noise is None:
+                frame_A, frame_I = A.copy(), I.copy()
+            else:  # time average since the previous save; stopped replicates keep their frame
+                frame_A = np.where(active[:, None], sum_A / n_avg, saved_A)
+                frame_I = np.where(active[:, None], sum_I / n_avg, saved_I)
+                sum_A[:] = 0.0
+                sum_I[:] = 0.0
+                n_avg = 0
+            diff = (np.sum(np.abs(frame_A - saved_A), axis=1) + np.sum(np.abs(frame_I - saved_I), axis=1)) / (2 * N)
+            final_change[active] = diff[active]
+            saved_A, saved_I = frame_A, frame_I
+            if step > min_steps:
+                stop = active & (diff < stopping_threshold)
+                steps_used[stop] = step
+                active &= ~stop
+            t0 = clock()
+            t["convergence"] += t0 - t1
+            if not active.any():
+                break
+    else:
+        t["step"] += clock() - t0
+    logger.info("Ensemble of %d stopped at steps %s", K, steps_used.tolist())
+
+    if timings is not None:
+        for k, v in t.items():
+            timings[k] = timings.get(k, 0.0) + v
 
     return {
-        "status": "done",  # your loop prints convergence info already
         "steps_used": steps_used,
-        "parameters": params,
-        "activator_initial": activator_hist[0],
-        "activator_final": activator_hist[-1],
-        "inhibitor_initial": inhibitor_hist[0],
-        "inhibitor_final": inhibitor_hist[-1],
+        "final_change": final_change,
+        "activator_initial": A0,
+        "activator_final": saved_A,
+        "inhibitor_initial": I0,
+        "inhibitor_final": saved_I,
         "activator_steady-state": a_ss,
-        "inhibitor_steady-state": i_ss
+        "inhibitor_steady-state": i_ss,
+    }
+
+
+# ---------- Multilevel (coarse-to-fine) runs ----------
+def coarsen_cells(Z, shape):
+    """Block means of a cell field onto a coarser grid of `shape` (any dimension, uneven blocks allowed)."""
+    Z = np.asarray(Z, dtype=float)
+    for axis, nc in enumerate(shape):
+        n = Z.shape[axis]
+        edges = np.round(np.arange(nc + 1) * n / nc).astype(int)
+        Z = np.add.reduceat(Z, edges[:-1], axis=axis) / np.expand_dims(
+            np.diff(edges), tuple(a for a in range(Z.ndim) if a != axis))
+    return Z
+
+
+def refine_cells(Z, shape, periodic=False):
+    """
+    Linear interpolation between cell centres onto a finer grid of `shape`. Edges
+    are clamped (zero-flux, as in the 1D engine) or wrapped (`periodic`, the 2D engine).
+    """
+    Z = np.asarray(Z, dtype=float)
+    for axis, n in enumerate(shape):
+        nc = Z.shape[axis]
+        pos = (np.arange(n) + 0.5) * nc / n - 0.5
+        j = np.floor(pos).astype(int)
+        w = pos - j
+        if periodic:
+            j0, j1 = j % nc, (j + 1) % nc
+        else:
+            j0, j1 = np.clip(j, 0, nc - 1), np.clip(j + 1, 0, nc - 1)
+        w = np.expand_dims(w, tuple(a for a in range(Z.ndim) if a != axis))
+        Z = (1.0 - w) * np.take(Z, j0, axis=axis) + w * np.take(Z, j1, axis=axis)
+    return Z
+
+
+def check_multilevel(p, activator_type, factor):
+    """Multilevel runs coarsen space, which only makes sense for a diffusing (paracrine) activator."""
+    if activator_type != "paracrine":
+        raise ValueError("multilevel runs need activator_type 'paracrine': contact signalling is "
+                         "defined per cell and does not coarse-grain")
+    if noise_settings(p) is not None:
+        raise ValueError("multilevel runs are deterministic only (noise strength depends on the grid)")
+    if not factor > 1:
+        raise ValueError(f"multilevel factor must be > 1, got {factor}")
+
+
+def compare_fields(multilevel, direct):
+    """Difference between a multilevel and a direct final field."""
+    multilevel, direct = np.asarray(multilevel), np.asarray(direct)
+    return {
+        "max_abs_diff": float(np.max(np.abs(multilevel - direct))),
+        "rel_l2_diff": float(np.linalg.norm(multilevel - direct) / max(np.linalg.norm(direct), 1e-300)),
+    }
+
+
+def run_multilevel_neumann(
+    N, steps, dt, dx, p, stopping_threshold, min_steps,
+    factor=4, coarse_tol=10.0, coarse_dt=None, compare=False, stats=None,
+    init_mode="spikes", activator_type="paracrine", spike_value=5.0, save_every=10,
+    history_path=None, timings=None, seed=None
+):
+    """
+    Coarse-to-fine version of run_coupled_neumann, with the same arguments and return value.
+
+    The initial fields are built on the fine grid exactly as in a direct run, then block-averaged
+    onto N // factor cells with dx * N / N_coarse spacing (same domain length). That grid runs
+    until its stopping measure falls below coarse_tol * stopping_threshold. Its fields are
+    interpolated back to N cells, and the fine grid finishes the run with the normal stopping
+    rule. The two stages share the `steps` budget: the fine stage gets what the coarse stage
+    left (at least one step). The returned history and steps are those of the fine stage;
+    history_path only records the fine stage. `coarse_dt` (default dt) sets the coarse stage's time step.
+    The explicit diffusion limit grows with dx**2, so it can often be much larger than dt.
+
+    `stats` (a dict) receives coarse_N, coarse_steps, fine_steps, t_coarse/t_fine and the
+    step rate of each level (coarse_steps_per_sec/fine_steps_per_sec, over stepping time only).
+    With `compare`, a direct fine-grid run is also made. It adds t_direct, direct_steps,
+    time_saved, speedup and compare_fields() of the final activator and inhibitor.
+    """
+    check_multilevel(p, activator_type, factor)
+    clock = time.perf_counter
+    coarse_N = max(3, int(round(N / factor)))
+    coarse_dx = dx * N / coarse_N
+    a_ss, i_ss = initial_levels(p, activator_type, spike_value)
+    activator, inhibitor = initialize_fields(N, init_mode, spike_value,
+                                             spike_value_a=float(a_ss), spike_value_i=float(i_ss), rng=seed)
+
+    t0 = clock()
+    coarse_dt = dt if coarse_dt is None else coarse_dt
+    coarse_t, fine_t = {}, {}  # per-level phase times, so each level gets its own step rate
+    a_hist, i_hist, coarse_steps, _, _ = run_coupled_neumann(
+        coarse_N, max(1, steps - 1), coarse_dt, coarse_dx, p, coarse_tol * stopping_threshold, min_steps,
+        init_mode=init_mode, activator_type=activator_type, save_every=save_every, timings=coarse_t,
+        initial=(coarsen_cells(activator, (coarse_N,)), coarsen_cells(inhibitor, (coarse_N,))),
+    )
+    t1 = clock()
+    fine = run_coupled_neumann(
+        N, max(1, steps - (coarse_steps + 1)), dt, dx, p, stopping_threshold, 0,
+        init_mode=init_mode, activator_type=activator_type, save_every=save_every,
+        history_path=history_path, timings=fine_t,
+        initial=(refine_cells(a_hist[-1], (N,)), refine_cells(i_hist[-1], (N,))),
+    )
+    t2 = clock()
+    if timings is not None:
+        for k in coarse_t:
+            timings[k] = timings.get(k, 0.0) + coarse_t[k] + fine_t[k]
+
+    if stats is not None:
+        stats.update({"factor": factor, "coarse_N": coarse_N, "coarse_steps": coarse_steps + 1,
+                      "fine_steps": fine[2] + 1, "t_coarse": t1 - t0, "t_fine": t2 - t1,
+                      "coarse_steps_per_sec": (coarse_steps + 1) / max(coarse_t["step"], 1e-12),
+                      "fine_steps_per_sec": (fine[2] + 1) / max(fine_t["step"], 1e-12)})
+        if compare:
+            direct = run_coupled_neumann(
+                N, steps, dt, dx, p, stopping_threshold, min_steps, activator_type=activator_type,
+                save_every=save_every, initial=(activator, inhibitor),
+            )
+            t_direct = clock() - t2
+            stats.update({"t_direct": t_direct, "direct_steps": direct[2] + 1,
+                          "time_saved": t_direct - (t2 - t0), "speedup": t_direct / max(t2 - t0, 1e-12)})
+            stats.update({f"activator_{k}": v for k, v in compare_fields(fine[0][-1], direct[0][-1]).items()})
+            stats.update({f"inhibitor_{k}": v for k, v in compare_fields(fine[1][-1], direct[1][-1]).items()})
+    return fine[0], fine[1], fine[2], a_ss, i_ss
+
+
+# Bump whenever a change to the engine alters results, so cached runs are not reused
+ENGINE_VERSION = "2"
+
+# Keys of a run_simulation parameter dict that can change its result, with run_simulation's defaults
+RUN_DEFAULTS = {
+    "N": None, "steps": None, "dt": None, "dx": None,
+    "stopping_threshold": 1e-4, "min_steps": 10000, "save_every": 100,
+    "init_mode": "activator_spike", "activator_type": "juxtacrine", "spike_value": 5.0,
+}
+MODEL_KEYS = (
+    "act_half_sat", "inh_half_sat", "act_hill_coeff", "inh_hill_coeff", "basal_prod",
+    "act_prod_rate", "act_decay_rate", "inh_prod_rate", "inh_decay_rate",
+    "inh_diffusion", "act_diffusion",
+)
+
+
+def canonical_params(p, digits=12):
+    """
+    Hashable canonical form of a parameter dict: only the keys that affect the result,
+    run_simulation defaults filled in, numbers rounded to `digits` significant digits.
+
+    act_diffusion is dropped unless activator_type is "paracrine", since every other
+    type is membrane-bound and never diffuses. Two dicts with the same canonical form
+    give equivalent runs. The noise settings are kept only for stochastic runs, and
+    the RNG seed (unrounded) only when the result depends on it (see is_stochastic).
+    """
+    out = {}
+    for k, default in RUN_DEFAULTS.items():
+        out[k] = p.get(k, default)
+    for k in MODEL_KEYS:
+        out[k] = p[k]
+    if out["activator_type"] != "paracrine":
+        del out["act_diffusion"]
+    noise = noise_settings(p)
+    if noise is not None:
+        out["noise"], out["noise_a"], out["noise_i"] = noise
+    out = {k: float(f"{v:.{digits}g}") if isinstance(v, (int, float, np.number)) and not isinstance(v, bool) else v
+           for k, v in out.items()}
+    if int(p.get("replicates", 1)) > 1:
+        out["replicates"] = int(p["replicates"])
+    if is_stochastic(p):
+        seed = p.get("seed")
+        out["seed"] = None if seed is None else int(seed)
+    return tuple(sorted(out.items()))
+
+
+def cache_key(p):
+    """
+    Content address of a run: sha256 over the canonical parameters (which carry the
+    RNG seed for random init modes) and ENGINE_VERSION. Equivalent parameter dicts
+    map to the same key.
+    """
+    payload = repr((canonical_params(p), ENGINE_VERSION))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+CACHED_KEYS = (
+    "steps_used", "converged", "final_change",
+    "activator_initial", "activator_final", "inhibitor_initial", "inhibitor_final",
+    "activator_steady-state", "inhibitor_steady-state",
+)
+
+
+def _peak_rss_mb():
+    """Peak resident set size of this process in MB (None where unsupported)."""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux, bytes on macOS
+    return rss / (1024.0 * 1024.0) if sys.platform == "darwin" else rss / 1024.0
+
+
+def _sensitivity(result, options):
+    from sensitivity import run_sensitivity  # imports this module; loaded only when asked for
+    return run_sensitivity(result, **options)
+
+
+def run_simulation(params, reducer=None, history_path=None, profile_path=None, cache=None, sensitivity=None,
+                   multilevel=None):
+    """
+    Thin wrapper to call run_coupled_neumann with a parameter dict.
+
+    If `reducer` is given it is called on the result dict right after the run
+    (inside the worker) and its return value is stored under "features", e.g.
+    pattern_analysis.pattern_reducer to get pattern metrics without a second pass.
+    `history_path` streams the full space-time history to disk (see run_coupled_neumann).
+
+    The result carries a "perf" dict: wall time per phase, steps/sec, cell-steps/sec
+    and the process's peak RSS. With `profile_path`, the run is executed under
+    cProfile and the stats are dumped there (readable with pstats/snakeviz).
+
+    `cache` is any object with get(key)/put(key, value) (e.g. rd_batch.result_cache.ResultCache).
+    It is consulted before simulating; hits skip the run and report perf["cache_hit"].
+    Runs that stream history, are profiled, or are stochastic without a "seed"
+    always simulate.
+
+    params["seed"] seeds the random init modes (see initialize_fields) and the noise
+    of stochastic runs (params["noise"], see noise_settings).
+
+    With params["replicates"] = K > 1, K replicates run together in run_ensemble_neumann;
+    the result then holds (K, N) fields and per-replicate steps_used, converged and
+    final_change arrays (history_path is not supported).
+
+    `sensitivity` is a dict of sensitivity.run_sensitivity options (params, metrics,
+    method, fields); the derivatives are stored under "sensitivity". The steady method
+    only needs the final fields, so it also runs on cache hits.
+
+    `multilevel` = {"factor": 4, "coarse_tol": 10.0, "compare": False} runs the 1D model
+    coarse-to-fine (run_multilevel_neumann; paracrine activators only) and stores its
+    stats under "multilevel": coarse/fine steps, times and step rates, and with compare, a direct
+    fine-grid run's time, time_saved and the difference between the two final fields.
+    Multilevel runs bypass the result cache, whose entries are direct runs.
+    """
+    t_start = time.perf_counter()
+    ModelParams.from_dict(params)  # unknown keys and invalid values fail here, not mid-run
+    K = int(params.get("replicates", 1))
+    if K > 1 and history_path is not None:
+        raise ValueError("history_path is not supported with replicates > 1")
+    if K > 1 and multilevel is not None:
+        raise ValueError("multilevel is not supported with replicates > 1")
+    key = None
+    unseeded = is_stochastic(params) and params.get("seed") is None
+    if (cache is not None and history_path is None and profile_path is None and not unseeded
+            and multilevel is None):
+        key = cache_key(params)
+        hit = cache.get(key)
+        if hit is not None:
+            out = {"status": "done", "parameters": params, **hit}
+            out["perf"] = {
+                "wall_time": time.perf_counter() - t_start,
+                **{f"t_{k}": 0.0 for k in ("steady_state", "init", "step", "convergence", "history")},
+                "steps_per_sec": np.nan,
+                "cell_steps_per_sec": np.nan,
+                "peak_rss_mb": _peak_rss_mb(),
+                "cache_hit": True,
+            }
+            if sensitivity is not None:
+                out["sensitivity"] = _sensitivity(out, sensitivity)
+            if reducer is not None:
+                out["features"] = reducer(out)
+            return out
+
+    timings = {}
+    N = params["N"]
+    settings = dict(
+        init_mode=params.get("init_mode", "activator_spike"),
+        activator_type=params.get("activator_type", "juxtacrine"),
+        spike_value=params.get("spike_value", 5.0),
+        save_every=params.get("save_every", 100),
+        timings=timings,
+        seed=params.get("seed"),
+    )
+    threshold = params.get("stopping_threshold", 1e-4)
+    ml_stats = {}
+    if multilevel is not None:
+        run = lambda: run_multilevel_neumann(
+            N, params["steps"], params["dt"], params["dx"], params,
+            threshold, params.get("min_steps", 10000),
+            stats=ml_stats, history_path=history_path, **multilevel, **settings,
+        )
+    elif K == 1:
+        run = lambda: run_coupled_neumann(
+            N, params["steps"], params["dt"], params["dx"], params,
+            threshold, params.get("min_steps", 10000),
+            history_path=history_path, **settings,
+        )
+    else:
+        run = lambda: run_ensemble_neumann(
+            N, K, params["steps"], params["dt"], params["dx"], params,
+            threshold, params.get("min_steps", 10000), **settings,
+        )
+    if profile_path is not None:
+        import cProfile
+        profiler = cProfile.Profile()
+        result = profiler.runcall(run)
+        profiler.dump_stats(profile_path)
+    else:
+        result = run()
+    wall = time.perf_counter() - t_start
+
+    if K == 1:
+        activator_hist, inhibitor_hist, steps_used, a_ss, i_ss = result
+
+        # Same criterion as the stopping rule: average change per tile between the last two saved frames
+        final_change = np.inf
+        if len(activator_hist) > 1:
+            final_change = (np.sum(np.abs(activator_hist[-1] - activator_hist[-2]))
+                            + np.sum(np.abs(inhibitor_hist[-1] - inhibitor_hist[-2]))) / (2 * N)
+        converged = bool(final_change < threshold)
+
+        out = {
+            "status": "done",
+            "steps_used": steps_used,
+            "converged": converged,
+            "final_change": float(final_change),
+            "parameters": params,
+            "activator_initial": activator_hist[0],
+            "activator_final": activator_hist[-1],
+            "inhibitor_initial": inhibitor_hist[0],
+            "inhibitor_final": inhibitor_hist[-1],
+            "activator_steady-state": a_ss,
+            "inhibitor_steady-state": i_ss
+        }
+    else:
+        out = {"status": "done", "parameters": params, **result,
+               "converged": result["final_change"] < threshold}
+        steps_used = int(result["steps_used"].max())
+    steps_done = steps_used + 1
+    stepping = max(timings["step"], 1e-12)
+    steps_per_sec = ml_stats["fine_steps_per_sec"] if multilevel is not None else steps_done / stepping
+    out["perf"] = {
+        "wall_time": wall,
+        **{f"t_{k}": v for k, v in timings.items()},
+        "steps_per_sec": steps_per_sec,  # multilevel: the fine level; ml_* has both levels
+        "cell_steps_per_sec": steps_per_sec * N * K,
+        "peak_rss_mb": _peak_rss_mb(),
+        "cache_hit": False,
     }
+    if multilevel is not None:
+        out["multilevel"] = ml_stats
+    if key is not None:
+        cache.put(key, {k: out[k] for k in CACHED_KEYS})
+    if sensitivity is not None:
+        out["sensitivity"] = _sensitivity(out, sensitivity)
+    if reducer is not None:
+        out["features"] = reducer(out)
+    return out
@@ -0,0 +1,174 @@
+import time
+
+import numpy as np
+
+from simulation import (initialize_fields, initial_levels, hill_batch, noise_settings, NoiseSource,
+                        coarsen_cells, refine_cells, check_multilevel, compare_fields)
+from model_params import step_constants
+
+
+# ---------- 2D kernels (periodic boundaries) ----------
+def laplacian(Z, dx):
+    """5-point Laplacian with periodic boundaries."""
+    return (
+        -4 * Z
+        + np.roll(Z, 1, axis=0)
+        + np.roll(Z, -1, axis=0)
+        + np.roll(Z, 1, axis=1)
+        + np.roll(Z, -1, axis=1)
+    ) / (dx * dx)
+
+
+def neighbor_sum(Z):
+    """
+    Sum of 4-neighbour values (up, down, left, right) with periodic BCs.
+    """
+    return (
+        np.roll(Z, 1, axis=0) +   # up
+        np.roll(Z, -1, axis=0) +  # down
+        np.roll(Z, 1, axis=1) +   # left
+        np.roll(Z, -1, axis=1)    # right
+    )
+
+
+def step_2d(A, I, dt, dx, p, activator_type="juxtacrine"):
+    """
+    One explicit Euler step of the 2D activator–inhibitor model; returns (A_new, I_new).
+
+    Paracrine activators sense their own level and diffuse; any other activator_type
+    senses the average of its 4 neighbours and does not diffuse (as in the 1D engine).
+    `p` may be a dict, ModelParams or precomputed StepConstants.
+    """
+    c = step_constants(p, dt, dx)
+    if activator_type == "paracrine":
+        act_signal = A
+    else:
+        act_signal = 0.25 * neighbor_sum(A)
+    H = hill_batch(act_signal, I, c)
+
+    A_new = A + (c.act_prod_dt * H - c.act_decay_dt * A)
+    if activator_type == "paracrine":
+        A_new += c.act_diff_num * laplacian(A, 1.0)
+    I_new = I + (c.inh_diff_num * laplacian(I, 1.0) + c.inh_prod_dt * H - c.inh_decay_dt * I)
+    return A_new, I_new
+
+
+def initial_fields_2d(shape, p, init_mode="random_tight", activator_type="juxtacrine",
+                      spike_value=5.0, seed=None):
+    """
+    Initial (A, I) of the given shape, with the same init modes as the 1D engine
+    (simulation.initialize_fields). `seed` makes the random modes reproducible.
+    """
+    a_ss, i_ss = initial_levels(p, activator_type, spike_value)
+    return initialize_fields(tuple(shape), init_mode, spike_value,
+                             spike_value_a=a_ss, spike_value_i=i_ss, rng=seed)
+
+
+def run_coupled_periodic_2d(
+    A, I, steps, dt, dx, p, stopping_threshold, min_steps,
+    activator_type="juxtacrine",
+    save_every=10,
+    seed=None
+):
+    """
+    Run the 2D model from initial fields A, I (periodic boundaries).
+    Same stopping rule and return layout as simulation.run_coupled_neumann, minus
+    the steady-state values: (activator_history, inhibitor_history, step).
+
+    With p["noise"] set, steps get Euler–Maruyama noise seeded by `seed` and saved
+    frames are time averages since the previous save, as in the 1D engine.
+    """
+    A = np.array(A, dtype=float)
+    I = np.array(I, dtype=float)
+    n_cells = A.size
+
+    activator_history = [A.copy()]
+    inhibitor_history = [I.copy()]
+
+    c = step_constants(p, dt, dx)
+    noise = noise_settings(p)
+    if noise is not None:
+        noise = NoiseSource(*noise, A.shape, dt, seed=seed)
+        sum_A, sum_I, n_avg = np.zeros_like(A), np.zeros_like(I), 0
+
+    step = -1
+    for step in range(steps):
+        A_new, I_new = step_2d(A, I, dt, dx, c, activator_type)
+        if noise is not None:
+            noise.apply(A, I, A_new, I_new)
+            sum_A += A_new
+            sum_I += I_new
+            n_avg += 1
+        A, I = A_new, I_new
+
+        if step % save_every == 0:
+            if noise is None:
+                frame_A, frame_I = A.copy(), I.copy()
+            else:
+                frame_A, frame_I = sum_A / n_avg, sum_I / n_avg
+                sum_A[:] = 0.0
+                sum_I[:] = 0.0
+                n_avg = 0
+            diff = np.sum(np.abs(frame_A - activator_history[-1])) + np.sum(np.abs(frame_I - inhibitor_history[-1]))
+            activator_history.append(frame_A)
+            inhibitor_history.append(frame_I)
+            if step > min_steps and diff / (2 * n_cells) < stopping_threshold:
+                break
+
+    return activator_history, inhibitor_history, step
+
+
+def run_multilevel_2d(
+    A, I, steps, dt, dx, p, stopping_threshold, min_steps,
+    factor=4, coarse_tol=10.0, coarse_dt=None, compare=False, stats=None,
+    activator_type="paracrine",
+    save_every=10,
+):
+    """
+    Coarse-to-fine version of run_coupled_periodic_2d (same arguments and return value),
+    as simulation.run_multilevel_neumann does for 1D. The initial fields are
+    block-averaged onto a grid `factor` times coarser in each direction, with the same
+    domain size. The coarse grid runs to coarse_tol * stopping_threshold, then its
+    fields are interpolated periodically back to the fine grid, which finishes the run
+    with the steps the coarse stage left (at least one).
+    `stats` receives the stage times, steps and step rates. With `compare`, it also gets a direct
+    run's time and the difference between the final fields.
+    """
+    check_multilevel(p, activator_type, factor)
+    clock = time.perf_counter
+    A = np.asarray(A, dtype=float)
+    I = np.asarray(I, dtype=float)
+    shape = A.shape
+    coarse_shape = tuple(max(3, int(round(n / factor))) for n in shape)
+    if shape[0] * coarse_shape[1] != shape[1] * coarse_shape[0]:
+        raise ValueError(f"factor {factor} does not keep the aspect ratio of a {shape} grid")
+    coarse_dx = dx * shape[0] / coarse_shape[0]
+
+    t0 = clock()
+    a_hist, i_hist, coarse_steps = run_coupled_periodic_2d(
+        coarsen_cells(A, coarse_shape), coarsen_cells(I, coarse_shape), max(1, steps - 1),
+        dt if coarse_dt is None else coarse_dt, coarse_dx, p, coarse_tol * stopping_threshold, min_steps,
+        activator_type=activator_type, save_every=save_every,
+    )
+    t1 = clock()
+    fine = run_coupled_periodic_2d(
+        refine_cells(a_hist[-1], shape, periodic=True), refine_cells(i_hist[-1], shape, periodic=True),
+        max(1, steps - (coarse_steps + 1)), dt, dx, p, stopping_threshold, 0,
+        activator_type=activator_type, save_every=save_every,
+    )
+    t2 = clock()
+
+    if stats is not None:
+        stats.update({"factor": factor, "coarse_shape": coarse_shape, "coarse_steps": coarse_steps + 1,
+                      "fine_steps": fine[2] + 1, "t_coarse": t1 - t0, "t_fine": t2 - t1,
+                      "coarse_steps_per_sec": (coarse_steps + 1) / max(t1 - t0, 1e-12),
+                      "fine_steps_per_sec": (fine[2] + 1) / max(t2 - t1, 1e-12)})
+        if compare:
+            direct = run_coupled_periodic_2d(A, I, steps, dt, dx, p, stopping_threshold, min_steps,
+                                             activator_type=activator_type, save_every=save_every)
+            t_direct = clock() - t2
+            stats.update({"t_direct": t_direct, "direct_steps": direct[2] + 1,
+                          "time_saved": t_direct - (t2 - t0), "speedup": t_direct / max(t2 - t0, 1e-12)})
+            stats.update({f"activator_{k}": v for k, v in compare_fields(fine[0][-1], direct[0][-1]).items()})
+            stats.update({f"inhibitor_{k}": v for k, v in compare_fields(fine[1][-1], direct[1][-1]).items()})
+    return fine
@@ -0,0 +1,216 @@
+import numpy as np
+
+from simulation import (initialize_fields, initial_levels, hill_batch, noise_settings, NoiseSource)
+from model_params import step_constants
+
+try:
+    import scipy.sparse as sparse
+except ImportError:  # optional: a numpy matvec is used instead
+    sparse = None
+
+
+# ---------- Cell graphs (CSR adjacency) ----------
+class CellGraph:
+    """
+    Contact graph of a tissue as a CSR adjacency (indptr, indices, data).
+
+    neighbour_sum(x) is the sparse matvec sum_j w_ij x_j; neighbour_average divides
+    by the precomputed weighted degree (the juxtacrine "average" signal) and
+    laplacian(x) = sum_j w_ij (x_j - x_i) is the graph Laplacian used for diffusion.
+    On a chain this is exactly the 1D Neumann stencil of simulation.py, on a ring or
+    periodic square lattice the periodic stencils of the 1D/2D engines.
+
+    Uses scipy.sparse for the matvec when installed, else numpy: a segmented sum
+    (np.add.reduceat) when every cell has a neighbour, a bincount over the
+    precomputed row ids otherwise.
+    """
+
+    def __init__(self, indptr, indices, data=None, positions=None):
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int64)
+        self.n = len(self.indptr) - 1
+        self.data = (np.ones(len(self.indices)) if data is None
+                     else np.asarray(data, dtype=float))
+        self.positions = positions
+        self.rows = np.repeat(np.arange(self.n), np.diff(self.indptr))
+        self.degree = np.bincount(self.rows, weights=self.data, minlength=self.n)
+        with np.errstate(divide="ignore"):
+            self.inv_degree = np.where(self.degree > 0, 1.0 / self.degree, 0.0)
+        self._unit = bool(np.all(self.data == 1.0))
+        self._segmented = self.n > 0 and bool(np.all(np.diff(self.indptr) > 0))
+        self._matrix = (sparse.csr_matrix((self.data, self.indices, self.indptr), shape=(self.n, self.n))
+                        if sparse is not None else None)
+
+    @classmethod
+    def from_edges(cls, n, i, j, weights=None, positions=None):
+        """Build from undirected edges (i[k], j[k]); both directions are added, duplicates merged."""
+        i = np.asarray(i, dtype=np.int64)
+        j = np.asarray(j, dtype=np.int64)
+        w = np.ones(len(i)) if weights is None else np.asarray(weights, dtype=float)
+        keep = i != j
+        src = np.concatenate([i[keep], j[keep]])
+        dst = np.concatenate([j[keep], i[keep]])
+        w = np.concatenate([w[keep], w[keep]])
+        key, first = np.unique(src * n + dst, return_index=True)
+        src, dst, w = key // n, key % n, w[first]
+        indptr = np.concatenate([[0], np.cumsum(np.bincount(src, minlength=n))])
+        return cls(indptr, dst, w, positions=positions)
+
+    @property
+    def nnz(self):
+        return len(self.indices)
+
+    def neighbour_sum(self, x):
+        if self._matrix is not None:
+            return self._matrix @ x
+        if self._segmented:
+            vals = x[self.indices] if self._unit else self.data * x[self.indices]
+            return np.add.reduceat(vals, self.indptr[:-1])
+        return np.bincount(self.rows, weights=self.data * x[self.indices], minlength=self.n)
+
+    def neighbour_average(self, x):
+        return self.neighbour_sum(x) * self.inv_degree
+
+    def laplacian(self, x):
+        return self.neighbour_sum(x) - self.degree * x
+
+
+def chain_graph(n):
+    """Open 1D chain (zero-flux ends), the topology of simulation.run_coupled_neumann."""
+    i = np.arange(n - 1)
+    return CellGraph.from_edges(n, i, i + 1, positions=np.column_stack([np.arange(n), np.zeros(n)]))
+
+
+def ring_graph(n):
+    """Periodic 1D ring of n cells."""
+    i = np.arange(n)
+    return CellGraph.from_edges(n, i, (i + 1) % n,
+                                positions=np.column_stack([np.cos(2 * np.pi * i / n), np.sin(2 * np.pi * i / n)]))
+
+
+def square_lattice(nx, ny, periodic=True):
+    """4-neighbour square lattice of nx*ny cells (cell = row * nx + col)."""
+    r, c = np.divmod(np.arange(nx * ny), nx)
+    edges = []
+    for dr, dc in ((0, 1), (1, 0)):
+        rr, cc = r + dr, c + dc
+        ok = np.ones(nx * ny, dtype=bool) if periodic else (rr < ny) & (cc < nx)
+        edges.append((np.flatnonzero(ok), (rr[ok] % ny) * nx + cc[ok] % nx))
+    i, j = (np.concatenate(e) for e in zip(*edges))
+    return CellGraph.from_edges(nx * ny, i, j, positions=np.column_stack([c, r]).astype(float))
+
+
+def hex_lattice(nx, ny, periodic=True):
+    """
+    6-neighbour hexagonal lattice of nx*ny cells in offset rows (odd rows shifted
+    right by half a cell). Periodic wrapping needs an even number of rows.
+    """
+    if periodic and ny % 2:
+        raise ValueError("periodic hex_lattice needs an even ny")
+    r, c = np.divmod(np.arange(nx * ny), nx)
+    odd = r % 2
+    edges = []
+    # east, and the two neighbours in the row above (their column offset depends on row parity)
+    for dr, dc_even, dc_odd in ((0, 1, 1), (1, -1, 0), (1, 0, 1)):
+        rr = r + dr
+        cc = c + np.where(odd == 1, dc_odd, dc_even)
+        ok = (np.ones(nx * ny, dtype=bool) if periodic
+              else (rr < ny) & (cc >= 0) & (cc < nx))
+        edges.append((np.flatnonzero(ok), (rr[ok] % ny) * nx + cc[ok] % nx))
+    i, j = (np.concatenate(e) for e in zip(*edges))
+    pos = np.column_stack([c + 0.5 * odd, r * np.sqrt(3) / 2])
+    return CellGraph.from_edges(nx * ny, i, j, positions=pos)
+
+
+def voronoi_tissue(n, seed=None, box=1.0):
+    """
+    Irregular tissue: n cells at uniform random centres in a square, coupled where
+    their Voronoi regions touch (Delaunay edges). Needs scipy.
+    """
+    try:
+        from scipy.spatial import Delaunay
+    except ImportError as e:
+        raise ImportError("voronoi_tissue needs scipy (pip install scipy)") from e
+    pts = np.random.default_rng(seed).uniform(0, box, size=(n, 2))
+    simplices = Delaunay(pts).simplices
+    i = np.concatenate([simplices[:, 0], simplices[:, 1], simplices[:, 2]])
+    j = np.concatenate([simplices[:, 1], simplices[:, 2], simplices[:, 0]])
+    return CellGraph.from_edges(n, i, j, positions=pts)
+
+
+# ---------- Engine ----------
+def step_graph(A, I, dt, dx, p, graph, activator_type="juxtacrine"):
+    """
+    One explicit Euler step on a cell graph; returns (A_new, I_new). Same model as the
+    1D/2D engines: paracrine activators sense themselves and diffuse, every other
+    activator_type senses the average over contacting cells and does not diffuse.
+    `p` may be a dict, ModelParams or precomputed StepConstants.
+    """
+    c = step_constants(p, dt, dx)
+    act_signal = A if activator_type == "paracrine" else graph.neighbour_average(A)
+    H = hill_batch(act_signal, I, c)
+    A_new = A + (c.act_prod_dt * H - c.act_decay_dt * A)
+    if activator_type == "paracrine":
+        A_new += c.act_diff_num * graph.laplacian(A)
+    I_new = (I + (c.inh_prod_dt * H - c.inh_decay_dt * I)
+             + c.inh_diff_num * graph.laplacian(I))
+    return A_new, I_new
+
+
+def initial_fields_graph(graph, p, init_mode="random_tight", activator_type="juxtacrine",
+                         spike_value=5.0, seed=None):
+    """Initial (A, I) over the graph's cells with the init modes of simulation.initialize_fields."""
+    a_ss, i_ss = initial_levels(p, activator_type, spike_value)
+    return initialize_fields(graph.n, init_mode, spike_value,
+                             spike_value_a=a_ss, spike_value_i=i_ss, rng=seed)
+
+
+def run_graph(
+    graph, A, I, steps, dt, dx, p, stopping_threshold, min_steps,
+    activator_type="juxtacrine",
+    save_every=10,
+    seed=None
+):
+    """
+    Run the model on a cell graph from initial fields A, I (one value per cell).
+    Same stopping rule, noise handling and return layout as
+    simulation_2d.run_coupled_periodic_2d: (activator_history, inhibitor_history, step).
+    """
+    A = np.array(A, dtype=float)
+    I = np.array(I, dtype=float)
+    n_cells = A.size
+
+    activator_history = [A.copy()]
+    inhibitor_history = [I.copy()]
+
+    c = step_constants(p, dt, dx)
+    noise = noise_settings(p)
+    if noise is not None:
+        noise = NoiseSource(*noise, A.shape, dt, seed=seed)
+        sum_A, sum_I, n_avg = np.zeros_like(A), np.zeros_like(I), 0
+
+    step = -1
+    for step in range(steps):
+        A_new, I_new = step_graph(A, I, dt, dx, c, graph, activator_type)
+        if noise is not None:
+            noise.apply(A, I, A_new, I_new)
+            sum_A += A_new
+            sum_I += I_new
+            n_avg += 1
+        A, I = A_new, I_new
+
+        if step % save_every == 0:
+            if noise is None:
+                frame_A, frame_I = A.copy(), I.copy()
+            else:
+                frame_A, frame_I = sum_A / n_avg, sum_I / n_avg
+                sum_A[:] = 0.0
+                sum_I[:] = 0.0
+                n_avg = 0
+            diff = np.sum(np.abs(frame_A - activator_history[-1])) + np.sum(np.abs(frame_I - inhibitor_history[-1]))
+            activator_history.append(frame_A)
+            inhibitor_history.append(frame_I)
+            if step > min_steps and diff / (2 * n_cells) < stopping_threshold:
+                break
+
+    return activator_history, inhibitor_history, step
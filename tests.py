@@ -1,7 +1,13 @@
 from parameters import params, N, steps, dt, dx, save_every, spike_value, stopping_threshold
-from simulation import run_coupled_neumann
+from simulation import run_coupled_neumann, run_simulation
 from visualize import animate_histories
 import argparse
+import os
+import subprocess
+import sys
+
+# Modules the compute path must not import
+HEAVY_MODULES = ("matplotlib", "pandas", "yaml", "scipy", "joblib", "tqdm")
 
 
 def test_inhibitor_diffusion_only():
@@ -109,6 +115,867 @@ def test_activator_propagation_only_with_diffusion():
     animate_histories(A_hist, R_hist, save_every, title="Signal Propagation, with diffusion (Neumann)")
 
 
+def test_history():
+    """
+    On-disk history (history_io): the last frame must equal the run's final field, and
+    frame steps follow the loop: frame 0 is the initial state, frame k is step (k-1)*save_every.
+    """
+    import shutil
+    import tempfile
+    import numpy as np
+    from history_io import read_window
+
+    tmp = tempfile.mkdtemp(prefix="rd_history_")
+    try:
+        path = os.path.join(tmp, "history.npy")
+        r = run_simulation({**params, "N": 30, "steps": 1000, "dt": dt, "dx": dx, "save_every": 100,
+                            "min_steps": 10000, "activator_type": "paracrine", "act_diffusion": 1.0,
+                            "init_mode": "random_tight", "seed": 1}, history_path=path)
+        window, steps = read_window(path, 0)
+        assert np.array_equal(window[0], r["activator_initial"]) and np.array_equal(window[-1], r["activator_final"])
+        assert list(steps) == [-1] + list(range(0, 1000, 100)) and steps[-1] == r["steps_used"] // 100 * 100
+        window, steps = read_window(path, 1, slice(1, None, 3), slice(5, 10))
+        assert window.shape == (4, 5) and list(steps) == [0, 300, 600, 900]
+        print(f"Testing: history final frame matches the run; window steps {steps.tolist()}")
+    finally:
+        shutil.rmtree(tmp)
+
+
+def test_pattern_features():
+    """
+    Batch pattern descriptors (pattern_analysis.extract_features) of cosine profiles
+    with known wavelengths and a flat one; chunked input must give the same features.
+    """
+    import numpy as np
+    from pattern_analysis import extract_features, classify_patterns, PATTERN, HOMOGENEOUS
+
+    x = np.arange(100)
+    wavelengths = np.array([10.0, 20.0, 25.0, 50.0])
+    profiles = np.vstack([1 + np.cos(2 * np.pi * (x + 0.5) / lam) for lam in wavelengths] + [np.full(100, 2.0)])
+    f = extract_features(profiles)
+    assert np.array_equal(f["dct_wavelength"][:4], wavelengths) and np.isnan(f["dct_wavelength"][4])
+    assert np.allclose(f["dominant_wavelength"][:4], wavelengths)
+    assert np.allclose(f["peak_spacing_mean"][:4], wavelengths, rtol=0.02) and f["peak_count"][4] == 0
+    assert list(classify_patterns(f)) == [PATTERN] * 4 + [HOMOGENEOUS]
+    chunked = extract_features(iter([profiles[:2], profiles[2:]]))
+    assert all(np.array_equal(f[k], chunked[k], equal_nan=True) for k in f)
+    print(f"Testing: wavelengths {f['dct_wavelength'].tolist()}, peaks {f['peak_count'].tolist()}")
+
+
+def test_worker_features():
+    """
+    Pattern metrics computed inside the workers (pattern_reducer) must equal
+    extract_features/classify_patterns applied afterwards to the stored profiles.
+    """
+    import json
+    import shutil
+    import tempfile
+    import numpy as np
+    import pandas as pd
+    from pattern_analysis import extract_features, classify_patterns, PATTERN_CLASSES
+    from rd_batch.batch_runner import run_sweep
+
+    tmp = tempfile.mkdtemp(prefix="rd_features_")
+    try:
+        df = pd.read_csv(run_sweep(_small_sweep_cfg(tmp), log=lambda msg: None)["csv"])
+        profiles = np.array([json.loads(v) for v in df["activator_final"]])
+        f = extract_features(profiles, dx=dx)
+        for k in ("mean_a", "diff_a", "peak_count", "dct_wavelength", "dominant_wavelength", "spectral_entropy"):
+            assert np.allclose(df[k], f[k], equal_nan=True), k
+        labels = classify_patterns(f, converged=df["converged"].values)
+        assert list(df["pattern_class"]) == [PATTERN_CLASSES[i] for i in labels]
+        print(f"Testing: {len(df)} runs, in-worker features match post-hoc extraction "
+              f"({df['pattern_class'].value_counts().to_dict()})")
+    finally:
+        shutil.rmtree(tmp)
+
+
+def test_render_frames():
+    """
+    Headless renderer (visualize.render_frames): one PNG per frame of a 1D .npy history
+    and of 2D frames, and plain iterators need explicit limits.
+    """
+    import shutil
+    import tempfile
+    import numpy as np
+    import matplotlib.pyplot as plt
+    from visualize import render_frames
+
+    tmp = tempfile.mkdtemp(prefix="rd_frames_")
+    try:
+        rng = np.random.default_rng(0)
+        np.save(os.path.join(tmp, "history.npy"), rng.random((7, 2, 50)))
+        render_frames(os.path.join(tmp, "history.npy"), frame_dir=os.path.join(tmp, "1d"), save_every=10, dpi=40)
+        names = sorted(os.listdir(os.path.join(tmp, "1d")))
+        assert names == [f"frame_{k:06d}.png" for k in range(7)]
+        first, last = (plt.imread(os.path.join(tmp, "1d", n)) for n in (names[0], names[-1]))
+        assert first.shape == last.shape == (192, 256, 4) and not np.array_equal(first, last)
+
+        render_frames(rng.random((3, 2, 20, 20)), frame_dir=os.path.join(tmp, "2d"), dpi=40)
+        assert len(os.listdir(os.path.join(tmp, "2d"))) == 3
+        try:
+            render_frames(iter([(np.zeros(5), np.zeros(5))]), frame_dir=os.path.join(tmp, "iter"))
+            raise AssertionError("an iterator without ylim must be rejected")
+        except ValueError:
+            pass
+        print(f"Testing: rendered {len(names)} 1D frames of {first.shape} and 3 2D frames")
+    finally:
+        shutil.rmtree(tmp)
+
+
+def test_benchmark_harness():
+    """
+    Benchmark harness (benchmark.py): compare() flags only cases slower than the
+    baseline by more than the threshold, and time_case() records returned seconds.
+    """
+    import contextlib
+    import io
+    from benchmark import compare, time_case
+
+    results = {"fast": {"min": 1.0}, "slow": {"min": 1.3}, "new": {"min": 0.5}}
+    baseline = {"results": {"fast": {"min": 1.1}, "slow": {"min": 1.0}}}
+    with contextlib.redirect_stdout(io.StringIO()):
+        regressions = compare(results, baseline, threshold=0.25)
+    assert [r[0] for r in regressions] == ["slow"] and abs(regressions[0][3] - 1.3) < 1e-12
+    timed = iter([0.3, 0.1, 0.2])
+    t = time_case(lambda: next(timed), repeat=3)
+    assert t["min"] == 0.1 and t["median"] == 0.2 and t["repeat"] == 3
+    print(f"Testing: regressions {[r[0] for r in regressions]}; min/median {t['min']}/{t['median']}")
+
+
+def test_adaptive_refine():
+    """
+    Adaptive sweeps (rd_batch.grid.adaptive_refine, fill_phase) on a synthetic phase
+    boundary: the filled phase diagram must be exact with a fraction of the grid
+    evaluated, each point once, and a budget must cap the evaluations.
+    """
+    from itertools import product
+    import numpy as np
+    import rd_batch.grid as grid
+    from rd_batch.grid import adaptive_refine, fill_phase
+
+    shape = (65, 65)
+    calls = []
+
+    def evaluate(points):
+        calls.extend(points)
+        return ["pattern" if i + 2 * j < 90 else "homogeneous" for i, j in points]
+
+    evaluated, leaves, rounds = adaptive_refine(shape, evaluate, coarse=5)
+    phase = fill_phase(shape, evaluated, leaves, {"homogeneous": 0, "pattern": 1})
+    i, j = np.indices(shape)
+    assert np.array_equal(phase, (i + 2 * j < 90).astype(np.int8))
+    assert len(calls) == len(set(calls)) == len(evaluated) < 0.1 * phase.size
+    budgeted, _, _ = adaptive_refine(shape, evaluate, coarse=5, budget=200)
+    assert len(budgeted) <= 200
+
+    # a round that adds no new points must still classify the children it queued
+    corners = grid._corners
+    grid._corners = lambda cell: set(product(*[range(lo, hi + 1) for lo, hi in cell]))
+    try:
+        _, dense_leaves, _ = adaptive_refine((17, 17), lambda pts: [i + 2 * j < 24 for i, j in pts], coarse=3)
+    finally:
+        grid._corners = corners
+    covered = np.zeros((17, 17), dtype=bool)
+    for cell, label in dense_leaves:
+        covered[tuple(slice(lo, hi + 1) for lo, hi in cell)] = True
+    assert covered.all()
+    print(f"Testing: exact {shape} phase diagram from {len(evaluated)} points in {rounds} rounds; "
+          f"{len(budgeted)} with budget 200")
+
+
+def test_sampling():
+    """
+    Sampling modes (rd_batch.grid): the first 64 sobol points and a 64-point latin
+    hypercube put exactly one point in each 1/64 stratum of every axis; samples map
+    onto lin/log/value specs and any slice regenerates on its own.
+    """
+    import numpy as np
+    from rd_batch.grid import unit_sampler, iter_param_samples
+
+    for mode in ("sobol", "lhs"):
+        f = unit_sampler(mode, 3, 64, seed=1)
+        U = np.array([f(i) for i in range(64)])
+        for d in range(3):
+            assert (np.bincount((U[:, d] * 64).astype(int), minlength=64) == 1).all(), (mode, d)
+
+    sweeps = {"a": {"lin": [1.0, 2.0, 3]}, "b": {"log": [-1, 1, 3]}, "c": [1.0, 2.0, 5.0, 7.0]}
+    full = list(iter_param_samples({"N": 40}, sweeps, "sobol", 32, seed=3))
+    assert list(iter_param_samples({"N": 40}, sweeps, "sobol", 32, seed=3, start=10, stop=20)) == full[10:20]
+    a, b, c = (np.array([p[k] for p in full]) for k in "abc")
+    assert (1 <= a).all() and (a < 2).all() and (0.1 <= b).all() and (b < 10).all() and set(c) == {1.0, 2.0, 5.0, 7.0}
+    print("Testing: sobol and lhs stratified over 64 points; 32 sobol samples, slice 10:20 regenerated")
+
+
+def test_surrogate():
+    """
+    k-NN surrogate (rd_batch.surrogate.KNNSurrogate) trained on a synthetic log-scale
+    phase boundary: most points must be confident, confident predictions correct, and
+    predicted wavelengths close to the true ones.
+    """
+    import numpy as np
+    from rd_batch.surrogate import KNNSurrogate
+
+    rng = np.random.default_rng(0)
+    X = 10 ** rng.uniform(0, 1, (2000, 2))
+    patterned = X[:, 0] > X[:, 1]
+    model = KNNSurrogate(k=15).fit(X, patterned, np.where(patterned, 5 * X[:, 0], np.nan), np.full(2000, 1000.0))
+    Q = 10 ** rng.uniform(0, 1, (1000, 2))
+    truth = Q[:, 0] > Q[:, 1]
+    pred = model.predict(Q)
+    confident = pred["confidence"] >= 0.95
+    accuracy = ((pred["p_patterned"] >= 0.5) == truth)[confident].mean()
+    ok = confident & truth
+    assert confident.mean() > 0.8 and accuracy > 0.99
+    assert np.allclose(pred["dct_wavelength"][ok], 5 * Q[ok, 0], rtol=0.1) and np.allclose(pred["steps_used"], 1000)
+    print(f"Testing: {confident.mean():.0%} of points confident, {accuracy:.1%} of those correct")
+
+
+def test_dedup():
+    """
+    Sweep deduplication (rd_batch.batch_runner.dedup_owners): juxtacrine runs ignore
+    act_diffusion and the two act_prod_rate ranges overlap at 3.0, so 16 grid points need
+    6 simulations, and the store must match the same sweep with dedup off.
+    """
+    import shutil
+    import tempfile
+    from rd_batch.batch_runner import run_sweep
+
+    tmp = tempfile.mkdtemp(prefix="rd_dedup_")
+    try:
+        cfg = _small_sweep_cfg(os.path.join(tmp, "dedup"), sweeps={
+            "act_diffusion": [0.5, 1.0], "inh_prod_rate": [2.0, 4.0],
+            "act_prod_rate": [{"lin": [2.0, 3.0, 2]}, {"lin": [3.0, 4.0, 2]}]})
+        cfg["base"]["activator_type"] = "juxtacrine"
+        deduped = run_sweep(cfg, log=lambda msg: None)
+        full = run_sweep({**cfg, "outdir": os.path.join(tmp, "full"), "dedup": False}, log=lambda msg: None)
+        assert deduped["rows"] == 16 and deduped["summary"]["runs"] == 6 and full["summary"]["runs"] == 16
+        with open(deduped["csv"]) as a, open(full["csv"]) as b:
+            assert a.read() == b.read()
+        print("Testing: 16 rows from 6 simulations, identical to the sweep without dedup")
+    finally:
+        shutil.rmtree(tmp)
+
+
+def test_seeded_init():
+    """
+    Seeded random initial conditions (simulation.initialize_fields, batch_runner.with_run_seed):
+    a seed, its SeedSequence and a Generator give the same fields, different seeds differ,
+    seeded runs repeat exactly, and a sweep point's seed does not depend on grid order.
+    """
+    import numpy as np
+    from simulation import initialize_fields
+    from rd_batch.batch_runner import with_run_seed
+
+    a, i = initialize_fields(40, "random_tight", spike_value, spike_value_a=2.0, spike_value_i=4.0, rng=11)
+    for rng in (np.random.SeedSequence(11), np.random.default_rng(11)):
+        a2, i2 = initialize_fields(40, "random_tight", spike_value, spike_value_a=2.0, spike_value_i=4.0, rng=rng)
+        assert np.array_equal(a, a2) and np.array_equal(i, i2)
+    b, _ = initialize_fields(40, "random_tight", spike_value, spike_value_a=2.0, spike_value_i=4.0, rng=12)
+    assert not np.array_equal(a, b) and (np.abs(a / 2.0 - 1) <= 0.05).all() and (np.abs(i / 4.0 - 1) <= 0.05).all()
+    assert initialize_fields((8, 6), "random_tight", spike_value, 1.0, 1.0, rng=11)[0].shape == (8, 6)
+
+    cfg = {**params, "N": 40, "steps": 600, "dt": dt, "dx": dx, "save_every": 100, "min_steps": 500,
+           "stopping_threshold": stopping_threshold, "init_mode": "random_tight", "seed": 5}
+    r1, r2, r3 = (run_simulation(c) for c in (cfg, cfg, {**cfg, "seed": 6}))
+    assert np.array_equal(r1["activator_final"], r2["activator_final"])
+    assert not np.array_equal(r1["activator_initial"], r3["activator_initial"])
+
+    points = [{**cfg, "act_prod_rate": v} for v in (2.0, 3.0, 4.0)]
+    points = [{k: v for k, v in p.items() if k != "seed"} for p in points]
+    forward = [with_run_seed(p, 7)["seed"] for p in points]
+    backward = [with_run_seed(p, 7)["seed"] for p in points[::-1]][::-1]
+    assert forward == backward and len(set(forward)) == 3 and with_run_seed(points[0], 8)["seed"] != forward[0]
+    print("Testing: seeded init reproducible; sweep seeds of 3 points independent of grid order")
+
+
+def test_ensemble():
+    """
+    Ensemble mode (simulation.run_ensemble_neumann): each replicate, rerun alone from its
+    initial fields with run_coupled_neumann, must stop at the same step with the same
+    final fields, including replicates frozen while others keep running.
+    """
+    import numpy as np
+    from simulation import run_ensemble_neumann
+
+    p = {**params, "act_diffusion": 1.0}
+    opts = dict(init_mode="random_tight", activator_type="paracrine", spike_value=spike_value, save_every=100)
+    e = run_ensemble_neumann(40, 4, 3000, dt, dx, p, stopping_threshold, 500, seed=9, **opts)
+    assert len(set(e["steps_used"].tolist())) > 1
+    for k in range(4):
+        a, i, step, _, _ = run_coupled_neumann(40, 3000, dt, dx, p, stopping_threshold, 500,
+                                               initial=(e["activator_initial"][k], e["inhibitor_initial"][k]), **opts)
+        assert step == e["steps_used"][k]
+        assert np.allclose(a[-1], e["activator_final"][k], rtol=0, atol=1e-12)
+        assert np.allclose(i[-1], e["inhibitor_final"][k], rtol=0, atol=1e-12)
+    r = run_simulation({**p, "N": 40, "steps": 3000, "dt": dt, "dx": dx, "save_every": 100, "min_steps": 500,
+                        "stopping_threshold": stopping_threshold, "seed": 9, "replicates": 4, **opts})
+    assert r["activator_final"].shape == (4, 40) and np.array_equal(r["steps_used"], e["steps_used"])
+    print(f"Testing: 4 replicates match single runs, stopping at steps {e['steps_used'].tolist()}")
+
+
+def test_noise():
+    """
+    Euler–Maruyama noise (simulation.NoiseSource): the draws must not depend on the block
+    size, zero noise must reproduce the deterministic run, and with production and
+    diffusion off each cell is an Ornstein–Uhlenbeck process whose mean and variance
+    after 100 steps are known in closed form.
+    """
+    import numpy as np
+    from simulation import NoiseSource
+
+    one, many = (NoiseSource("additive", 1.0, 1.0, (5,), dt, seed=3, block=b) for b in (1, 64))
+    assert all(np.array_equal(one.normals(), many.normals()) for _ in range(150))
+
+    opts = dict(init_mode="activator_spike", activator_type="paracrine", save_every=1)
+    plain = run_coupled_neumann(40, 300, dt, dx, params, 0.0, 1000, **opts)
+    silent = run_coupled_neumann(40, 300, dt, dx, {**params, "noise": "additive"}, 0.0, 1000, seed=2, **opts)
+    assert np.array_equal(plain[0], silent[0]) and np.array_equal(plain[1], silent[1])
+
+    sigma = 0.2
+    p = {**params, "act_prod_rate": 0.0, "inh_prod_rate": 0.0, "inh_diffusion": 0.0,
+         "noise": "additive", "noise_a": sigma, "noise_i": sigma}
+    a, i, _, _, _ = run_coupled_neumann(4000, 100, dt, dx, p, 0.0, 1000, init_mode="both_on",
+                                        activator_type="juxtacrine", spike_value=5.0, save_every=1, seed=1)
+    x = np.concatenate([a[-1], i[-1]])
+    mean = 5.0 * (1 - dt) ** 100
+    var = sigma ** 2 * dt * sum((1 - dt) ** (2 * j) for j in range(100))
+    print(f"Testing: OU mean {x.mean():.4f} (exact {mean:.4f}), variance {x.var():.5f} (exact {var:.5f})")
+    assert abs(x.mean() - mean) < 0.01 * mean and abs(x.var() - var) < 0.1 * var
+
+
+def test_graph_engine():
+    """
+    Cell-graph engine (simulation_graph): one step on a chain must equal the 1D Neumann
+    step and on a periodic square lattice the 2D step, a whole run on a chain must
+    reproduce run_coupled_neumann, and a graph with an isolated cell (the bincount
+    matvec) must give it zero signal and zero flux.
+    """
+    import numpy as np
+    from simulation import step_neumann_batch
+    from simulation_2d import step_2d
+    from simulation_graph import CellGraph, chain_graph, square_lattice, step_graph, run_graph
+
+    rng = np.random.default_rng(0)
+    A, I = rng.uniform(0.5, 2.0, (2, 50))
+    A2, I2 = rng.uniform(0.5, 2.0, (2, 6, 9))
+    for kind in ("paracrine", "juxtacrine"):
+        for got, ref in ((step_graph(A, I, dt, dx, params, chain_graph(50), kind),
+                          step_neumann_batch(A, I, dt, dx, params, kind)),
+                         (step_graph(A2.ravel(), I2.ravel(), dt, dx, params, square_lattice(9, 6), kind),
+                          [f.ravel() for f in step_2d(A2, I2, dt, dx, params, kind)])):
+            assert np.allclose(got, ref, rtol=0, atol=1e-14), kind
+
+    opts = dict(activator_type="paracrine", save_every=100)
+    a, i, step, _, _ = run_coupled_neumann(40, 3000, dt, dx, params, stopping_threshold, 500,
+                                           init_mode="activator_spike", **opts)
+    ga, gi, gstep = run_graph(chain_graph(40), a[0], i[0], 3000, dt, dx, params, stopping_threshold, 500, **opts)
+    assert gstep == step and np.allclose(ga, a, rtol=0, atol=1e-13) and np.allclose(gi, i, rtol=0, atol=1e-13)
+
+    g = CellGraph.from_edges(4, [0, 1], [1, 2])
+    x = np.arange(4.0)
+    assert np.array_equal(g.laplacian(x), [1.0, 0.0, -1.0, 0.0])
+    assert np.array_equal(g.neighbour_average(x), [1.0, 1.0, 1.0, 0.0])
+    print(f"Testing: chain and square lattice steps match the 1D/2D engines; chain run stops at step {gstep} as in 1D")
+
+
+def test_model_params():
+    """
+    Parameter validation (model_params.ModelParams): typos, missing or non-numeric values
+    and non-positive half-saturations are rejected up front; YAML-style Hill coefficients
+    become ints, and step constants match the dict path the engines use.
+    """
+    import pickle
+    import numpy as np
+    from model_params import ModelParams, step_constants, ipow
+
+    def rejects(d, text):
+        try:
+            ModelParams.from_dict(d)
+        except ValueError as e:
+            assert text in str(e), (text, str(e))
+        else:
+            raise AssertionError(f"accepted {d}")
+
+    rejects({**params, "act_prod_rte": 3.0}, "did you mean 'act_prod_rate'")
+    rejects({k: v for k, v in params.items() if k != "inh_decay_rate"}, "Missing model parameters: inh_decay_rate")
+    rejects({**params, "inh_prod_rate": "3.3"}, "must be a number")
+    rejects({**params, "act_half_sat": 0.0}, "must be > 0")
+    rejects({**params, "inh_diffusion": -1.0}, "must be finite and >= 0")
+
+    m = ModelParams.from_dict({**params, "act_hill_coeff": 3.0, "N": 40, "seed": 1})
+    assert m.act_hill_coeff == 3 and isinstance(m.act_hill_coeff, int)
+    assert pickle.loads(pickle.dumps(m)) == m and dict(m) == m.to_dict() and m["inh_diffusion"] == 10.0
+    assert m.step_constants(dt, dx) == step_constants(params, dt, dx)
+    x = np.linspace(0.0, 2.0, 7)
+    assert np.allclose(ipow(x, 3), x ** 3, rtol=1e-14, atol=0)
+    print("Testing: invalid parameters rejected; Hill 3.0 -> 3; step constants agree with the dict path")
+
+
+def test_import_time():
+    """
+    Import-time test (python -X importtime): the compute path must import only NumPy,
+    no plotting, pandas, YAML, ... Its import time is checked by benchmark.py.
+    """
+    from benchmark import IMPORT_CORE, import_profile
+
+    entries = import_profile(IMPORT_CORE)
+    heavy = sorted({m for _, m, _ in entries if m.split(".")[0] in HEAVY_MODULES})
+    print(f"Testing: modules imported by {', '.join(IMPORT_CORE)} after numpy")
+    top = [e for e in entries if e[0]]
+    for _, m, us in sorted(top[[m for _, m, _ in top].index("numpy") + 1:], key=lambda e: -e[2])[:5]:
+        print(f"  {m:<30} {us / 1000:8.1f} ms")
+    assert not heavy, f"compute path imports heavy modules: {heavy}"
+
+
+def test_sensitivity():
+    """
+    Sensitivities (sensitivity.run_sensitivity) against central finite differences of
+    run_simulation: forward on a short unconverged paracrine run, whose re-integrated
+    state must equal the saved activator_final, and steady on a near-converged one.
+    """
+    import numpy as np
+    from sensitivity import run_sensitivity, forward_sensitivity
+
+    base = {**params, "N": 40, "dt": dt, "dx": dx, "save_every": 100, "stopping_threshold": 0.0,
+            "min_steps": 500, "spike_value": spike_value, "init_mode": "random_tight",
+            "activator_type": "paracrine", "act_diffusion": 1.0, "seed": 3}
+
+    def fd(cfg, key, metric, h):
+        up = run_simulation({**cfg, key: cfg[key] + h})["activator_final"]
+        dn = run_simulation({**cfg, key: cfg[key] - h})["activator_final"]
+        return (getattr(up, metric)() - getattr(dn, metric)()) / (2 * h)
+
+    cfg = {**base, "steps": 2050}
+    r = run_simulation(cfg)
+    steps = int(r["steps_used"]) // 100 * 100 + 1
+    fwd = forward_sensitivity(r["activator_initial"], r["inhibitor_initial"], steps, dt, dx, r["parameters"],
+                              "paracrine", ("act_prod_rate",), ())
+    assert np.allclose(fwd["A"], r["activator_final"], rtol=0, atol=1e-13)
+    s = run_sensitivity(r, params=("act_prod_rate", "inh_prod_rate"), metrics=("mean_a",), method="forward")
+    for key in ("act_prod_rate", "inh_prod_rate"):
+        got, ref = s["metrics"]["mean_a"][key], fd(cfg, key, "mean", 1e-5)
+        print(f"Testing: forward d mean_a/d {key} = {got:.9f}, finite difference {ref:.9f}")
+        assert abs(got - ref) < 1e-7 * abs(ref), (key, got, ref)
+
+    cfg = {**base, "steps": 60000}
+    r = run_simulation(cfg)
+    s = run_sensitivity(r, params=("act_prod_rate",), metrics=("mean_a", "var_a"), method="steady")
+    for metric, m in (("mean_a", "mean"), ("var_a", "var")):
+        got, ref = s["metrics"][metric]["act_prod_rate"], fd(cfg, "act_prod_rate", m, 1e-4)
+        print(f"Testing: steady d {metric}/d act_prod_rate = {got:.7f}, finite difference {ref:.7f}")
+        assert abs(got - ref) < 1e-4 * abs(ref), (metric, got, ref)
+
+
+def test_result_cache():
+    """
+    Result cache (rd_batch.result_cache): a repeated deterministic or seeded random run
+    is a hit with identical fields; unseeded random runs always simulate.
+    """
+    import shutil
+    import tempfile
+    import numpy as np
+    from rd_batch.result_cache import ResultCache
+
+    tmp = tempfile.mkdtemp(prefix="rd_cache_")
+    try:
+        cache = ResultCache(os.path.join(tmp, "results.sqlite"))
+        base = {**params, "N": 30, "steps": 600, "dt": dt, "dx": dx, "save_every": 100, "min_steps": 10000}
+        for p in (base, {**base, "init_mode": "random", "seed": 5}, {**base, "init_mode": "random"}):
+            a, b = run_simulation(p, cache=cache), run_simulation(p, cache=cache)
+            hit = b["perf"].get("cache_hit", False)
+            assert hit == ("seed" in p or p is base), p.get("init_mode")
+            assert np.array_equal(a["activator_final"], b["activator_final"]) == hit
+            print(f"Testing: {p.get('init_mode', 'activator_spike')}, seed {p.get('seed')}: cache hit {hit}")
+
+        small = ResultCache(os.path.join(tmp, "small.sqlite"), max_bytes=5000)
+        for k in range(20):
+            small.put(f"k{k % 15}", np.zeros(100 + k))  # the last five replace earlier keys
+        total = small.conn.execute("SELECT SUM(size) FROM results").fetchone()[0]
+        assert small.total_bytes() == total <= 5000 and small.get("k4") is not None and small.get("k5") is None
+        print(f"  LRU cache holds {small.stats()['entries']} entries, running total {total} bytes")
+    finally:
+        shutil.rmtree(tmp)
+
+
+def test_multilevel():
+    """
+    Coarse-to-fine runs (run_multilevel_neumann via run_simulation, run_multilevel_2d)
+    from a central activator spike: the final fields must match a direct fine-grid run,
+    and every stat must have its ml_* sweep column.
+    """
+    import shutil
+    import tempfile
+    import numpy as np
+    from history_io import open_history
+    from rd_batch.batch_runner import MULTILEVEL_COLS, MULTILEVEL_COMPARE_COLS
+    from simulation import run_multilevel_neumann
+    from simulation_2d import run_multilevel_2d
+
+    p = {**params, "N": 48, "steps": 40000, "dt": 0.04, "dx": dx, "save_every": 100, "stopping_threshold": 1e-5,
+         "min_steps": 500, "spike_value": spike_value, "init_mode": "activator_spike",
+         "activator_type": "paracrine", "act_diffusion": 1.0}
+    stats_1d = run_simulation(p, multilevel={"factor": 2, "compare": True})["multilevel"]
+    A = np.ones((16, 16))
+    A[6:10, 6:10] = 3.0
+    stats_2d = {}
+    run_multilevel_2d(A, np.ones((16, 16)), 40000, 0.02, dx, p, 1e-5, 500, factor=2, compare=True,
+                      stats=stats_2d, save_every=100)
+    for name, stats in (("1D", stats_1d), ("2D", stats_2d)):
+        print(f"Testing: {name} multilevel {stats['coarse_steps']} coarse + {stats['fine_steps']} fine steps "
+              f"({stats['coarse_steps_per_sec']:.0f}, {stats['fine_steps_per_sec']:.0f} steps/s), "
+              f"direct {stats['direct_steps']}; activator rel. L2 diff {stats['activator_rel_l2_diff']:.1e}")
+        assert stats["activator_rel_l2_diff"] < 1e-4 and stats["inhibitor_rel_l2_diff"] < 1e-4
+    columns = set(MULTILEVEL_COLS + MULTILEVEL_COMPARE_COLS)
+    missing = {f"ml_{k}" for k in stats_1d if k not in ("factor", "coarse_N")} - columns
+    assert not missing, missing
+
+    # both levels share the step budget; the fine stage's history records the run's init mode
+    tmp = tempfile.mkdtemp(prefix="rd_multilevel_")
+    try:
+        short = {}
+        run_multilevel_neumann(48, 600, 0.04, dx, p, 1e-5, 500, factor=2, stats=short, init_mode="activator_spike",
+                               spike_value=spike_value, save_every=100, history_path=os.path.join(tmp, "h.npy"))
+        assert short["coarse_steps"] + short["fine_steps"] <= 600, short
+        assert open_history(os.path.join(tmp, "h.npy"))[1]["init_mode"] == "activator_spike"
+        stats_2d = {}
+        run_multilevel_2d(A, np.ones((16, 16)), 600, 0.02, dx, p, 1e-5, 500, factor=2, stats=stats_2d, save_every=100)
+        assert stats_2d["coarse_steps"] + stats_2d["fine_steps"] <= 600, stats_2d
+    finally:
+        shutil.rmtree(tmp)
+
+
+def _small_sweep_cfg(outdir, **overrides):
+    """Eight-run paracrine sweep (act_prod_rate x inh_prod_rate) shared by the sweep and storage tests."""
+    cfg = {
+        "base": {**params, "N": 40, "steps": 2000, "dt": dt, "dx": dx, "save_every": 100,
+                 "stopping_threshold": stopping_threshold, "min_steps": 500, "spike_value": spike_value,
+                 "init_mode": "random_tight", "activator_type": "paracrine", "act_diffusion": 1.0},
+        "sweeps": {"act_prod_rate": [2.0, 3.0, 4.0, 5.0], "inh_prod_rate": [2.0, 4.0]},
+        "output": {"features": True, "profiles": "all"},
+        "n_jobs": 1,
+        "seed": 7,
+        "outdir": outdir,
+    }
+    cfg.update(overrides)
+    return cfg
+
+
+def test_service():
+    """
+    Sweep service (rd_batch.service) in this process on a free port: while one job runs,
+    a higher-priority job queued later must start before an earlier one, a queued job
+    can be cancelled, a job's own n_jobs is overridden, and every event streams in order.
+    """
+    import shutil
+    import tempfile
+    import threading
+    import time
+    from rd_batch.service import Client, make_server
+
+    tmp = tempfile.mkdtemp(prefix="rd_service_")
+    server = make_server("http://127.0.0.1:0", n_jobs=1)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    client = Client(f"http://127.0.0.1:{server.server_address[1]}")
+    try:
+        first = client.submit(_small_sweep_cfg(os.path.join(tmp, "first")))
+        while client.status(first["id"])["state"] == "queued":
+            time.sleep(0.05)
+        low = client.submit(_small_sweep_cfg(os.path.join(tmp, "low"), n_jobs=4))
+        high = client.submit(_small_sweep_cfg(os.path.join(tmp, "high")), priority=5)
+        dropped = client.submit(_small_sweep_cfg(os.path.join(tmp, "dropped")))
+        assert client.cancel(dropped["id"])["state"] == "cancelled"
+
+        events = {job["id"]: list(client.events(job["id"])) for job in (first, low, high, dropped)}
+        jobs = {j["id"]: j for j in client.status()["jobs"]}
+        assert [jobs[j["id"]]["state"] for j in (first, low, high, dropped)] == ["done", "done", "done", "cancelled"]
+        assert jobs[first["id"]]["started"] < jobs[high["id"]]["started"] < jobs[low["id"]]["started"]
+        assert [e["event"] for e in events[dropped["id"]]] == ["state", "cancelled"]
+        kinds = [e["event"] for e in events[first["id"]]]
+        assert kinds[:2] == ["state", "state"] and kinds[-1] == "done" and "progress" in kinds
+        assert any("Ignoring n_jobs: 4" in e.get("message", "") for e in events[low["id"]])
+        assert os.path.exists(os.path.join(tmp, "high", "batch_results.csv"))
+        print(f"Testing: 4 jobs; high priority ran before low; {len(kinds)} events streamed for the first")
+    finally:
+        client.shutdown()
+        thread.join(timeout=10)
+        server.server_close()
+        shutil.rmtree(tmp)
+
+
+def test_perf_summary():
+    """
+    Per-sweep perf summary (batch_runner.perf_summary): one entry per run with phase
+    times that add up to at most the busy time, and a zero summary for an empty sweep.
+    """
+    import json
+    import shutil
+    import tempfile
+    import pandas as pd
+    from rd_batch.batch_runner import run_sweep, sweep_plan, write_store
+
+    tmp = tempfile.mkdtemp(prefix="rd_perf_")
+    try:
+        summary = run_sweep(_small_sweep_cfg(os.path.join(tmp, "sweep")), log=lambda msg: None)["summary"]
+        assert summary["runs"] == 8 and summary["cache_hits"] == 0 and summary["steps_per_sec_mean"] > 0
+        assert 0.5 < sum(summary["phase_fractions"].values()) <= 1.0 + 1e-9
+        with open(os.path.join(tmp, "sweep", "perf_summary.json")) as f:
+            assert json.load(f)["runs"] == 8
+
+        plan = sweep_plan(_small_sweep_cfg(os.path.join(tmp, "empty")))
+        empty = write_store(plan, [], [], 0.1, log=lambda msg: None)
+        assert empty["rows"] == 0 and empty["summary"]["runs"] == 0 and empty["summary"]["steps_per_sec_mean"] is None
+        assert len(pd.read_csv(empty["csv"])) == 0
+        print(f"Testing: {summary['runs']} runs at {summary['steps_per_sec_mean']:.0f} steps/s; "
+              f"empty sweep summary {empty['summary']['runs']} runs")
+    finally:
+        shutil.rmtree(tmp)
+
+
+def test_work_queue():
+    """
+    Shared-filesystem work queue (rd_batch.work_queue) with several worker processes on
+    this machine. One chunk is planted as the stale claim of a dead worker and must be
+    requeued. The merged store must equal an in-process run_sweep of the same config.
+    """
+    import shutil
+    import tempfile
+    import pandas as pd
+    from rd_batch.batch_runner import run_sweep
+    from rd_batch.work_queue import init_queue, merge_queue
+
+    root = os.path.dirname(os.path.abspath(__file__))
+    tmp = tempfile.mkdtemp(prefix="rd_queue_")
+    try:
+        cfg = _small_sweep_cfg(os.path.join(tmp, "queued"))
+        queue = os.path.join(tmp, "queue")
+        n_chunks = init_queue(cfg, queue, chunk_size=2)
+
+        # a worker that died holding chunk 0: claimed long ago, never refreshed
+        dead = os.path.join(queue, "claimed", "chunk_000000.json")
+        os.rename(os.path.join(queue, "pending", "chunk_000000.json"), dead)
+        os.utime(dead, (0, 0))
+
+        cmd = [sys.executable, "-m", "rd_batch.work_queue", "work", queue, "--n-jobs", "1",
+               "--heartbeat", "0.5", "--stale-after", "5", "--poll", "0.5"]
+        workers = [subprocess.Popen(cmd, cwd=root, stdout=subprocess.PIPE, text=True) for _ in range(3)]
+        logs = [w.communicate(timeout=600)[0] for w in workers]
+        assert all(w.returncode == 0 for w in workers), logs
+        finished = [line for log in logs for line in log.splitlines() if " finished chunk_" in line]
+        print(f"Testing: {n_chunks} chunks run by {sum(bool(l.strip()) for l in logs)} workers, "
+              f"{len(finished)} chunk completions, requeued: {'requeued stale claim' in ''.join(logs)}")
+        assert "requeued stale claim chunk_000000.json" in "".join(logs)
+        assert len(os.listdir(os.path.join(queue, "done"))) == n_chunks
+
+        merge_queue(queue, log=lambda msg: None)
+        run_sweep({**cfg, "outdir": os.path.join(tmp, "direct")}, log=lambda msg: None)
+        queued = pd.read_csv(os.path.join(tmp, "queued", "batch_results.csv"))
+        direct = pd.read_csv(os.path.join(tmp, "direct", "batch_results.csv"))
+        pd.testing.assert_frame_equal(queued, direct)
+        print(f"  merged {len(queued)} rows identical to a direct run")
+    finally:
+        shutil.rmtree(tmp)
+
+
+def test_reaction_network():
+    """
+    The two-species model written as a reaction_network spec must step exactly like the
+    hand-written batched engines, and its steady-state solver must agree with
+    finding_steady_states to that solver's precision (tol 5e-4, rounded to 1e-3).
+    Its speed against the hand-written engine is checked by benchmark.py.
+    """
+    import numpy as np
+    from finding_steady_states import fast_stable_steady_state
+    from model_params import step_constants
+    from simulation import step_neumann_batch
+    from simulation_graph import hex_lattice, step_graph
+    from reaction_network import activator_inhibitor
+
+    p = {**params, "act_diffusion": 0.3}
+    c = step_constants(p, dt, dx)
+    rng = np.random.default_rng(0)
+    for activator_type in ("paracrine", "juxtacrine"):
+        net = activator_inhibitor(activator_type)
+        kernel = net.compile(p, dt, dx)
+        A, I = rng.uniform(0, 3, (2, 8, 200))
+        a1, i1, a2, i2 = A, I, A, I
+        for _ in range(200):
+            a1, i1 = step_neumann_batch(a1, i1, dt, dx, c, activator_type)
+            a2, i2 = kernel(a2, i2)
+        assert np.array_equal(a1, a2) and np.array_equal(i1, i2), activator_type
+
+        g = hex_lattice(10, 10)
+        x = rng.uniform(0, 3, (2, g.n))
+        assert all(np.array_equal(u, v) for u, v in
+                   zip(step_graph(x[0], x[1], dt, dx, c, g, activator_type), net.compile(p, dt, dx, g)(x[0], x[1])))
+
+        a_ss, i_ss, _ = fast_stable_steady_state(p, activator_type)
+        ss = net.steady_state(p)
+        assert abs(ss["A"] - a_ss) < 5e-3 and abs(ss["I"] - i_ss) < 5e-3, (ss, a_ss, i_ss)
+        print(f"Testing: {activator_type} network identical to the batched engine; "
+              f"steady state {ss['A']:.4f}, {ss['I']:.4f}")
+
+
+def test_result_db():
+    """
+    Result store (rd_batch.result_db): two small sweeps ingested with their profiles.
+    Grouped aggregates, a slice filtered on a sweep constant and the stored profiles must
+    equal what pandas computes from the CSVs.
+    """
+    import json
+    import shutil
+    import tempfile
+    import numpy as np
+    import pandas as pd
+    from rd_batch.batch_runner import run_sweep
+    from rd_batch.result_db import ResultDB
+
+    tmp = tempfile.mkdtemp(prefix="rd_db_")
+    try:
+        frames = []
+        for name, hill in (("hill2", 2.0), ("hill3", 3.0)):
+            cfg = _small_sweep_cfg(os.path.join(tmp, "runs", name))
+            cfg["base"]["inh_hill_coeff"] = hill
+            run_sweep(cfg, log=lambda msg: None)
+            df = pd.read_csv(os.path.join(tmp, "runs", name, "batch_results.csv"))
+            frames.append(df.assign(inh_hill_coeff=hill))
+        df = pd.concat(frames, ignore_index=True)
+
+        db = ResultDB(os.path.join(tmp, "index.sqlite"))
+        n = db.ingest([os.path.join(tmp, "runs")], profiles=True, log=lambda msg: None)
+        assert n == len(df) and db.ingest([os.path.join(tmp, "runs")], log=lambda msg: None) == 0
+
+        r = db.aggregate("mean_a", ["inh_hill_coeff", "pattern_class"], aggs=("count", "avg", "max"))
+        ref = df.groupby(["inh_hill_coeff", "pattern_class"])["mean_a"].agg(["size", "mean", "max"])
+        assert list(zip(r["inh_hill_coeff"], r["pattern_class"])) == list(ref.index)
+        assert (r["count"] == ref["size"].values).all()
+        assert np.allclose(r["avg"], ref["mean"].values) and np.allclose(r["max"], ref["max"].values)
+
+        xs, ys, values, counts = db.slice("act_prod_rate", "inh_prod_rate", "mean_a",
+                                          where={"inh_hill_coeff": 3, "act_prod_rate": (2.5, 5.0)})
+        ref = df[(df.inh_hill_coeff == 3) & df.act_prod_rate.between(2.5, 5.0)]
+        ref = ref.pivot_table(index="inh_prod_rate", columns="act_prod_rate", values="mean_a", aggfunc="mean")
+        assert np.allclose(values, ref.values) and (counts == 1).all()
+
+        prof = db.select(["activator_final"], where={"inh_hill_coeff": 2})["activator_final"]
+        ref = np.array([json.loads(v) for v in frames[0]["activator_final"]], dtype=np.float32)
+        assert np.array_equal(prof, ref)
+        print(f"Testing: {n} runs in {len(db.sweeps())} sweeps; aggregates, slice and profiles match pandas")
+    finally:
+        shutil.rmtree(tmp)
+
+
+def test_sweep_plots():
+    """
+    Batch plots (rd_batch.sweep_plots) over a synthetic 20000-run store: exact, binned
+    and mode heatmaps must equal pandas group-bys, the gallery must hold at most
+    max_tiles profiles, and a downsampled kymograph must equal block means of the
+    history. Importing the module must not import matplotlib.
+    """
+    import json
+    import shutil
+    import tempfile
+    import numpy as np
+    import pandas as pd
+    from rd_batch.result_db import ResultDB
+    from rd_batch.sweep_plots import heatmap_grid, plot_heatmap, profile_gallery, save_image, kymograph_array
+
+    out = subprocess.run([sys.executable, "-c", "import sys, rd_batch.sweep_plots; print('matplotlib' in sys.modules)"],
+                         capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    assert out.stdout.strip() == "False", out.stdout + out.stderr
+
+    tmp = tempfile.mkdtemp(prefix="rd_plots_")
+    try:
+        rng = np.random.default_rng(0)
+        n = 20000
+        x = np.linspace(0, 2 * np.pi, 60)
+        df = pd.DataFrame({"act_prod_rate": rng.choice([1.0, 2.0, 4.0, 8.0], n), "inh_prod_rate": rng.uniform(0, 5, n),
+                           "mean_a": rng.random(n), "pattern_class": rng.choice(["homogeneous", "periodic"], n)})
+        df["activator_final"] = [json.dumps(list(np.round(1 + np.sin(x * (1 + i % 4)), 3))) for i in range(n)]
+        os.makedirs(os.path.join(tmp, "runs", "synthetic"))
+        df.to_csv(os.path.join(tmp, "runs", "synthetic", "batch_results.csv"), index=False)
+        db = ResultDB(os.path.join(tmp, "index.sqlite"))
+        db.ingest([os.path.join(tmp, "runs")], profiles=True, log=lambda msg: None)
+
+        iy = np.clip(((df.inh_prod_rate - df.inh_prod_rate.min()) / np.ptp(df.inh_prod_rate) * 5).astype(int), 0, 4)
+        g = heatmap_grid(db, "act_prod_rate", "inh_prod_rate", "mean_a", bins=(None, 5), chunk=3000)
+        ref = df.groupby([iy, df.act_prod_rate]).mean_a.mean().unstack()
+        assert np.allclose(g["values"], ref.values) and g["counts"].sum() == n
+        g = heatmap_grid(db, "act_prod_rate", "inh_prod_rate", "pattern_class", bins=(None, 5), agg="mode", chunk=3000)
+        ref = (df.groupby([iy, df.act_prod_rate]).pattern_class
+               .agg(lambda s: s.value_counts().sort_index().idxmax()).unstack())
+        assert (np.array(g["labels"])[g["values"].astype(int)] == ref.values).all()
+        plot_heatmap(g, os.path.join(tmp, "mode.png"))
+
+        image, meta = profile_gallery(db, max_tiles=300, sort_by=["act_prod_rate"], color_by="pattern_class",
+                                      columns=20, tile=(16, 30), chunk=1000)
+        assert len(meta["row"]) == 300 and (np.diff(meta["act_prod_rate"]) >= 0).all()
+        assert image.shape == (15 * 17 + 1, 20 * 31 + 1, 3)
+        save_image(image, os.path.join(tmp, "gallery.png"))
+
+        history = rng.random((1000, 2, 120))
+        np.save(os.path.join(tmp, "history.npy"), history)
+        kymo, steps, cells = kymograph_array(os.path.join(tmp, "history.npy"), max_rows=100, max_cols=40, chunk=64)
+        assert np.allclose(kymo, history[:, 0].reshape(100, 10, 40, 3).mean(axis=(1, 3)))
+        assert steps[0] == -1 and (steps[1:] == np.arange(10, 1000, 10) - 1).all()
+        assert (cells == np.arange(0, 120, 3)).all()
+        print(f"Testing: heatmaps match pandas over {n} runs; gallery {image.shape} of 300 tiles; "
+              f"kymograph {kymo.shape} equals block means")
+    finally:
+        shutil.rmtree(tmp)
+
+
+def test_result_writer():
+    """
+    Background result writer (rd_batch.result_writer): a streamed sweep must write the
+    same batch_results.csv as handing all rows to write_store at the end, and a writer
+    slower than the sweep must hold at most max_queue rows, blocking put() instead.
+    """
+    import shutil
+    import tempfile
+    import time
+    import numpy as np
+    import rd_batch.result_writer as result_writer
+    from rd_batch.batch_runner import run_sweep, sweep_plan, run_tasks, with_run_seed, write_store
+    from rd_batch.grid import make_param_grid
+
+    tmp = tempfile.mkdtemp(prefix="rd_writer_")
+    try:
+        cfg = _small_sweep_cfg(os.path.join(tmp, "streamed"), writer={"batch_rows": 3, "flush_seconds": 0.05})
+        streamed = run_sweep(cfg, log=lambda msg: None)
+        plan = sweep_plan({**cfg, "outdir": os.path.join(tmp, "at_end")})
+        points = [with_run_seed(p, plan["sweep_seed"]) for p in make_param_grid(plan["base"], plan["sweeps"])]
+        results = run_tasks(plan, enumerate(points), progress=lambda *a: None)
+        write_store(plan, [r for r, _ in results], [p for _, p in results], 1.0, log=lambda msg: None)
+        with open(streamed["csv"]) as a, open(os.path.join(tmp, "at_end", "batch_results.csv")) as b:
+            assert a.read() == b.read()
+        stats = streamed["summary"]["writer"]
+        print(f"Testing: streamed store identical; {stats['rows']} rows in {stats['flushes']} flushes")
+
+        frame = result_writer.rows_frame
+        result_writer.rows_frame = lambda *args: (time.sleep(0.02), frame(*args))[1]
+        try:
+            w = result_writer.ResultWriter(os.path.join(tmp, "slow.csv"), ["i", "p"], batch_rows=2, max_queue=4)
+            for i in range(40):
+                w.put({"i": i, "p": np.arange(3.0)})
+            stats = w.close()
+        finally:
+            result_writer.rows_frame = frame
+        assert stats["rows"] == 40 and stats["queue_depth_max"] <= 4 and stats["put_blocked_s"] > 0.1
+        print(f"  slow writer: queue depth <= {stats['queue_depth_max']}, sweep blocked {stats['put_blocked_s']:.2f}s")
+
+        w = result_writer.ResultWriter(os.path.join(tmp, "typed.csv"), ["steps_used", "converged"], batch_rows=1,
+                                       dtypes={"steps_used": "Int64", "converged": "boolean"})
+        for row in ({"steps_used": 3, "converged": True}, {"steps_used": np.nan}, {"steps_used": 4.0}):
+            w.put(row)
+        w.close()
+        with open(os.path.join(tmp, "typed.csv")) as f:
+            assert f.read().split() == ["steps_used,converged", "3,True", ",", "4,"]
+    finally:
+        shutil.rmtree(tmp)
+
+
 def main():
     tests = {
         "inhibitor_diffusion_only": test_inhibitor_diffusion_only,
@@ -116,6 +983,31 @@ def main():
         "decay_only": test_decay_only,
         "activator_propagation_no_diffusion": test_activator_propagation_only_no_diffusion,
         "activator_propagation_with_diffusion": test_activator_propagation_only_with_diffusion,
+        "pattern_features": test_pattern_features,
+        "worker_features": test_worker_features,
+        "render_frames": test_render_frames,
+        "history": test_history,
+        "benchmark_harness": test_benchmark_harness,
+        "adaptive_refine": test_adaptive_refine,
+        "sampling": test_sampling,
+        "surrogate": test_surrogate,
+        "dedup": test_dedup,
+        "seeded_init": test_seeded_init,
+        "ensemble": test_ensemble,
+        "noise": test_noise,
+        "graph_engine": test_graph_engine,
+        "model_params": test_model_params,
+        "import_time": test_import_time,
+        "sensitivity": test_sensitivity,
+        "result_cache": test_result_cache,
+        "multilevel": test_multilevel,
+        "service": test_service,
+        "perf_summary": test_perf_summary,
+        "work_queue": test_work_queue,
+        "reaction_network": test_reaction_network,
+        "result_db": test_result_db,
+        "sweep_plots": test_sweep_plots,
+        "result_writer": test_result_writer,
     }
 
     parser = argparse.ArgumentParser(description="Run specific test cases.")
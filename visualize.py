@@ -1,5 +1,11 @@
-import matplotlib.pyplot as plt
-from matplotlib.animation import FuncAnimation, FFMpegWriter
+import os
+import shutil
+import subprocess
+import numpy as np
+from history_io import open_history, frame_steps
+
+# matplotlib is imported inside the plotting functions, so importing this module
+# (e.g. from main.py or analyze_patterns.py) stays cheap when nothing is drawn
 
 
 def animate_histories(A_hist, R_hist, save_every,
@@ -11,6 +17,9 @@ def animate_histories(A_hist, R_hist, save_every,
     If savefile is None, show interactively with plt.show().
     If savefile is a string (e.g., 'movie.mp4' or 'movie.gif'), save to that file.
     """
+    import matplotlib.pyplot as plt
+    from matplotlib.animation import FuncAnimation, FFMpegWriter
+
     num_frames = len(A_hist)
 
     fig, ax = plt.subplots()
@@ -45,6 +54,8 @@ def animate_histories(A_hist, R_hist, save_every,
 
 def plot_one_frame(A_hist_last, R_hist_last, final_step, outfile_png):
     """Plot the final state (last frame) of activator and inhibitor and save as PNG."""
+    import matplotlib.pyplot as plt
+
     title = f"Step {final_step}"
     fig, ax = plt.subplots()
     ax.plot(A_hist_last, "--", color="red", label="Activator")
@@ -57,3 +68,174 @@ def plot_one_frame(A_hist_last, R_hist_last, final_step, outfile_png):
     plt.tight_layout()
     fig.savefig(outfile_png)
     plt.close(fig)
+
+
+def _frame_source(frames, chunk=256):
+    """
+    Normalize the inputs accepted by render_frames.
+
+    Returns (iterator over (A, R) frames, number of frames or None, (lo, hi) or None).
+    Arrays and .npy files of shape (T, 2, ...) are scanned for global limits chunk by
+    chunk, so memory-mapped histories are never loaded whole.
+    """
+    if isinstance(frames, (str, os.PathLike)):
+        frames, _ = open_history(frames)
+
+    if isinstance(frames, np.ndarray):
+        T = frames.shape[0]
+        lo, hi = np.inf, -np.inf
+        for t in range(0, T, chunk):
+            block = np.asarray(frames[t:t + chunk])
+            lo, hi = min(lo, float(np.nanmin(block))), max(hi, float(np.nanmax(block)))
+        return ((frames[t, 0], frames[t, 1]) for t in range(T)), T, (lo, hi)
+
+    if hasattr(frames, "__len__"):
+        lo = min(min(np.min(A), np.min(R)) for A, R in frames)
+        hi = max(max(np.max(A), np.max(R)) for A, R in frames)
+        return iter(frames), len(frames), (float(lo), float(hi))
+
+    return iter(frames), None, None
+
+
+def render_frames(frames, outfile=None, frame_dir=None, save_every=1,
+                  title="Coupled Dynamics (Neumann)", ylim=None, fps=30,
+                  figsize=(6.4, 4.8), dpi=100, cmap="inferno"):
+    """
+    Render a movie headlessly from a stream of (activator, inhibitor) frames.
+
+    `frames` may be a list of (A, R) pairs, an array or .npy path of shape (T, 2, ...)
+    (opened memory-mapped), or any iterator of pairs. 1D frames are drawn as lines,
+    2D frames as an image of the activator field. Axis/colour limits are fixed up front
+    from a pass over the data, or from `ylim` (required for plain iterators), so each
+    frame only restores a cached background and blits the changed artists.
+
+    Raw RGBA buffers are piped straight to ffmpeg when `outfile` is given, and/or
+    written as PNGs into `frame_dir`. Nothing but the current frame is held in memory.
+    Frames are labelled with history_io.frame_steps (the initial state is step -1).
+    """
+    if outfile is None and frame_dir is None:
+        raise ValueError("render_frames needs an outfile and/or a frame_dir")
+    frame_iter, _, limits = _frame_source(frames)
+    if ylim is not None:
+        limits = ylim
+    if limits is None:
+        raise ValueError("Pass ylim=(lo, hi) when rendering from an iterator of unknown length")
+
+    try:
+        A0, R0 = next(frame_iter)
+    except StopIteration:
+        raise ValueError("No frames to render")
+    image_mode = np.ndim(A0) == 2
+
+    import matplotlib.pyplot as plt
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=figsize, dpi=dpi)
+    canvas = FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    ax.set_title(title)
+    if image_mode:
+        im = ax.imshow(A0, cmap=cmap, vmin=limits[0], vmax=limits[1],
+                       interpolation="bilinear", animated=True)
+        ax.set_axis_off()
+        fig.colorbar(im, ax=ax, label="Activator")
+        artists = [im]
+    else:
+        line_A, = ax.plot(A0, "--", color="red", label="Activator", animated=True)
+        line_R, = ax.plot(R0, "--", color="blue", label="Inhibitor", animated=True)
+        ax.set_ylim(0, max(1e-6, limits[1] * 1.2))
+        ax.set_xlabel("Space (Cell Index)")
+        ax.set_ylabel("Concentration")
+        ax.legend(loc="upper right", fontsize=9)
+        artists = [line_A, line_R]
+    label = ax.text(0.02, 0.95, "", transform=ax.transAxes, animated=True,
+                    color="white" if image_mode else "black")
+    fig.tight_layout()
+
+    canvas.draw()
+    background = canvas.copy_from_bbox(fig.bbox)
+    width, height = (int(v) for v in canvas.get_width_height())
+
+    proc = None
+    if outfile is not None:
+        ffmpeg = shutil.which("ffmpeg")
+        if ffmpeg is None:
+            raise RuntimeError("ffmpeg not found on PATH; use frame_dir= to write PNG frames instead")
+        proc = subprocess.Popen(
+            [ffmpeg, "-y", "-loglevel", "error",
+             "-f", "rawvideo", "-pix_fmt", "rgba", "-s", f"{width}x{height}", "-r", str(fps),
+             "-i", "-",
+             "-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2", "-pix_fmt", "yuv420p", "-vcodec", "libx264",
+             outfile],
+            stdin=subprocess.PIPE,
+        )
+    if frame_dir is not None:
+        os.makedirs(frame_dir, exist_ok=True)
+
+    def emit(k, A, R):
+        canvas.restore_region(background)
+        if image_mode:
+            im.set_data(A)
+        else:
+            line_A.set_ydata(A)
+            line_R.set_ydata(R)
+        label.set_text(f"Step {int(frame_steps(k, save_every))}")  # same steps as the kymograph axis
+        for artist in artists + [label]:
+            ax.draw_artist(artist)
+        buf = canvas.buffer_rgba()
+        if proc is not None:
+            proc.stdin.write(buf)
+        if frame_dir is not None:
+            plt.imsave(os.path.join(frame_dir, f"frame_{k:06d}.png"), np.asarray(buf))
+
+    count = 0
+    try:
+        emit(0, A0, R0)
+        for count, (A, R) in enumerate(frame_iter, start=1):
+            emit(count, A, R)
+    finally:
+        if proc is not None:
+            proc.stdin.close()
+            proc.wait()
+
+    if outfile is not None:
+        if proc.returncode != 0:
+            raise RuntimeError(f"ffmpeg exited with status {proc.returncode}")
+        print(f"Movie saved to {outfile} ({count + 1} frames)")
+    if frame_dir is not None:
+        print(f"Frames written to {frame_dir} ({count + 1} frames)")
+
+
+def plot_kymograph(history_path, outfile_png, species=0, t=slice(None), x=slice(None),
+                   max_rows=2000, cmap="inferno"):
+    """
+    Space-time plot of one species (0 = activator, 1 = inhibitor) from an on-disk history.
+
+    Only the requested window is read, and at most `max_rows` frames of it (evenly
+    strided in time), so arbitrarily long runs can be plotted with bounded memory.
+    """
+    frames, meta = open_history(history_path)
+    t_idx = np.arange(frames.shape[0])[t]
+    stride = max(1, int(np.ceil(len(t_idx) / max_rows)))
+    t_idx = t_idx[::stride]
+    if len(t_idx) == 0:
+        raise ValueError("Empty time window")
+    # chained basic slices keep the memmap read lazy and compose the caller's step with the stride
+    field = np.asarray(frames[t][::stride, species][:, x])
+    x_idx = np.arange(frames.shape[-1])[x]
+    steps = frame_steps(t_idx, meta.get("save_every", 1))
+
+    import matplotlib.pyplot as plt
+    fig, ax = plt.subplots()
+    im = ax.imshow(field, aspect="auto", origin="lower", cmap=cmap, interpolation="nearest",
+                   extent=(x_idx[0] - 0.5, x_idx[-1] + 0.5,
+                           steps[0], steps[-1]))
+    fig.colorbar(im, ax=ax, label="Activator" if species == 0 else "Inhibitor")
+    ax.set_xlabel("Space (Cell Index)")
+    ax.set_ylabel("Step")
+    stop = meta.get("stop_step")
+    ax.set_title("Kymograph" + (f" (stopped at step {stop})" if stop is not None else ""))
+    plt.tight_layout()
+    fig.savefig(outfile_png)
+    plt.close(fig)